@@ -6,24 +6,130 @@ from typing import Optional, Tuple
 from playwright.async_api import async_playwright, Browser, BrowserContext, Page
 import re
 import os
-import aiohttp
-import socket
+import atexit
+import shutil
+import signal
+import tempfile
+import time
+from urllib.parse import urlsplit
+from collections import deque
+
+# Seconds to wait for Chrome to exit after SIGTERM before killing it
+CHROME_EXIT_TIMEOUT = 5
+
+# Last stderr lines kept per Chrome process, printed when it fails to start
+STDERR_TAIL_LINES = 50
+
+# Seconds Chrome may take to open its DevTools endpoint after launch
+CHROME_START_TIMEOUT = float(os.getenv("WEBROVER_CHROME_START_TIMEOUT", "20"))
+
+# Seconds between checks for DevToolsActivePort, the fallback when stderr never announces the endpoint
+CDP_PROBE_INTERVAL = 0.05
+
+# Chrome writes its debugging port and browser path to this file in the profile directory
+DEVTOOLS_ACTIVE_PORT = "DevToolsActivePort"
+
+# Chrome prints this to stderr as soon as the remote debugging endpoint accepts connections
+_DEVTOOLS_LISTENING = re.compile(r"DevTools listening on (ws://\S+)")
+
+# PIDs of the Chrome processes launched by this process, killed at exit if still running
+_launched_pids = set()
+
+
+def _kill_process_tree(pid: int, sig: int = signal.SIGTERM) -> None:
+    """Signal Chrome and its helper processes, which share its process group on POSIX"""
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(pid, sig)
+        else:
+            os.kill(pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+@atexit.register
+def _kill_leftover_chrome() -> None:
+    for pid in list(_launched_pids):
+        _kill_process_tree(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+
+
+class ManagedChromium:
+    """
+    Playwright's bundled Chromium, launched headless once per process and shared:
+    every session gets its own BrowserContext in it instead of a Chrome process.
+    Relaunched on next use if it crashes.
+    """
+
+    def __init__(self, headless: bool = True, executable_path: Optional[str] = None):
+        self.headless = headless
+        # A Chrome binary to use instead of Playwright's bundled Chromium
+        self.executable_path = executable_path
+        self._playwright = None
+        self._browser: Optional[Browser] = None
+        self._lock = asyncio.Lock()
+
+    async def browser(self) -> Browser:
+        async with self._lock:
+            if self._browser is None or not self._browser.is_connected():
+                if self._playwright is None:
+                    self._playwright = await async_playwright().start()
+                started = time.perf_counter()
+                self._browser = await self._playwright.chromium.launch(
+                    headless=self.headless, executable_path=self.executable_path
+                )
+                print(f"Launched managed Chromium {self._browser.version} in {time.perf_counter() - started:.2f}s")
+            return self._browser
+
+    async def close(self) -> None:
+        async with self._lock:
+            try:
+                if self._browser:
+                    await self._browser.close()
+                if self._playwright:
+                    await self._playwright.stop()
+            finally:
+                self._browser = None
+                self._playwright = None
+
+
+# Shared by every managed-mode WebRoverBrowser in this process
+managed_chromium = ManagedChromium()
+
 
 class WebRoverBrowser:
     def __init__(self, 
                  user_data_dir: Optional[str] = None,
                  headless: bool = False,
-                 proxy: Optional[str] = None):
+                 proxy: Optional[str] = None,
+                 debugging_port: Optional[int] = None):
         base_dir = self._default_user_dir()
         # Initially just store the base Chrome directory
         self.base_user_dir = base_dir
-        # Will be set after profile selection
-        self.user_data_dir = None
+        # Each instance gets its own profile, so several Chrome processes can run side by side;
+        # a profile directory created here is deleted again on close
+        self.user_data_dir = user_data_dir
+        self._owns_user_data_dir = False
+        # Picked by Chrome at launch when not given
+        self.debugging_port = debugging_port
         self.headless = headless
         self.proxy = proxy
+        # For retiring browsers that have been recycled for too long
+        self.created_at = time.monotonic()
         self._browser: Optional[Browser] = None
         self._context: Optional[BrowserContext] = None
+        # Chrome's own context when attached over CDP, which cannot be closed
+        self._default_context: Optional[BrowserContext] = None
         self._playwright = None
+        self._process: Optional[asyncio.subprocess.Process] = None
+        # Set when the browser is the shared managed Chromium, which outlives this instance
+        self._shared: Optional[ManagedChromium] = None
+        self._stderr_tail: deque = deque(maxlen=STDERR_TAIL_LINES)
+        self._stderr_task: Optional[asyncio.Task] = None
+        # Resolved with the browser websocket URL once Chrome announces it
+        self._ws_endpoint: Optional[asyncio.Future] = None
+        # Seconds from launch until DevTools was ready, and until the CDP connection was up
+        self.launch_seconds: Optional[float] = None
+        self.startup_seconds: Optional[float] = None
 
     def _default_user_dir(self) -> str:
         """Get platform-specific default user data directory"""
@@ -38,34 +144,26 @@ class WebRoverBrowser:
     async def connect_to_chrome(self, 
                               timeout: float = 30,
                               retries: int = 3) -> Tuple[async_playwright, Browser, BrowserContext]:
-        """Connect to existing Chrome instance with retry logic"""
-        self._playwright = await async_playwright().start()
+        """Launch Chrome and connect to it as soon as its DevTools endpoint is up"""
+        started = time.perf_counter()
+        # Playwright's driver starts while Chrome boots
+        playwright_start = asyncio.ensure_future(async_playwright().start())
         
         print("Starting Chrome with remote debugging...")
-        chrome_process = await self.launch_chrome_with_remote_debugging()
-        
-        await asyncio.sleep(3)  # Wait for Chrome to start
+        try:
+            ws_endpoint = await self.launch_chrome_with_remote_debugging()
+        except BaseException:
+            self._playwright = await playwright_start
+            await self.close()
+            raise
+        self._playwright = await playwright_start
         
         print("Attempting to connect to Chrome...")
         for attempt in range(retries):
             try:
-                # Connect to the existing Chrome instance
-                ws_endpoint = None
-                print("Getting browser websocket URL")
-                # Get the WebSocket endpoint from Chrome's debugging API
-                async with aiohttp.ClientSession() as session:
-                    # Then get the browser websocket URL
-                    print("Getting browser websocket URL")
-                    async with session.get("http://127.0.0.1:9222/json/version") as response:
-                        data = await response.json()
-                        ws_endpoint = data.get('webSocketDebuggerUrl')
-                
-                if not ws_endpoint:
-                    raise RuntimeError("Could not get WebSocket debugger URL")
-                
                 print(f"Connecting to WebSocket endpoint: {ws_endpoint}")
                 self._browser = await self._playwright.chromium.connect_over_cdp(
-                    ws_endpoint
+                    ws_endpoint, timeout=timeout * 1000
                 )
 
 
@@ -75,20 +173,34 @@ class WebRoverBrowser:
                 contexts = self._browser.contexts
                 if not contexts:
                     raise RuntimeError("No browser contexts available after connection")
-                self._context = contexts[0]
+                self._context = self._default_context = contexts[0]
                 print("Context: ", self._context)
                 
-                print("Successfully connected to Chrome")
+                self.startup_seconds = time.perf_counter() - started
+                print(f"Successfully connected to Chrome in {self.startup_seconds:.2f}s "
+                      f"(DevTools ready after {self.launch_seconds:.2f}s)")
                 return self._browser, self._context
             
             except Exception as e:
                 print(f"Connection attempt {attempt + 1} failed: {str(e)}")
                 if attempt == retries - 1:
+                    await self.close()
                     raise RuntimeError(f"Failed to connect to Chrome after {retries} attempts: {str(e)}")
-                await asyncio.sleep(2 ** attempt)
+                # The endpoint answered already, a failed connect is not about Chrome still booting
+                await asyncio.sleep(CDP_PROBE_INTERVAL)
+
+    async def connect_managed(self, shared: Optional[ManagedChromium] = None) -> Tuple[Browser, BrowserContext]:
+        """Open an isolated context of its own in the shared headless Chromium"""
+        started = time.perf_counter()
+        self._shared = shared or managed_chromium
+        self._browser = await self._shared.browser()
+        self.launch_seconds = time.perf_counter() - started
+        await self.create_context()
+        self.startup_seconds = time.perf_counter() - started
+        return self._browser, self._context
 
-    async def launch_chrome_with_remote_debugging(self):
-        """Launch Chrome with remote debugging port"""
+    async def launch_chrome_with_remote_debugging(self) -> str:
+        """Launch Chrome with remote debugging port and return its browser websocket URL once it listens"""
         # First launch Chrome normally to let user select profile
         chrome_path = {
             "Windows": "C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe",
@@ -96,9 +208,17 @@ class WebRoverBrowser:
             "Linux": "/usr/bin/google-chrome"
         }.get(platform.system())
 
+        if self.user_data_dir is None:
+            self.user_data_dir = tempfile.mkdtemp(prefix="webrover-chrome-")
+            self._owns_user_data_dir = True
+        # Left over from an earlier Chrome on a reused profile, it would point at a dead port
+        Path(self.user_data_dir, DEVTOOLS_ACTIVE_PORT).unlink(missing_ok=True)
+
         cmd = [
             chrome_path,
-            f"--remote-debugging-port=9222",
+            # Port 0 lets Chrome bind a free port itself, there is no window for another process to take it
+            f"--remote-debugging-port={self.debugging_port or 0}",
+            f"--user-data-dir={self.user_data_dir}",
             "--no-first-run",
             "--no-default-browser-check",
             "--start-maximized",
@@ -107,36 +227,107 @@ class WebRoverBrowser:
         if self.headless:
             cmd.append("--headless=new")
 
+        process = None
+        probe = None
+        started = time.perf_counter()
         try:
             print("Launching Chrome with command:", " ".join(cmd))
+            self._ws_endpoint = asyncio.get_running_loop().create_future()
             process = await asyncio.create_subprocess_exec(
                 *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+                # Its own process group, so closing kills the renderers and helpers with it
+                start_new_session=True
             )
+            self._process = process
+            _launched_pids.add(process.pid)
+            # Chrome blocks once a pipe it writes to fills up, keep reading it
+            self._stderr_task = asyncio.create_task(self._drain_stderr(process))
             
-            print("Waiting for Chrome to start and verify port is listening")
-            # Wait for Chrome to start and verify port is listening
-            for _ in range(10):  # Try for 10 seconds
-                await asyncio.sleep(1)
-                try:
-                    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                    result = sock.connect_ex(('127.0.0.1', 9222))
-                    sock.close()
-                    if result == 0:
-                        print("Chrome started successfully with remote debugging port")
-                        return process
-                except:
-                    continue
-            
-            raise RuntimeError("Chrome failed to start with remote debugging port")
+            print("Waiting for Chrome's DevTools endpoint")
+            # Whichever answers first: the stderr announcement or the endpoint itself
+            probe = asyncio.ensure_future(self._probe_devtools())
+            done, _ = await asyncio.wait(
+                [self._ws_endpoint, probe],
+                timeout=CHROME_START_TIMEOUT,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                raise RuntimeError(f"Chrome did not open its debugging port within {CHROME_START_TIMEOUT}s")
+            ws_endpoint = done.pop().result()
+            self.debugging_port = urlsplit(ws_endpoint).port
+            self.launch_seconds = time.perf_counter() - started
+            print(f"Chrome started successfully with remote debugging port in {self.launch_seconds:.2f}s")
+            return ws_endpoint
             
         except Exception as e:
             print(f"Error launching Chrome: {e}")
             if process:
-                stderr = await process.stderr.read()
-                print(f"Chrome stderr output: {stderr.decode()}")
+                print("Chrome stderr output:", "\n".join(self._stderr_tail))
+            await self._terminate_chrome()
             raise RuntimeError(f"Failed to launch Chrome: {str(e)}")
+        finally:
+            if probe is not None:
+                probe.cancel()
+
+    async def _drain_stderr(self, process: asyncio.subprocess.Process):
+        while True:
+            line = await process.stderr.readline()
+            if not line:
+                # Chrome exited, or closed stderr, before announcing the endpoint
+                if self._ws_endpoint is not None and not self._ws_endpoint.done():
+                    await process.wait()
+                    self._ws_endpoint.set_exception(
+                        RuntimeError(f"Chrome exited with code {process.returncode} before it was ready")
+                    )
+                return
+            text = line.decode(errors="replace").rstrip()
+            self._stderr_tail.append(text)
+            match = _DEVTOOLS_LISTENING.search(text)
+            if match and self._ws_endpoint is not None and not self._ws_endpoint.done():
+                self._ws_endpoint.set_result(match.group(1))
+
+    async def _probe_devtools(self) -> str:
+        """Poll the profile's DevToolsActivePort file until Chrome has written its port and browser path"""
+        path = Path(self.user_data_dir, DEVTOOLS_ACTIVE_PORT)
+        while True:
+            try:
+                lines = path.read_text().splitlines()
+            except OSError:
+                lines = []
+            # Written in one go, but a read may still catch it half done
+            if len(lines) >= 2 and lines[0].isdigit() and lines[1].startswith("/devtools/browser/"):
+                return f"ws://127.0.0.1:{lines[0]}{lines[1]}"
+            await asyncio.sleep(CDP_PROBE_INTERVAL)
+
+    async def _terminate_chrome(self):
+        """Stop the Chrome process this instance launched, killing it if it does not exit in time"""
+        process, self._process = self._process, None
+        if process is not None:
+            if process.returncode is None:
+                _kill_process_tree(process.pid)
+                try:
+                    await asyncio.wait_for(process.wait(), timeout=CHROME_EXIT_TIMEOUT)
+                except asyncio.TimeoutError:
+                    print(f"Chrome {process.pid} did not exit, killing it")
+                    _kill_process_tree(process.pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+                    await process.wait()
+            _launched_pids.discard(process.pid)
+        if self._stderr_task:
+            self._stderr_task.cancel()
+            self._stderr_task = None
+        if self._ws_endpoint is not None:
+            if self._ws_endpoint.done() and not self._ws_endpoint.cancelled():
+                # Retrieve any exception so asyncio does not log it as never retrieved
+                self._ws_endpoint.exception()
+            else:
+                self._ws_endpoint.cancel()
+            self._ws_endpoint = None
+        if self._owns_user_data_dir and self.user_data_dir:
+            shutil.rmtree(self.user_data_dir, ignore_errors=True)
+            self.user_data_dir = None
+            self._owns_user_data_dir = False
 
     async def create_context(self, 
                            viewport: dict = {"width": 2560, "height": 1440},
@@ -162,10 +353,28 @@ class WebRoverBrowser:
             color_scheme="light",
         )
 
+        # Request blocking is applied per run by the agent's network profile
         await self._add_anti_detection()
-        await self._configure_network()
         return self._context
 
+    @property
+    def is_managed(self) -> bool:
+        """Whether this instance has its own context in the shared managed Chromium"""
+        return self._shared is not None
+
+    async def new_context(self) -> BrowserContext:
+        """Replace this instance's context with a fresh one, without the old one's cookies or storage"""
+        old_context, self._context = self._context, None
+        if old_context is not None and old_context is self._default_context:
+            # Chrome exits with its last window, so its own context keeps one blank tab
+            for extra_page in old_context.pages[1:]:
+                await extra_page.close()
+            if old_context.pages:
+                await old_context.pages[0].goto("about:blank")
+        elif old_context is not None:
+            await old_context.close()
+        return await self.create_context()
+
     async def _add_anti_detection(self):
         """Inject JavaScript to mask automation"""
         await self._context.add_init_script("""
@@ -175,12 +384,6 @@ class WebRoverBrowser:
             window.chrome = { runtime: {} };
         """)
 
-    async def _configure_network(self):
-        """Block unnecessary resources for faster loading"""
-        await self._context.route("**/*.{png,jpg,jpeg,webp}", lambda route: route.abort())
-        await self._context.route("**/*.css", lambda route: route.abort())
-        await self._context.route(re.compile(r"(analytics|tracking|beacon)"), lambda route: route.abort())
-
     def _modern_user_agent(self) -> str:
         """Generate current Chrome user agent string"""
         versions = {
@@ -211,11 +414,21 @@ class WebRoverBrowser:
         }
 
     async def close(self):
-        """Cleanup resources"""
-        if self._context:
-            await self._context.close()
-        if self._browser:
-            await self._browser.close()
-        if self._playwright:
-            await self._playwright.stop()
+        """Cleanup resources, ending with the Chrome process this instance launched"""
+        try:
+            if self._context:
+                await self._context.close()
+            # The shared managed browser stays up for the other sessions
+            if self._browser and not self._shared:
+                await self._browser.close()
+            if self._playwright:
+                await self._playwright.stop()
+        finally:
+            self._context = None
+            self._default_context = None
+            self._browser = None
+            self._playwright = None
+            self._shared = None
+            # Disconnecting over CDP leaves Chrome running, it has to be stopped explicitly
+            await self._terminate_chrome()
 
@@ -0,0 +1,78 @@
+import json
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+import aiosqlite
+
+
+# Agents whose answers only depend on the question; the task agent acts on the page and is never cached
+CACHEABLE_AGENTS = {"research", "deep_research"}
+
+
+def normalize_query(query: str) -> str:
+    """Case, whitespace and trailing punctuation do not change a research question"""
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.rstrip(" ?!.")
+
+
+class AnswerCache:
+    """Persistent cache of research answers keyed by agent type and normalized query"""
+
+    def __init__(self, conn: aiosqlite.Connection, ttl: Optional[float] = None):
+        self.conn = conn
+        self.ttl = ttl if ttl is not None else float(os.getenv("WEBROVER_CACHE_TTL", "86400"))
+        self.hits = 0
+        self.misses = 0
+
+    async def setup(self) -> None:
+        await self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS answer_cache (
+                agent_type TEXT NOT NULL,
+                query_key TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                sources TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (agent_type, query_key)
+            )
+        """)
+        await self.conn.commit()
+
+    async def get(self, agent_type: str, query: str) -> Optional[Dict[str, Any]]:
+        """Returns a fresh cached answer, counting the lookup as a hit or a miss"""
+        if agent_type not in CACHEABLE_AGENTS:
+            return None
+        async with self.conn.execute(
+            "SELECT answer, sources, created_at FROM answer_cache WHERE agent_type = ? AND query_key = ?",
+            (agent_type, normalize_query(query))
+        ) as cursor:
+            row = await cursor.fetchone()
+
+        if row is None or time.time() - row[2] > self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return {"answer": row[0], "sources": json.loads(row[1]), "cached_at": row[2]}
+
+    async def put(self, agent_type: str, query: str, answer: str, sources: List[str]) -> None:
+        if agent_type not in CACHEABLE_AGENTS or not answer:
+            return
+        await self.conn.execute(
+            "INSERT OR REPLACE INTO answer_cache VALUES (?, ?, ?, ?, ?)",
+            (agent_type, normalize_query(query), answer, json.dumps(sources), time.time())
+        )
+        await self.conn.commit()
+
+    async def purge_expired(self) -> None:
+        await self.conn.execute("DELETE FROM answer_cache WHERE created_at < ?", (time.time() - self.ttl,))
+        await self.conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+        }
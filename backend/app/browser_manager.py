@@ -1,25 +1,62 @@
-from Browser.webrover_browser import WebRoverBrowser
-from typing import Dict, Any, Tuple
-from playwright.async_api import Page, Browser
+from Browser.webrover_browser import WebRoverBrowser, managed_chromium
+from typing import Dict, Any, Tuple, Optional
+from collections import deque
+from playwright.async_api import Page
+import asyncio
+import os
+import time
 
-async def setup_browser(go_to_page: str) -> Tuple[Browser, Page]:
+from .metrics import retries_total, browser_startup_seconds, browsers_recycled_total
+
+# "cdp" launches the system Chrome per session and attaches over CDP; "managed" runs one
+# headless bundled Chromium per worker and gives each session its own BrowserContext
+BROWSER_MODE = os.getenv("WEBROVER_BROWSER_MODE", "cdp")
+
+# Recycled browsers are retired after this many seconds, or once their page's JS heap is over
+# WEBROVER_RECYCLE_MAX_HEAP_MB, since long-lived renderers grow and leak
+RECYCLE_MAX_AGE = float(os.getenv("WEBROVER_RECYCLE_MAX_AGE", "1800"))
+RECYCLE_MAX_HEAP_MB = float(os.getenv("WEBROVER_RECYCLE_MAX_HEAP_MB", "512"))
+
+async def setup_browser(go_to_page: str) -> Tuple[WebRoverBrowser, Page]:
     """
     Sets up a browser instance and returns the browser and page objects.
+    Each call launches its own Chrome process, or in managed mode opens its own
+    context in the shared Chromium; either is closed with cleanup_browser_session.
     """
     print(f"Setting up browser for {go_to_page}")
     browser = WebRoverBrowser()
-    browser, context = await browser.connect_to_chrome()
+    if BROWSER_MODE == "managed":
+        _, context = await browser.connect_managed()
+    else:
+        _, context = await browser.connect_to_chrome()
+    browser_startup_seconds.observe(browser.launch_seconds, stage="launch")
+    browser_startup_seconds.observe(browser.startup_seconds, stage="connect")
+
+    try:
+        page = await context.new_page()
+        await goto_with_fallback(page, go_to_page)
+    except BaseException:
+        await browser.close()
+        raise
+
+    return browser, page
 
-    page = await context.new_page()
-    
+async def goto_with_fallback(page: Page, go_to_page: str) -> None:
+    """
+    Navigates to the given page, falling back to Google if it fails to load.
+    """
     try:
         await page.goto(go_to_page, timeout=80000, wait_until="domcontentloaded")
     except Exception as e:
         print(f"Error loading page: {e}")
+        retries_total.inc(reason="navigation_fallback")
         # Fallback to Google if the original page fails to load
         await page.goto("https://www.google.com", timeout=100000, wait_until="domcontentloaded")
 
-    return browser, page
+async def shutdown_managed_browser() -> None:
+    """Close the shared managed Chromium once every session on it is closed"""
+    if BROWSER_MODE == "managed":
+        await managed_chromium.close()
 
 async def cleanup_browser_session(browser: WebRoverBrowser) -> None:
     """
@@ -34,3 +71,181 @@ async def cleanup_browser_session(browser: WebRoverBrowser) -> None:
         print(f"Error during browser cleanup: {e}")
         raise
 
+
+
+class WarmBrowserPool:
+    """
+    Keeps a number of browsers launched, connected and parked on a start page
+    so a new session is a lease instead of a cold Chrome start. Leased browsers
+    count toward the pool's size, so a new one is only launched when a lease is
+    retired or the pool is short. Closed sessions' browsers come back through
+    `release` and are reset and reused, until they get too old or too large.
+    """
+
+    def __init__(self,
+                 size: Optional[int] = None,
+                 start_url: str = "https://www.google.com",
+                 max_age: float = RECYCLE_MAX_AGE,
+                 max_heap_mb: float = RECYCLE_MAX_HEAP_MB):
+        self.size = size if size is not None else int(os.getenv("WEBROVER_WARM_BROWSERS", "1"))
+        self.start_url = start_url
+        self.max_age = max_age
+        self.max_heap_mb = max_heap_mb
+        self._ready: deque = deque()
+        # Browsers handed out by acquire and not yet released or discarded
+        self._leased: set = set()
+        self._refill_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def start(self) -> None:
+        """Begin warming browsers in the background"""
+        self._closed = False
+        self._schedule_refill()
+
+    def _schedule_refill(self) -> None:
+        if self._closed or self.size <= 0:
+            return
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = asyncio.create_task(self._refill())
+
+    async def _refill(self) -> None:
+        while not self._closed and len(self._ready) + len(self._leased) < self.size:
+            started = time.monotonic()
+            try:
+                browser, page = await setup_browser(self.start_url)
+            except Exception as e:
+                print(f"Error warming browser: {e}")
+                return
+            if self._closed:
+                await cleanup_browser_session(browser)
+                return
+            self._ready.append((browser, page))
+            print(f"Warmed browser in {time.monotonic() - started:.1f}s ({len(self._ready)}/{self.size} ready)")
+
+    async def acquire(self, go_to_page: str) -> Tuple[WebRoverBrowser, Page]:
+        """
+        Returns a warm browser and page on `go_to_page`, falling back to a cold
+        start when the pool is empty.
+        """
+        while self._ready:
+            browser, page = self._ready.popleft()
+            if page.is_closed() or self._too_old(browser):
+                await cleanup_browser_session(browser)
+                self._schedule_refill()
+                continue
+            self._leased.add(browser)
+            try:
+                if page.url.rstrip("/") != go_to_page.rstrip("/"):
+                    await goto_with_fallback(page, go_to_page)
+            except BaseException:
+                await self.discard(browser)
+                raise
+            return browser, page
+
+        browser, page = await setup_browser(go_to_page)
+        self._leased.add(browser)
+        return browser, page
+
+    async def release(self, browser: WebRoverBrowser, page: Page) -> None:
+        """
+        Takes back a closed session's browser. It is reset and parked for the next
+        session, unless the pool is full or the browser is due to be retired.
+        """
+        self._leased.discard(browser)
+        outcome = "full" if self._closed or len(self._ready) >= self.size else await self._retire_reason(browser, page)
+        if outcome is None:
+            try:
+                page = await reset_page(browser, page)
+                # Returned browsers go first, ahead of any freshly launched ones
+                self._ready.appendleft((browser, page))
+                outcome = "recycled"
+            except Exception as e:
+                print(f"Error resetting page for reuse: {e}")
+                outcome = "reset_failed"
+        browsers_recycled_total.inc(outcome=outcome)
+        if outcome != "recycled":
+            try:
+                await cleanup_browser_session(browser)
+            finally:
+                self._schedule_refill()
+
+    async def discard(self, browser: WebRoverBrowser) -> None:
+        """Closes a leased browser that cannot be reused and launches its replacement"""
+        self._leased.discard(browser)
+        try:
+            await cleanup_browser_session(browser)
+        finally:
+            self._schedule_refill()
+
+    def _too_old(self, browser: WebRoverBrowser) -> bool:
+        return time.monotonic() - browser.created_at > self.max_age
+
+    async def _retire_reason(self, browser: WebRoverBrowser, page: Page) -> Optional[str]:
+        if page.is_closed():
+            return "page_closed"
+        if self._too_old(browser):
+            return "age"
+        try:
+            heap = await page.evaluate("() => performance.memory ? performance.memory.usedJSHeapSize : null")
+        except Exception:
+            return "unresponsive"
+        if heap is not None and heap / 2**20 > self.max_heap_mb:
+            return "memory"
+        return None
+
+    @property
+    def ready(self) -> int:
+        return len(self._ready)
+
+    async def close(self) -> None:
+        """Stop refilling and close every parked browser"""
+        self._closed = True
+        if self._refill_task:
+            self._refill_task.cancel()
+            try:
+                await self._refill_task
+            except asyncio.CancelledError:
+                pass
+            self._refill_task = None
+        while self._ready:
+            browser, _ = self._ready.popleft()
+            try:
+                await cleanup_browser_session(browser)
+            except Exception as e:
+                print(f"Error closing warm browser: {e}")
+
+
+async def reset_page(browser: WebRoverBrowser, page: Page) -> Page:
+    """
+    Returns a browser to a blank state for the next session and gives back the
+    page to use. Nothing the last session signed into may carry over, so the
+    session's context, with its cookies, storage, tabs and network blocking, is
+    replaced by a fresh one.
+    """
+    context = await browser.new_context()
+    return await context.new_page()
+
+
+async def close_opened_tabs(page: Page, pages_before) -> None:
+    """Closes the tabs a run opened next to the session page"""
+    for opened_page in list(page.context.pages):
+        if opened_page is page or opened_page in pages_before:
+            continue
+        try:
+            await opened_page.close()
+        except Exception as e:
+            print(f"Error closing tab {opened_page.url}: {e}")
+
+
+async def abort_page_activity(page: Page, pages_before) -> None:
+    """
+    Stops whatever an abandoned run left going in the browser: closes tabs the
+    run opened and stops any navigation still loading on the session page.
+    """
+    await close_opened_tabs(page, pages_before)
+
+    if not page.is_closed():
+        try:
+            await page.evaluate("window.stop()")
+        except Exception as e:
+            print(f"Error stopping page load: {e}")
@@ -1,6 +1,5 @@
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
+from .llm_gateway import GatedChatOpenAI, GatedChatAnthropic
 import os
 from typing import TypedDict, Annotated, List, Literal
 from playwright.async_api import Page, Locator
@@ -10,25 +9,23 @@ from Browser.webrover_browser import WebRoverBrowser
 from playwright.async_api import async_playwright
 import asyncio
 import platform
-from langchain_text_splitters import NLTKTextSplitter, SpacyTextSplitter
-from newspaper import Article
 import aiohttp
 import asyncio
-from io import BytesIO
-from PyPDF2 import PdfReader
 from langchain_core.documents import Document
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
 from langchain_core.messages import SystemMessage, HumanMessage
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import START, END, StateGraph
 from IPython.display import Image, display
+from app.rag_store import get_vector_store, delete_collection, DEFAULT_COLLECTION
+from app.metrics import vector_store_seconds, retries_total
+from app.offload import run_blocking, run_cpu
+from app.parsing import fetch_article_html, parse_article_html, extract_pdf_text, split_text
+from app.streaming import emit_answer_delta
+from app.text_entry import clear_focused, enter_text, submit
 
 
 
-embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-
-
 
 load_dotenv()
 def set_env_vars(var):
@@ -42,12 +39,12 @@ vars = ["OPENAI_API_KEY", "LANGCHAIN_API_KEY", "LANGCHAIN_TRACING_V2", "LANGCHAI
 for var in vars:
     set_env_vars(var)
 
-llm_4o = ChatOpenAI(model="gpt-4o", temperature=0)
-llm_mini = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-llm_o3_mini = ChatOpenAI(model="o3-mini", reasoning_effort="high")
+llm_4o = GatedChatOpenAI(model="gpt-4o", temperature=0)
+llm_mini = GatedChatOpenAI(model="gpt-4o-mini", temperature=0)
+llm_o3_mini = GatedChatOpenAI(model="o3-mini", reasoning_effort="high")
 
-llm_anthropic = ChatAnthropic(model="claude-3-5-sonnet-20240620", temperature=0)
-llm_openai_o1 = ChatOpenAI(model="o1-preview", temperature=1)
+llm_anthropic = GatedChatAnthropic(model="claude-3-5-sonnet-20240620", temperature=0)
+llm_openai_o1 = GatedChatOpenAI(model="o1-preview", temperature=1)
 llm = llm_4o
 
 
@@ -104,6 +101,7 @@ class AgentState(TypedDict):
     subtopic_answers: Annotated[List[SubtopicAnswer], add]
     final_answer: str
     is_pdf: Literal[True, False]
+    rag_collection: str
     subtopics: List[str]
     subtopic_status: Annotated[List[str], add]
     subtopic_to_research: str
@@ -371,36 +369,23 @@ async def type(state: AgentState):
     """Types text into an input field located by its XPath, fallback bounding box if XPath fails."""
     page = state["page"]
     text = state["action"]["args"]
-    
-    
-        
+
     try:
         bbox_x, bbox_y = state["action"]["action_element"]["x"], state["action"]["action_element"]["y"]
         await page.mouse.click(bbox_x, bbox_y, click_count=3)
-        await asyncio.sleep(1)
-        select_all = "Meta+A" if platform.system() == "Darwin" else "Control+A"
-        await page.keyboard.press(select_all)
-        await asyncio.sleep(1)
-        await page.keyboard.press("Backspace")
-        await asyncio.sleep(1)
-        await page.keyboard.type(text)
-        await asyncio.sleep(4)
+        await clear_focused(page)
+        await enter_text(page, text)
 
     except Exception as e:
         xpath = state["action"]["action_element"]["xpath"]
         await page.locator(f'xpath={xpath}').click()
-        await asyncio.sleep(1)
         select_all = "document.execCommand('selectAll', false, null);"
         await page.locator(f'xpath={xpath}').evaluate(select_all)
-        await asyncio.sleep(1)
-        await page.locator(f'xpath={xpath}').type(text)
-        await asyncio.sleep(4)
-        
+        await enter_text(page, text)
 
     element_description = f"{state['action']['action_element']['type']} element {state['action']['action_element']['description']}"
-    await page.keyboard.press("Enter")
-    await asyncio.sleep(2)
-    
+    await submit(page)
+
     return {"actions_taken": [f"Typed {text} into {element_description}"]}
 
 
@@ -526,22 +511,11 @@ async def go_to_search(state: AgentState):
 
 # Scrape Text
 
-async def scrape_text(page):        
-
-# URL of the news article
-    url = page.url
-
-    # Create an Article object
-    article = Article(url)
-
-    # Download the article's HTML content
+async def scrape_text(page):
+    """Downloads the current page on a thread and parses it as an article in a parse worker"""
     try:
-        article.download()
-
-        # Parse the downloaded content
-        article.parse()
-
-        data = article.text
+        html = await run_blocking(fetch_article_html, page.url)
+        data = await run_cpu(parse_article_html, page.url, html)
 
         if data == "":
             return "No data found"
@@ -567,15 +541,8 @@ async def scrape_pdf(page):
         async with session.get(url) as response:
             if response.status == 200:
                 content = await response.read()
-                pdf_data = BytesIO(content)
                 try:
-                    reader = PdfReader(pdf_data)
-                    text = ""
-                    for page_num in range(len(reader.pages)):
-                        page_obj = reader.pages[page_num]
-                        page_text = page_obj.extract_text()
-                        if page_text:
-                            text += page_text + "\n"
+                    text = await run_cpu(extract_pdf_text, content)
                     if text.strip() == "":
                         return "No data found"
                     return text
@@ -584,27 +551,27 @@ async def scrape_pdf(page):
                     return "Forbidden"
             else:
                 return "Forbidden"
-            
+
+
 # Docs from Text
 
 async def docs_from_text(data, url):
-    text_splitter = SpacyTextSplitter(chunk_size=500, chunk_overlap=10)
-    
-    texts = text_splitter.split_text(data)
+    texts = await run_cpu(split_text, data)
+
     docs = [Document(page_content=text, metadata={"source": url}) for text in texts]
+
     return docs
 
 
-async def store_doc_embeddings(docs):
+# Store Doc Embeddings
 
+async def store_doc_embeddings(docs, collection_name):
 
-    vector_store = Chroma(
-        collection_name="webpage_rag",
-        embedding_function=embeddings,
-        persist_directory="./rag_store_webpage",  # Where to save data locally, remove if not necessary
-    )
 
-    vector_store.add_documents(docs)
+    vector_store = await get_vector_store(collection_name)
+
+    with vector_store_seconds.time(operation="add_documents"):
+        await run_blocking(vector_store.add_documents, docs)
 
 
 
@@ -625,7 +592,7 @@ async def web_page_rag(state: AgentState):
         docs = await docs_from_text(result, page.url)
         print(len(docs))
 
-        await store_doc_embeddings(docs)
+        await store_doc_embeddings(docs, state.get("rag_collection", DEFAULT_COLLECTION))
 
         return {"actions_taken":[f"Scraped the url {page.url} and stored the information in a vector database for future reference"]}
 
@@ -690,7 +657,7 @@ async def url_decide_node(state: AgentState):
     ]
 
     structured_llm = llm_mini.with_structured_output(Url)
-    response = structured_llm.invoke(messages)
+    response = await structured_llm.ainvoke(messages)
     print(response)
 
     page = state["page"]
@@ -725,7 +692,7 @@ async def topic_breakdown(state: AgentState):
         HumanMessage(content=human_message)
     ]
 
-    response = llm.with_structured_output(SubtopicState).invoke(messages)
+    response = await llm.with_structured_output(SubtopicState).ainvoke(messages)
 
     return {"subtopics": response.subtopics}
 
@@ -767,7 +734,7 @@ async def track_subtopic_status(state: AgentState):
         HumanMessage(content=human_message)
     ]
 
-    response = llm_mini.invoke(messages)
+    response = await llm_mini.ainvoke(messages)
 
     return {"subtopic_to_research": response.content}
     
@@ -865,9 +832,9 @@ async def llm_call_node(state: AgentState):
     dom_elements = state["dom_elements"]
     input = state["subtopic_to_research"]
     visited_urls = state.get("visited_urls", [])
-    prompt_value = prompt.invoke({"actions_taken": actions_taken, "dom_elements": dom_elements, "input": input, "visited_urls": visited_urls})
+    prompt_value = await prompt.ainvoke({"actions_taken": actions_taken, "dom_elements": dom_elements, "input": input, "visited_urls": visited_urls})
 
-    response = llm.with_structured_output(Action).invoke(prompt_value)
+    response = await llm.with_structured_output(Action).ainvoke(prompt_value)
 
     action = response
 
@@ -890,6 +857,7 @@ def tool_router(state: AgentState):
     action_type = action["action_type"]
 
     if action_type == 'retry':
+        retries_total.inc(reason="agent_action")
         return "annotate_page"
     
     return tools[action_type]
@@ -929,14 +897,11 @@ async def webpage_or_pdf(state: AgentState):
 
 
 async def self_review(state: AgentState):
-    vector_store = Chroma(
-    collection_name="webpage_rag",
-    embedding_function=embeddings,
-    persist_directory="./rag_store_webpage",
-)
+    vector_store = await get_vector_store(state.get("rag_collection", DEFAULT_COLLECTION))
 
     input_text = state["subtopic_to_research"]
-    relevant_docs = vector_store.similarity_search(input_text, k=40)
+    with vector_store_seconds.time(operation="similarity_search"):
+        relevant_docs = await run_blocking(vector_store.similarity_search, input_text, k=40)
 
     print(f"Number of documents: {len(relevant_docs)}")
 
@@ -961,7 +926,7 @@ async def self_review(state: AgentState):
     ]
 
     structured_llm = llm.with_structured_output(SelfReview)
-    response = structured_llm.invoke(messages)
+    response = await structured_llm.ainvoke(messages)
 
 
     if len(relevant_docs) > 30  or response.answer == "Yes":
@@ -982,15 +947,12 @@ async def after_self_router(state: AgentState):
 
 async def subtopic_answer_node(state: AgentState):
 
-    vector_store = Chroma(
-        collection_name="webpage_rag",
-        embedding_function=embeddings,
-        persist_directory="./rag_store_webpage",  # Where to save data locally, remove if not necessary
-    )
+    vector_store = await get_vector_store(state.get("rag_collection", DEFAULT_COLLECTION))
 
     input = state["subtopic_to_research"]
 
-    relevant_docs = vector_store.similarity_search(input, k=40)
+    with vector_store_seconds.time(operation="similarity_search"):
+        relevant_docs = await run_blocking(vector_store.similarity_search, input, k=40)
     
 
     system_message = """
@@ -1085,22 +1047,15 @@ async def subtopic_answer_node(state: AgentState):
         HumanMessage(content=human_message)
     ]
 
-    response = llm_o3_mini.with_structured_output(SubtopicAnswer).invoke(messages)
+    response = await llm_o3_mini.with_structured_output(SubtopicAnswer).ainvoke(messages)
 
     return {"subtopic_answers": [response], "subtopic_status": [f"Research on {input} completed"], "actions_taken": [f"Research on {input} completed"]}
 
 
 async def empty_rag_store(state : AgentState):
 
-    vector_store = Chroma(
-    collection_name="webpage_rag",
-    embedding_function=embeddings,
-    persist_directory="./rag_store_webpage",
-    )
-
     try:
-        client = vector_store._client  # Access the underlying Chroma client
-        client.delete_collection("webpage_rag")
+        await delete_collection(state.get("rag_collection", DEFAULT_COLLECTION))
         return {"actions_taken" : ["Emptied Vector Store"]}
 
     except Exception as e:
@@ -1108,7 +1063,30 @@ async def empty_rag_store(state : AgentState):
         return {"actions_taken" : ["Error Emptying Vector Store"]}
 
     
-async def compile_research(state: AgentState):
+def render_final_answer(components: dict, subtopic_answers: List[SubtopicAnswer], partial: bool = False) -> str:
+    """
+    Assembles the research paper from the compiled components and subtopic answers.
+    With partial=True only the sections generated so far are rendered, in paper order,
+    so the text can be streamed while the components are still being written.
+    """
+    introduction = "# Introduction" + "\n" + components.get("introduction", "")
+    if partial and "conclusion" not in components:
+        return introduction
+
+    subtopic_answers = "\n".join([subtopic_answer.subtopic_answer for subtopic_answer in subtopic_answers])
+
+    conclusion = "# Conclusion" + "\n" + components.get("conclusion", "")
+    if partial:
+        return introduction + "\n" + subtopic_answers + "\n" + conclusion
+
+    references_list = components["references"]
+
+    references = "# References" + "\n" + "\n".join(["\n - " + reference for reference in references_list])
+
+    return introduction + "\n" + subtopic_answers + "\n" + conclusion + "\n" + references
+
+
+async def compile_research(state: AgentState, config: RunnableConfig):
     
     system_message = """
     You are an expert at compiling a set of subtopics to a broader research paper topic introduction,  conclusion and references section.
@@ -1151,21 +1129,25 @@ async def compile_research(state: AgentState):
         HumanMessage(content=human_message)
     ]
 
-    response = llm_o3_mini.with_structured_output(FinalAnswerComponents).invoke(messages)
-
-    introduction = "# Introduction" + "\n" + response.introduction 
-
-    subtopic_answers = "\n".join([subtopic_answer.subtopic_answer for subtopic_answer in subtopic_answers])
-
-    conclusion = "# Conclusion" + "\n" + response.conclusion
-    
-    references_list = response.references
-
-    references = "# References" + "\n" + "\n".join(["\n - " + reference for reference in references_list])
-
-    final_answer = introduction + "\n" + subtopic_answers + "\n" + conclusion + "\n" + references
-
-    
+    # Request the components as a forced tool call and stream its arguments, which
+    # are parsed as partial JSON, so the paper reaches the client as it is written
+    structured_llm = llm_o3_mini.bind_tools([FinalAnswerComponents], tool_choice="FinalAnswerComponents")
+
+    streamed = ""
+    gathered = None
+    async for chunk in structured_llm.astream(messages):
+        gathered = chunk if gathered is None else gathered + chunk
+        if gathered.tool_calls:
+            partial_answer = render_final_answer(gathered.tool_calls[0]["args"], subtopic_answers, partial=True)
+            if partial_answer.startswith(streamed) and len(partial_answer) > len(streamed):
+                await emit_answer_delta(config, partial_answer[len(streamed):])
+                streamed = partial_answer
+
+    response = FinalAnswerComponents(**gathered.tool_calls[0]["args"])
+
+    final_answer = render_final_answer(response.model_dump(), subtopic_answers)
+    if final_answer.startswith(streamed):
+        await emit_answer_delta(config, final_answer[len(streamed):])
 
     return {"final_answer": final_answer, "actions_taken": [f"Research Paper on {broader_research_paper_topic} completed"], "conversation_history": [f"User : {state['input']}"]+[f"WebRover : {final_answer}"]}
     
@@ -0,0 +1,76 @@
+import asyncio
+import os
+from collections import deque
+from typing import Any, Dict, Optional, Set
+
+
+class Subscription:
+    """
+    One subscriber's view of the bus. Events are kept in a bounded ring buffer;
+    when the subscriber falls behind, the oldest events are dropped and the next
+    read reports how many were missed.
+    """
+
+    def __init__(self, session_id: Optional[str], buffer_size: int):
+        self.session_id = session_id
+        self._buffer: deque = deque(maxlen=buffer_size)
+        self._ready = asyncio.Event()
+        self.dropped = 0
+        self._unreported = 0
+
+    def wants(self, session_id: Optional[str]) -> bool:
+        # Unscoped subscribers see everything, scoped ones see their session plus global events
+        return self.session_id is None or session_id is None or session_id == self.session_id
+
+    def push(self, event: Dict[str, Any]) -> None:
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+            self._unreported += 1
+        self._buffer.append(event)
+        self._ready.set()
+
+    async def get(self) -> Dict[str, Any]:
+        while not self._buffer:
+            self._ready.clear()
+            await self._ready.wait()
+        if self._unreported:
+            missed, self._unreported = self._unreported, 0
+            return {"type": "lagged", "data": {"dropped": missed}}
+        return self._buffer.popleft()
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+
+class EventBus:
+    """Fan-out pub/sub: every subscriber gets its own copy of each published event"""
+
+    def __init__(self, buffer_size: Optional[int] = None):
+        self.buffer_size = buffer_size or int(os.getenv("WEBROVER_EVENT_BUFFER", "256"))
+        self._subscribers: Set[Subscription] = set()
+
+    def subscribe(self, session_id: Optional[str] = None) -> Subscription:
+        subscription = Subscription(session_id, self.buffer_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+
+    def publish(self, event_type: str, data: Dict[str, Any], session_id: Optional[str] = None) -> None:
+        """Deliver an event to every interested subscriber; with no subscribers it is discarded"""
+        event = {"type": event_type, "data": data}
+        if session_id is not None:
+            event["session_id"] = session_id
+        for subscription in self._subscribers:
+            if subscription.wants(session_id):
+                subscription.push(event)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self._subscribers),
+            "buffer_size": self.buffer_size,
+            "pending": sum(subscription.pending for subscription in self._subscribers),
+            "dropped": sum(subscription.dropped for subscription in self._subscribers),
+        }
@@ -0,0 +1,201 @@
+import asyncio
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .session_manager import SessionManager, SessionNotFoundError, SessionPoolExhaustedError
+from .streaming import run_agent
+from .tracing import Trace
+from .metrics import retries_total
+from .scheduler import BATCH
+
+
+@dataclass
+class Job:
+    job_id: str
+    query: str
+    agent_type: str
+    force_refresh: bool = False
+    status: str = "queued"
+    cached: bool = False
+    run_id: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "query": self.query,
+            "agent_type": self.agent_type,
+            "status": self.status,
+            "cached": self.cached,
+            "run_id": self.run_id,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration_seconds": (
+                round(self.finished_at - self.started_at, 2)
+                if self.started_at and self.finished_at else None
+            ),
+        }
+
+
+class JobRunner:
+    """
+    Runs queued agent jobs on a fixed number of workers. Each worker takes a
+    browser session from the session manager per job, so throughput is bounded
+    by the worker count rather than by open HTTP connections. Closing the session
+    after each job hands its browser back to the warm pool, which resets it, so
+    no job sees the cookies or logins of the one before. Jobs run at batch
+    priority, behind interactive queries for browsers and LLM slots.
+    """
+
+    def __init__(self,
+                 session_manager: SessionManager,
+                 agent_graphs: Dict[str, Any],
+                 run_store,
+                 answer_cache=None,
+                 workers: Optional[int] = None,
+                 start_url: str = "https://www.google.com",
+                 on_update: Optional[Callable[[Job], Awaitable[None]]] = None,
+                 ttl: Optional[float] = None):
+        self.session_manager = session_manager
+        self.agent_graphs = agent_graphs
+        self.run_store = run_store
+        self.answer_cache = answer_cache
+        self.workers = workers or int(os.getenv("WEBROVER_JOB_WORKERS", "2"))
+        self.start_url = start_url
+        # Called after every job status change, e.g. to publish it to the API tier
+        self.on_update = on_update
+        # Seconds a finished job is kept for get() and stats() before it is forgotten
+        self.ttl = ttl if ttl is not None else float(os.getenv("WEBROVER_JOB_TTL", "86400"))
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._jobs: Dict[str, Job] = {}
+        self._worker_tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        for index in range(self.workers):
+            self._worker_tasks.append(asyncio.create_task(self._worker(index)))
+
+    async def stop(self) -> None:
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    async def submit(self, query: str, agent_type: str, force_refresh: bool = False) -> Job:
+        self._purge_expired()
+        job = Job(job_id=uuid.uuid4().hex, query=query, agent_type=agent_type, force_refresh=force_refresh)
+        self._jobs[job.job_id] = job
+
+        cached = None
+        if self.answer_cache and not force_refresh:
+            cached = await self.answer_cache.get(agent_type, query)
+        if cached:
+            # Answered from the cache without taking a worker
+            job.cached = True
+            job.status = "completed"
+            job.result = {"answer": cached["answer"], "sources": cached["sources"]}
+            job.started_at = job.finished_at = time.time()
+        else:
+            self._queue.put_nowait(job)
+        await self._updated(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def _purge_expired(self) -> None:
+        cutoff = time.time() - self.ttl
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    async def _updated(self, job: Job) -> None:
+        if self.on_update:
+            try:
+                await self.on_update(job)
+            except Exception as e:
+                print(f"Error publishing job {job.job_id}: {e}")
+
+    async def _acquire_session(self) -> str:
+        """Create a session for a worker, waiting for a free slot in the pool"""
+        while True:
+            try:
+                session = await self.session_manager.create_session(self.start_url, priority=BATCH)
+                return session.session_id
+            except SessionPoolExhaustedError:
+                await asyncio.sleep(5)
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job = await self._queue.get()
+            session_id = await self._acquire_session()
+            try:
+                await self._run(job, session_id)
+            except SessionNotFoundError:
+                # The session was evicted or cleaned up, retry the job on a fresh one
+                session_id = None
+                retries_total.inc(reason="job_session_lost")
+                job.status = "queued"
+                self._queue.put_nowait(job)
+                await self._updated(job)
+            finally:
+                if session_id is not None:
+                    await self._close_session(index, session_id)
+
+    async def _close_session(self, index: int, session_id: str) -> None:
+        try:
+            await self.session_manager.close_session(session_id)
+        except SessionNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error closing job worker {index} session: {e}")
+
+    async def _run(self, job: Job, session_id: str) -> None:
+        async with self.session_manager.lease(session_id) as session:
+            job.status = "running"
+            job.started_at = time.time()
+            job.run_id = uuid.uuid4().hex
+            await self.run_store.create(job.run_id, job.agent_type, job.query, session_id)
+            await self._updated(job)
+            trace = Trace(job.run_id, job.agent_type)
+            try:
+                job.result = await run_agent(
+                    job.agent_type,
+                    job.query,
+                    session.page,
+                    self.agent_graphs[job.agent_type],
+                    job.run_id,
+                    trace,
+                    priority=BATCH
+                )
+                job.status = "completed"
+                if self.answer_cache:
+                    try:
+                        await self.answer_cache.put(job.agent_type, job.query, job.result["answer"], job.result["sources"])
+                    except Exception as e:
+                        # The job has its answer, only later identical queries miss the cache
+                        print(f"Error caching answer for job {job.job_id}: {e}")
+            except Exception as e:
+                print(f"Job {job.job_id} failed: {e}")
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                await self.run_store.set_status(job.run_id, job.status)
+                await self.run_store.save_trace(job.run_id, trace.to_dict())
+                await self._updated(job)
+
+    def stats(self) -> Dict[str, Any]:
+        self._purge_expired()
+        counts: Dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"workers": self.workers, "queued": self._queue.qsize(), "jobs": counts}
@@ -0,0 +1,327 @@
+import asyncio
+import json
+import os
+import random
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from langchain_anthropic import ChatAnthropic
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_openai import ChatOpenAI
+
+from .metrics import llm_queue_wait_seconds, llm_queue_depth, llm_in_flight, llm_rate_limited_total
+from .scheduler import PRIORITY_RANK, run_priority
+
+
+# Defaults for every model; WEBROVER_LLM_LIMITS overrides them per model, e.g.
+# {"gpt-4o": {"max_concurrent": 4, "tokens_per_minute": 30000}}. 0 tokens per minute means no token limit.
+DEFAULT_MAX_CONCURRENT = int(os.getenv("WEBROVER_LLM_MAX_CONCURRENT", "8"))
+DEFAULT_TOKENS_PER_MINUTE = int(os.getenv("WEBROVER_LLM_TOKENS_PER_MINUTE", "0"))
+MODEL_LIMITS: Dict[str, Dict[str, int]] = json.loads(os.getenv("WEBROVER_LLM_LIMITS", "{}"))
+
+# New runs are refused while this many requests are already waiting for any model...
+MAX_QUEUED = int(os.getenv("WEBROVER_LLM_MAX_QUEUED", "64"))
+# ...or while a model's token budget is this many seconds of refill in debt
+MAX_BUDGET_DEBT_SECONDS = float(os.getenv("WEBROVER_LLM_MAX_DEBT_SECONDS", "30"))
+
+# Retries of a request the provider answered with 429
+MAX_RATE_LIMIT_RETRIES = int(os.getenv("WEBROVER_LLM_MAX_RETRIES", "5"))
+
+# Seconds after which a waiting request is served as if it had top priority, so batch work cannot starve
+PRIORITY_AGING_SECONDS = float(os.getenv("WEBROVER_LLM_PRIORITY_AGING", "30"))
+
+# Output tokens assumed for a request before its real usage is known
+DEFAULT_OUTPUT_ESTIMATE = 1024
+
+# Who is making the current LLM request, for fair queueing; set per run by the streaming layer
+llm_caller: ContextVar[str] = ContextVar("webrover_llm_caller", default="default")
+
+
+class LLMBudgetExhaustedError(RuntimeError):
+    """Raised when a new run would only queue behind an exhausted LLM budget."""
+
+
+class _Waiter:
+    def __init__(self, tokens: int, rank: int):
+        self.tokens = tokens
+        self.rank = rank
+        self.enqueued = time.monotonic()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class ModelBudget:
+    """
+    Concurrency slots and a token bucket for one model. Waiting requests are
+    grouped by caller; the next slot goes to the highest priority caller, and
+    callers of equal priority are served round-robin so one busy run cannot
+    starve the others. Within a caller requests are served in order.
+    """
+
+    def __init__(self, model: str, max_concurrent: int, tokens_per_minute: int):
+        self.model = model
+        self.max_concurrent = max_concurrent
+        self.tokens_per_minute = tokens_per_minute
+        self.tokens = float(tokens_per_minute)
+        self.in_flight = 0
+        self.requests = 0
+        self.total_wait = 0.0
+        self._refilled_at = time.monotonic()
+        self._waiters: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def queued(self) -> int:
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def _refill(self) -> None:
+        if not self.tokens_per_minute:
+            return
+        now = time.monotonic()
+        self.tokens = min(
+            float(self.tokens_per_minute),
+            self.tokens + (now - self._refilled_at) * self.tokens_per_minute / 60
+        )
+        self._refilled_at = now
+
+    def debt_seconds(self) -> float:
+        """How long the token bucket needs to refill back to zero"""
+        self._refill()
+        if not self.tokens_per_minute or self.tokens >= 0:
+            return 0.0
+        return -self.tokens * 60 / self.tokens_per_minute
+
+    async def acquire(self, caller: str, tokens: int, priority: str) -> None:
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+        waiter = _Waiter(tokens, PRIORITY_RANK[priority])
+        self._waiters.setdefault(caller, deque()).append(waiter)
+        self._dispatch()
+        self._report()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as we were cancelled, hand the slot straight back
+                self.release(tokens, 0)
+            else:
+                self._remove(caller, waiter)
+            raise
+        wait = time.monotonic() - waiter.enqueued
+        self.requests += 1
+        self.total_wait += wait
+        llm_queue_wait_seconds.observe(wait, model=self.model, priority=priority)
+
+    def release(self, estimated: int, used: Optional[int]) -> None:
+        self.in_flight -= 1
+        if self.tokens_per_minute and used is not None:
+            # Settle the estimate against what the provider reported
+            self.tokens += estimated - used
+        self._dispatch()
+        self._report()
+
+    def _remove(self, caller: str, waiter: _Waiter) -> None:
+        waiters = self._waiters.get(caller)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del self._waiters[caller]
+        self._report()
+
+    def _next_caller(self) -> str:
+        """The first caller in round-robin order whose oldest request has the best effective rank"""
+        now = time.monotonic()
+        best, best_rank = None, None
+        for caller, waiters in self._waiters.items():
+            waiter = waiters[0]
+            rank = 0 if now - waiter.enqueued >= PRIORITY_AGING_SECONDS else waiter.rank
+            if best_rank is None or rank < best_rank:
+                best, best_rank = caller, rank
+        return best
+
+    def _dispatch(self) -> None:
+        self._refill()
+        while self.in_flight < self.max_concurrent and self._waiters:
+            caller = self._next_caller()
+            waiters = self._waiters[caller]
+            waiter = waiters[0]
+            if self.tokens_per_minute and self.tokens < waiter.tokens:
+                self._wake_after_refill(waiter.tokens - self.tokens)
+                return
+            waiters.popleft()
+            # Rotate the caller to the back so the next grant goes to someone else
+            del self._waiters[caller]
+            if waiters:
+                self._waiters[caller] = waiters
+            if waiter.future.done():
+                continue
+            if self.tokens_per_minute:
+                self.tokens -= waiter.tokens
+            self.in_flight += 1
+            waiter.future.set_result(None)
+
+    def _wake_after_refill(self, missing: float) -> None:
+        if self._timer is not None and not self._timer.cancelled():
+            return
+
+        def wake():
+            self._timer = None
+            self._dispatch()
+            self._report()
+
+        delay = missing * 60 / self.tokens_per_minute
+        self._timer = asyncio.get_running_loop().call_later(delay, wake)
+
+    def _report(self) -> None:
+        llm_queue_depth.set(self.queued, model=self.model)
+        llm_in_flight.set(self.in_flight, model=self.model)
+
+    def stats(self) -> Dict[str, Any]:
+        self._refill()
+        return {
+            "max_concurrent": self.max_concurrent,
+            "tokens_per_minute": self.tokens_per_minute,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "tokens_available": round(self.tokens) if self.tokens_per_minute else None,
+            "avg_wait_ms": round(self.total_wait / self.requests * 1000, 1) if self.requests else 0.0,
+        }
+
+
+class LLMGateway:
+    """Process-wide admission control for every LLM request the agents make"""
+
+    def __init__(self):
+        self._budgets: Dict[str, ModelBudget] = {}
+        self.rejected = 0
+
+    def budget(self, model: str) -> ModelBudget:
+        if model not in self._budgets:
+            limits = MODEL_LIMITS.get(model, {})
+            self._budgets[model] = ModelBudget(
+                model,
+                limits.get("max_concurrent", DEFAULT_MAX_CONCURRENT),
+                limits.get("tokens_per_minute", DEFAULT_TOKENS_PER_MINUTE),
+            )
+        return self._budgets[model]
+
+    def check_admission(self) -> None:
+        """Refuse a new run up front rather than let it fail halfway for lack of budget"""
+        queued = sum(budget.queued for budget in self._budgets.values())
+        if queued >= MAX_QUEUED:
+            self.rejected += 1
+            raise LLMBudgetExhaustedError(f"{queued} LLM requests are already queued, try again shortly")
+        for budget in self._budgets.values():
+            debt = budget.debt_seconds()
+            if debt > MAX_BUDGET_DEBT_SECONDS:
+                self.rejected += 1
+                raise LLMBudgetExhaustedError(
+                    f"The token budget for {budget.model} is exhausted for the next {debt:.0f}s, try again later"
+                )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rejected_runs": self.rejected,
+            "models": {model: budget.stats() for model, budget in self._budgets.items()},
+        }
+
+
+gateway = LLMGateway()
+
+
+def estimate_tokens(messages: List[BaseMessage], max_tokens: Optional[int]) -> int:
+    """Rough request size, about four characters per token plus the expected output"""
+    characters = sum(len(str(message.content)) for message in messages)
+    return characters // 4 + (max_tokens or DEFAULT_OUTPUT_ESTIMATE)
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def _backoff(error: Exception, attempt: int) -> float:
+    response = getattr(error, "response", None)
+    retry_after = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    try:
+        if retry_after is not None:
+            return float(retry_after)
+    except ValueError:
+        pass
+    return min(60.0, 2 ** attempt) * (0.5 + random.random() / 2)
+
+
+def _used_tokens(usage: Optional[Dict[str, Any]]) -> Optional[int]:
+    if not usage:
+        return None
+    return usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+
+
+class GatewayMixin:
+    """
+    Routes a LangChain chat model's requests through the gateway: each request
+    waits for a concurrency slot and token budget for its model, and requests the
+    provider rejects with 429 are retried with backoff. Structured output and
+    tool bindings wrap the same model, so they are gated too.
+    """
+
+    def _gateway_model(self) -> str:
+        return getattr(self, "model_name", None) or getattr(self, "model", "unknown")
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        budget = gateway.budget(self._gateway_model())
+        estimate = estimate_tokens(messages, getattr(self, "max_tokens", None))
+        attempt = 0
+        while True:
+            await budget.acquire(llm_caller.get(), estimate, run_priority.get())
+            used = None
+            try:
+                result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+                message = result.generations[0].message if result.generations else None
+                used = _used_tokens(getattr(message, "usage_metadata", None))
+                return result
+            except Exception as e:
+                if not _is_rate_limited(e) or attempt >= MAX_RATE_LIMIT_RETRIES:
+                    raise
+                delay = _backoff(e, attempt)
+            finally:
+                budget.release(estimate, used)
+            attempt += 1
+            llm_rate_limited_total.inc(model=budget.model)
+            print(f"{budget.model} rate limited, retrying in {delay:.1f}s (attempt {attempt})")
+            await asyncio.sleep(delay)
+
+    async def _astream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        budget = gateway.budget(self._gateway_model())
+        estimate = estimate_tokens(messages, getattr(self, "max_tokens", None))
+        attempt = 0
+        while True:
+            await budget.acquire(llm_caller.get(), estimate, run_priority.get())
+            used = None
+            started = False
+            try:
+                async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    started = True
+                    used = _used_tokens(getattr(chunk.message, "usage_metadata", None)) or used
+                    yield chunk
+                return
+            except Exception as e:
+                # Once output has been streamed a retry would repeat it
+                if started or not _is_rate_limited(e) or attempt >= MAX_RATE_LIMIT_RETRIES:
+                    raise
+                delay = _backoff(e, attempt)
+            finally:
+                budget.release(estimate, used)
+            attempt += 1
+            llm_rate_limited_total.inc(model=budget.model)
+            print(f"{budget.model} rate limited, retrying in {delay:.1f}s (attempt {attempt})")
+            await asyncio.sleep(delay)
+
+
+class GatedChatOpenAI(GatewayMixin, ChatOpenAI):
+    pass
+
+
+class GatedChatAnthropic(GatewayMixin, ChatAnthropic):
+    pass
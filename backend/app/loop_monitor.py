@@ -0,0 +1,103 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Dict, Optional
+
+from .metrics import loop_lag_seconds, loop_stalls_total
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop wakes up from a short sleep. When it is
+    late by more than `threshold` seconds something blocked the loop; a watchdog
+    thread samples the loop thread's stack while the stall is still happening,
+    so the report names the offending task and the line it was stuck on.
+    """
+
+    def __init__(self,
+                 threshold: Optional[float] = None,
+                 interval: float = 0.1,
+                 history: int = 50):
+        self.threshold = threshold or float(os.getenv("WEBROVER_LOOP_STALL_MS", "250")) / 1000
+        self.interval = interval
+        self.stalls: deque = deque(maxlen=history)
+        self.stall_count = 0
+        self.max_lag = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = 0.0
+        self._sample: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopped = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="webrover-loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._last_beat = now
+            lag = max(0.0, now - expected)
+            loop_lag_seconds.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.threshold:
+                self._record(lag)
+
+    def _watch(self) -> None:
+        """Runs in its own thread; catches the loop while it is blocked"""
+        while not self._stopped.wait(self.interval):
+            behind = time.monotonic() - self._last_beat - self.interval
+            if behind > self.threshold and self._sample is None:
+                frame = sys._current_frames().get(self._loop_thread_id)
+                task = asyncio.current_task(self._loop)
+                self._sample = {
+                    "task": task.get_name() if task else None,
+                    "coroutine": getattr(task.get_coro(), "__qualname__", repr(task.get_coro())) if task else None,
+                    "stack": traceback.format_stack(frame, limit=15) if frame else [],
+                }
+
+    def _record(self, lag: float) -> None:
+        sample, self._sample = self._sample or {}, None
+        stall = {
+            "at": time.time(),
+            "lag_ms": round(lag * 1000, 1),
+            "task": sample.get("task"),
+            "coroutine": sample.get("coroutine"),
+            "stack": sample.get("stack", []),
+        }
+        self.stalls.append(stall)
+        self.stall_count += 1
+        loop_stalls_total.inc()
+        where = stall["stack"][-1].strip() if stall["stack"] else "unknown location"
+        print(f"Event loop blocked for {stall['lag_ms']} ms in {stall['coroutine']}: {where}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "stalls": self.stall_count,
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "recent": list(self.stalls),
+        }
@@ -3,28 +3,60 @@ import sys
 sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
 
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
 import asyncio
-from typing import Optional, Dict, Any, Literal
+from typing import Optional, Dict, Any, List, Literal
 from contextlib import asynccontextmanager
-import json
-import time
-# Import necessary functions from agent files
-from .task_agent import task_agent
-from .research_agent import research_agent, type
-from .deep_research_agent import deep_research_agent
-from .browser_manager import setup_browser, cleanup_browser_session
+import os
+from .metrics import render_metrics
+from .loop_monitor import LoopLagMonitor
+from .queue_backend import create_queue_backend
+from .worker_client import WorkerClient, WorkerError
+from .streaming import encode_sse, keepalive, HEARTBEAT_INTERVAL
+from .event_bus import EventBus
 
 from fastapi.middleware.cors import CORSMiddleware
 
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
-from playwright.async_api import async_playwright
 
-app = FastAPI()
+# "all" runs a worker inside the API process (the default, for development);
+# "api" only serves HTTP and leaves sessions and graphs to `python -m app.worker`
+ROLE = os.getenv("WEBROVER_ROLE", "all")
 
-app = FastAPI()
+# Seconds a /query:sync request may take, deep research runs easily outlast the default worker timeout
+SYNC_QUERY_TIMEOUT = float(os.getenv("WEBROVER_SYNC_QUERY_TIMEOUT", "1800"))
+
+# Sends commands to the worker tier, created at startup
+worker_client: Optional[WorkerClient] = None
+
+# Reports anything that blocks the event loop for longer than WEBROVER_LOOP_STALL_MS
+loop_monitor = LoopLagMonitor()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global worker_client
+    loop_monitor.start()
+    queue = await create_queue_backend()
+    worker = None
+    if ROLE == "all":
+        # Imported here so an API-only process never loads the agents or a browser
+        from .worker import Worker
+        worker = Worker(queue)
+        await worker.start()
+    elif not queue.shared:
+        raise RuntimeError("WEBROVER_ROLE=api needs a shared WEBROVER_QUEUE_URL (sqlite:/// or redis://)")
+    worker_client = WorkerClient(queue)
+    try:
+        yield
+    finally:
+        if worker:
+            await worker.stop()
+        await queue.close()
+        await loop_monitor.stop()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -34,14 +66,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global variables for browser session
-browser_session = {
-    "browser": None,
-    "page": None
-}
+@app.exception_handler(WorkerError)
+async def worker_error_handler(request: Request, exc: WorkerError):
+    return JSONResponse(status_code=exc.status, content={"detail": exc.detail})
 
-# Global queue for browser events
-browser_events = asyncio.Queue()
+# Fan-out bus for browser events, each subscriber gets its own bounded buffer
+browser_events = EventBus()
 
 class BrowserSetupRequest(BaseModel):
     url: str = "https://www.google.com"
@@ -49,65 +79,64 @@ class BrowserSetupRequest(BaseModel):
 class QueryRequest(BaseModel):
     query: str
     agent_type: Literal["task", "research", "deep_research"]
+    session_id: str
+    force_refresh: bool = False
+    # Scheduling class, defaults to interactive for task runs, batch for deep research
+    priority: Optional[Literal["interactive", "standard", "batch"]] = None
+
+class CleanupRequest(BaseModel):
+    session_id: str
 
 @app.post("/setup-browser")
 async def setup_browser_endpoint(request: BrowserSetupRequest):
-    try:
-        # Clear any existing session
-        if browser_session["browser"]:
-            await cleanup_browser()
-            
-        # Setup new browser session
-        if request.url == "https://www.google.com":
-            print(f"Setting up browser for {request.url}")
-            browser, page = await setup_browser(request.url)
-        else:
-            browser, page = await setup_browser(request.url)
-        
-        # Store session info
-        browser_session.update({
-            "browser": browser,
-            "page": page
-        })
-        
-        return {"status": "success", "message": "Browser setup complete"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to setup browser: {str(e)}")
+    result = await worker_client.call("setup_browser", {"url": request.url})
+    return {"status": "success", "message": "Browser setup complete", "session_id": result["session_id"]}
 
 @app.post("/cleanup")
-async def cleanup_browser():
+async def cleanup_browser(request: CleanupRequest):
     try:
-        if browser_session["browser"]:
-            # Use the proper cleanup function
-            await cleanup_browser_session(browser_session["browser"])
-            
-            # Clear the session
-            browser_session.update({
-                "browser": None,
-                "page": None
-            })
-        
-        return {"status": "success", "message": "Browser cleanup complete"}
-    except Exception as e:
-        print(f"Cleanup error: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to cleanup browser: {str(e)}")
+        await worker_client.call("cleanup", {"session_id": request.session_id}, session_id=request.session_id)
+    except WorkerError as e:
+        if e.status == 404:
+            raise HTTPException(status_code=404, detail=f"Unknown session: {request.session_id}")
+        raise
+    return {"status": "success", "message": "Browser cleanup complete"}
+
+def _sum_stats(stats: List[Dict[str, Any]], keys: List[str]) -> Dict[str, Any]:
+    return {key: sum(item.get(key) or 0 for item in stats) for key in keys}
+
+@app.get("/sessions")
+async def sessions_endpoint():
+    workers = await worker_client.workers()
+    totals = _sum_stats(
+        [worker["sessions"] for worker in workers],
+        ["max_sessions", "active", "busy", "idle", "pending", "available", "warm_ready"]
+    )
+    return {
+        **totals,
+        "workers": [{"worker_id": worker["worker_id"], **worker["sessions"]} for worker in workers],
+        "browser_events": browser_events.stats(),
+    }
 
-async def emit_browser_event(event_type: str, data: Dict[str, Any]):
-    await browser_events.put({
-        "type": event_type,
-        "data": data
-    })
+async def emit_browser_event(event_type: str, data: Dict[str, Any], session_id: Optional[str] = None):
+    browser_events.publish(event_type, data, session_id)
 
 @app.get("/browser-events")
-async def browser_events_endpoint():
+async def browser_events_endpoint(session_id: Optional[str] = None):
+    subscription = browser_events.subscribe(session_id)
+
     async def event_generator():
-        while True:
-            try:
-                event = await browser_events.get()
-                yield f"data: {json.dumps(event)}\n\n"
-            except asyncio.CancelledError:
-                break
-    
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield keepalive()
+                    continue
+                yield encode_sse(event)
+        finally:
+            browser_events.unsubscribe(subscription)
+
     return StreamingResponse(
         event_generator(),
         media_type="text/event-stream",
@@ -117,317 +146,9 @@ async def browser_events_endpoint():
         }
     )
 
-async def stream_task_agent_response(query: str, page, agent_graph):
-    try:
-        initial_state = {
-            "input": query,
-            "page": page,
-            "master_plan": None,
-            "dom_elements": [],
-            "chat_history": [],
-            "decide_action": None,
-            "actions_taken": [],
-            "actions": None,
-            "response": ""
-        }
-        
-        async for event in agent_graph.astream(
-            initial_state,
-            {"recursion_limit": 400}
-        ):
-            try:
-                # Send keepalive more frequently
-                yield f"data: {{\n  \"type\": \"keepalive\",\n  \"timestamp\": {time.time()}\n}}\n\n"
-                await asyncio.sleep(0.1)  # Small delay to prevent overwhelming
-                
-                if isinstance(event, dict):
-                    if "decide_immediate_action" in event:
-                        thought = event["decide_immediate_action"]["decide_action"]["thought"]
-                        thought_json = json.dumps(thought, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"thought\",\n  \"content\": {thought_json}\n}}\n\n"
-                    
-                    if "decide_url" in event:
-                        action = event["decide_url"]["actions_taken"]
-                        action_json = json.dumps(action, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"action\",\n  \"content\": {action_json}\n}}\n\n"
-                    
-                    # Stream DOM updates
-                    if any(key in event for key in ["get_all_elements", "get_all_input_elements", 
-                                                  "get_all_button_elements", "get_all_link_elements"]):
-                        action = event[list(event.keys())[0]]["actions_taken"]
-                        action_json = json.dumps(action, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"dom_update\",\n  \"content\": {action_json}\n}}\n\n"
-                    
-                    # Stream interactions
-                    if any(key in event for key in ["interact_with_input_elements", 
-                                                  "interact_with_button_elements",
-                                                  "interact_with_link_elements"]):
-                        actions = event[list(event.keys())[0]]["actions"]["element_actions"]
-                        actions_json = json.dumps(actions, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"interaction\",\n  \"content\": {actions_json}\n}}\n\n"
-                    
-                    # Stream browser actions
-                    if any(key in event for key in ["click", "type", "wait", "go_back", "go_to_search"]):
-                        actions = event[list(event.keys())[0]]["actions_taken"]
-                        actions_json = json.dumps(actions, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"browser_action\",\n  \"content\": {actions_json}\n}}\n\n"
-                    
-                    if "respond" in event:
-                        response = event["respond"]["response"]
-                        response_json = json.dumps(response, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"final_response\",\n  \"content\": {response_json}\n}}\n\n"
-                        
-                    # After each event, send another keepalive
-                    yield f"data: {{\n  \"type\": \"keepalive\",\n  \"timestamp\": {time.time()}\n}}\n\n"
-                        
-            except Exception as e:
-                error_json = json.dumps(str(e), ensure_ascii=False)
-                yield f"data: {{\n  \"type\": \"error\",\n  \"content\": {error_json}\n}}\n\n"
-                continue  # Continue processing even if one event fails
-                
-    except Exception as e:
-        error_json = json.dumps(str(e), ensure_ascii=False)
-        yield f"data: {{\n  \"type\": \"error\",\n  \"content\": {error_json}\n}}\n\n"
-    finally:
-        # Ensure we have a small delay before ending
-        await asyncio.sleep(0.5)
-        # Send final keepalive
-        yield f"data: {{\n  \"type\": \"keepalive\",\n  \"timestamp\": {time.time()}\n}}\n\n"
-        # Send completion signal
-        yield f"data: {{\n  \"type\": \"complete\",\n  \"content\": \"Processing completed\"\n}}\n\n"
-        # Small delay before final end message
-        await asyncio.sleep(0.5)
-        # Send end message
-        yield f"data: {{\n  \"type\": \"end\",\n  \"content\": \"Stream completed\"\n}}\n\n"
-
-async def stream_research_agent_response(query: str, page, agent_graph):
-    try:
-        initial_state = {
-            "input": query,
-            "page": page,
-            "dom_elements": [],
-            "action": None,
-            "actions_taken": [],
-            "visited_urls": [],
-            "conversation_history": [],
-            "answer": "",
-            "new_page": False,
-            "is_pdf": False
-        }
-        
-        async for event in agent_graph.astream(
-            initial_state,
-            {"recursion_limit": 400}
-        ):
-            try:
-                # Send keepalive more frequently
-                yield f"data: {{\n  \"type\": \"keepalive\",\n  \"timestamp\": {time.time()}\n}}\n\n"
-                
-                if isinstance(event, dict):
-                    # Handle LLM thoughts
-                    if "llm_call_node" in event:
-                        thought = event["llm_call_node"]["action"]["thought"]
-                        thought_json = json.dumps(thought, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"thought\",\n  \"content\": {thought_json}\n}}\n\n"
-                    
-                    # Handle browser actions
-                    if any(key in event for key in ["click", "type", "wait", "go_back", "go_to_search"]):
-                        actions = event[list(event.keys())[0]]["actions_taken"]
-                        actions_json = json.dumps(actions, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"action\",\n  \"content\": {actions_json}\n}}\n\n"
-                    
-                    # Handle RAG operations
-                    if "web_page_rag" in event:
-                        action = event["web_page_rag"]["actions_taken"]
-                        action_json = json.dumps(action, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"rag_action\",\n  \"content\": {action_json}\n}}\n\n"
-                    
-                    # Handle self review
-                    if "self_review" in event:
-                        action = event["self_review"]["actions_taken"]
-                        action_json = json.dumps(action, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"review\",\n  \"content\": {action_json}\n}}\n\n"
-                    
-                    # Handle closing tabs
-                    if "close_opened_link" in event:
-                        action = event["close_opened_link"]["actions_taken"]
-                        action_json = json.dumps(action, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"close_tab\",\n  \"content\": {action_json}\n}}\n\n"
-                    
-                    # Handle final answer
-                    if "answer_node" in event:
-                        action = event["answer_node"]["actions_taken"]
-                        action_json = json.dumps(action, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"action\",\n  \"content\": {action_json}\n}}\n\n"
-                        
-                        answer = event["answer_node"]["answer"]
-                        answer_json = json.dumps(answer, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"final_answer\",\n  \"content\": {answer_json}\n}}\n\n"
-                        
-                        conversation_history = event["answer_node"]["conversation_history"]
-                        history_json = json.dumps(conversation_history, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"conversation_history\",\n  \"content\": {history_json}\n}}\n\n"
-                    
-                    # Handle RAG store cleanup
-                    if "empty_rag_store" in event:
-                        action = event["empty_rag_store"]["actions_taken"]
-                        action_json = json.dumps(action, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"cleanup\",\n  \"content\": {action_json}\n}}\n\n"
-                        
-                await asyncio.sleep(0.1)  # Small delay between events
-                        
-            except Exception as e:
-                error_json = json.dumps(str(e), ensure_ascii=False)
-                yield f"data: {{\n  \"type\": \"error\",\n  \"content\": {error_json}\n}}\n\n"
-                continue
-                
-    except Exception as e:
-        error_json = json.dumps(str(e), ensure_ascii=False)
-        yield f"data: {{\n  \"type\": \"error\",\n  \"content\": {error_json}\n}}\n\n"
-    finally:
-        await asyncio.sleep(0.5)
-        yield f"data: {{\n  \"type\": \"complete\",\n  \"content\": \"Processing completed\"\n}}\n\n"
-        await asyncio.sleep(0.5)
-        yield f"data: {{\n  \"type\": \"end\",\n  \"content\": \"Stream completed\"\n}}\n\n"
-
-async def stream_deep_research_agent_response(query: str, page, agent_graph):
-    try:
-        initial_state = {
-            "input": query,
-            "page": page,
-            "dom_elements": [],
-            "action": None,
-            "actions_taken": [],
-            "visited_urls": [],
-            "conversation_history": [],
-            "subtopics": [],
-            "subtopic_answers": [],
-            "final_answer": "",
-            "new_page": False,
-            "is_pdf": False,
-            "subtopic_status": [],
-            "subtopic_to_research": "",
-            "number_of_urls_visited": 0,
-            "collect_more_info": False
-        }
-        
-        async for event in agent_graph.astream(
-            initial_state,
-            {"recursion_limit": 400}
-        ):
-            try:
-                # Send keepalive more frequently
-                yield f"data: {{\n  \"type\": \"keepalive\",\n  \"timestamp\": {time.time()}\n}}\n\n"
-                
-                if isinstance(event, dict):
-                    # Handle topic breakdown
-                    if "topic_breakdown" in event:
-                        subtopics = event["topic_breakdown"]["subtopics"]
-                        subtopics_json = json.dumps(subtopics, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"subtopics\",\n  \"content\": {subtopics_json}\n}}\n\n"
-                    
-                    # Handle LLM thoughts
-                    if "llm_call_node" in event:
-                        thought = event["llm_call_node"]["action"]["thought"]
-                        thought_json = json.dumps(thought, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"thought\",\n  \"content\": {thought_json}\n}}\n\n"
-                    
-                    # Handle browser actions
-                    if any(key in event for key in ["click", "type", "wait", "go_back", "go_to_search"]):
-                        action = event[list(event.keys())[0]]["actions_taken"]
-                        action_json = json.dumps(action, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"browser_action\",\n  \"content\": {action_json}\n}}\n\n"
-                    
-                    # Handle RAG operations
-                    if "web_page_rag" in event:
-                        action = event["web_page_rag"]["actions_taken"]
-                        action_json = json.dumps(action, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"rag_action\",\n  \"content\": {action_json}\n}}\n\n"
-                    
-                    # Handle self review
-                    if "self_review" in event:
-                        action = event["self_review"]["actions_taken"]
-                        action_json = json.dumps(action, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"review\",\n  \"content\": {action_json}\n}}\n\n"
-                    
-                    # Handle subtopic answers
-                    if "subtopic_answer_node" in event:
-                        action = event["subtopic_answer_node"]["actions_taken"]
-                        action_json = json.dumps(action, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"subtopic_answer\",\n  \"content\": {action_json}\n}}\n\n"
-                        
-                        subtopic_status = event["subtopic_answer_node"]["subtopic_status"]
-                        status_json = json.dumps(subtopic_status, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"subtopic_status\",\n  \"content\": {status_json}\n}}\n\n"
-                    
-                    # Handle closing tabs
-                    if "close_opened_link" in event:
-                        action = event["close_opened_link"]["actions_taken"]
-                        action_json = json.dumps(action, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"close_tab\",\n  \"content\": {action_json}\n}}\n\n"
-                    
-                    # Handle research compilation
-                    if "compile_research" in event:
-                        action = event["compile_research"]["actions_taken"]
-                        action_json = json.dumps(action, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"compile\",\n  \"content\": {action_json}\n}}\n\n"
-                        
-                        answer = event["compile_research"]["final_answer"]
-                        answer_json = json.dumps(answer, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"final_answer\",\n  \"content\": {answer_json}\n}}\n\n"
-                        
-                        conversation_history = event["compile_research"]["conversation_history"]
-                        history_json = json.dumps(conversation_history, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"conversation_history\",\n  \"content\": {history_json}\n}}\n\n"
-                    
-                    # Handle RAG store cleanup
-                    if "empty_rag_store" in event:
-                        action = event["empty_rag_store"]["actions_taken"]
-                        action_json = json.dumps(action, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"cleanup\",\n  \"content\": {action_json}\n}}\n\n"
-                        
-                await asyncio.sleep(0.1)  # Small delay between events
-                        
-            except Exception as e:
-                error_json = json.dumps(str(e), ensure_ascii=False)
-                yield f"data: {{\n  \"type\": \"error\",\n  \"content\": {error_json}\n}}\n\n"
-                continue
-                
-    except Exception as e:
-        error_json = json.dumps(str(e), ensure_ascii=False)
-        yield f"data: {{\n  \"type\": \"error\",\n  \"content\": {error_json}\n}}\n\n"
-    finally:
-        await asyncio.sleep(0.5)
-        yield f"data: {{\n  \"type\": \"complete\",\n  \"content\": \"Processing completed\"\n}}\n\n"
-        await asyncio.sleep(0.5)
-        yield f"data: {{\n  \"type\": \"end\",\n  \"content\": \"Stream completed\"\n}}\n\n"
-
-@app.post("/query")
-async def query_agent(request: QueryRequest):
-    if not browser_session["page"]:
-        raise HTTPException(
-            status_code=400, 
-            detail="Browser not initialized. Call /setup-browser first"
-        )
-    
-    agent_graphs = {
-        "task": task_agent,
-        "research": research_agent,
-        "deep_research": deep_research_agent
-    }
-    
-    stream_handlers = {
-        "task": stream_task_agent_response,
-        "research": stream_research_agent_response,
-        "deep_research": stream_deep_research_agent_response
-    }
-    
+def sse_response(stream) -> StreamingResponse:
     return StreamingResponse(
-        stream_handlers[request.agent_type](
-            request.query, 
-            browser_session["page"],
-            agent_graphs[request.agent_type]
-        ),
+        stream,
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -436,72 +157,178 @@ async def query_agent(request: QueryRequest):
         }
     )
 
+@app.post("/query")
+async def query_agent(request: QueryRequest, http_request: Request):
+    stream = await worker_client.stream(
+        "query",
+        {
+            "session_id": request.session_id,
+            "agent_type": request.agent_type,
+            "query": request.query,
+            "force_refresh": request.force_refresh,
+            "priority": request.priority,
+        },
+        session_id=request.session_id,
+        is_disconnected=http_request.is_disconnected
+    )
+    return sse_response(stream)
+
+class SyncQueryRequest(BaseModel):
+    query: str
+    agent_type: Literal["task", "research", "deep_research"]
+    # Without a session the run borrows a browser from the pool
+    session_id: Optional[str] = None
+    force_refresh: bool = False
+    priority: Optional[Literal["interactive", "standard", "batch"]] = None
+
+@app.post("/query:sync")
+async def query_agent_sync(request: SyncQueryRequest):
+    return await worker_client.call(
+        "query_sync",
+        request.model_dump(),
+        session_id=request.session_id,
+        timeout=SYNC_QUERY_TIMEOUT
+    )
+
+class ResumeRequest(BaseModel):
+    session_id: str
+
+@app.get("/runs/{run_id}/trace")
+async def run_trace(run_id: str):
+    # Only the worker that ran it has the trace in its runs database
+    trace = await worker_client.call("get_trace", {"run_id": run_id}, run_id=run_id)
+    return JSONResponse(trace, headers={"Content-Disposition": f'attachment; filename="trace-{run_id}.json"'})
+
+@app.get("/runs/{run_id}/events")
+async def run_events(run_id: str, http_request: Request, last_event_id: Optional[int] = None):
+    # An EventSource reconnecting sends the ID of the last event it got, only later ones are replayed
+    header = http_request.headers.get("last-event-id")
+    if header and header.isdigit():
+        last_event_id = int(header)
+    stream = await worker_client.stream(
+        "run_events",
+        {"run_id": run_id, "last_event_id": last_event_id or 0},
+        run_id=run_id,
+        is_disconnected=http_request.is_disconnected
+    )
+    return sse_response(stream)
+
+@app.post("/runs/{run_id}/resume")
+async def resume_run(run_id: str, request: ResumeRequest, http_request: Request):
+    stream = await worker_client.stream(
+        "resume",
+        {"run_id": run_id, "session_id": request.session_id},
+        session_id=request.session_id,
+        is_disconnected=http_request.is_disconnected
+    )
+    return sse_response(stream)
+
+class JobSpec(BaseModel):
+    query: str
+    agent_type: Literal["task", "research", "deep_research"]
+    force_refresh: bool = False
+
+class JobsRequest(BaseModel):
+    jobs: List[JobSpec]
+
+@app.post("/jobs")
+async def submit_jobs(request: JobsRequest):
+    return await worker_client.call("submit_jobs", {"jobs": [job.model_dump() for job in request.jobs]})
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/event-loop")
+async def event_loop_stalls():
+    return loop_monitor.stats()
+
+@app.get("/cache")
+async def cache_stats():
+    caches = [worker["cache"] for worker in await worker_client.workers()]
+    totals = _sum_stats(caches, ["hits", "misses"])
+    lookups = totals["hits"] + totals["misses"]
+    return {
+        "ttl": caches[0].get("ttl") if caches else None,
+        **totals,
+        "hit_ratio": round(totals["hits"] / lookups, 3) if lookups else None,
+    }
+
+@app.get("/llm")
+async def llm_gateway_stats():
+    workers = await worker_client.workers()
+    return {
+        "rejected_runs": sum(worker.get("llm", {}).get("rejected_runs", 0) for worker in workers),
+        "workers": [
+            {"worker_id": worker["worker_id"], **worker.get("llm", {}), "scheduler": worker.get("scheduler", {})}
+            for worker in workers
+        ],
+    }
+
+@app.get("/network")
+async def network_profile_stats():
+    """
+    Page loads, load time, transfer size and blocked requests per network
+    blocking profile, summed over the workers. Bytes saved are estimated from
+    typical sizes, a blocked request is never downloaded.
+    """
+    workers = await worker_client.workers()
+    profiles: Dict[str, Dict[str, float]] = {}
+    for worker in workers:
+        for name, stats in worker.get("network", {}).items():
+            totals = profiles.setdefault(name, {})
+            for key, value in stats.items():
+                totals[key] = totals.get(key, 0) + value
+    for totals in profiles.values():
+        loads = totals["page_loads"]
+        totals["mean_load_seconds"] = round(totals["load_seconds"] / loads, 3) if loads else None
+        totals["mean_transfer_bytes"] = round(totals["transfer_bytes"] / loads) if loads else None
+    return {"profiles": profiles}
+
+@app.get("/jobs")
+async def jobs_status():
+    workers = await worker_client.workers()
+    counts: Dict[str, int] = {}
+    for worker in workers:
+        for status, count in worker["jobs"].get("jobs", {}).items():
+            counts[status] = counts.get(status, 0) + count
+    return {
+        **_sum_stats([worker["jobs"] for worker in workers], ["workers", "queued"]),
+        "jobs": counts,
+    }
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = await worker_client.job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
 
 @app.post("/api/docs/type")
 async def type_in_docs(request: Request):
     try:
-        if not browser_session["page"]:
-            return JSONResponse(
-                status_code=400,
-                content={"error": "Browser not initialized. Call /setup-browser first"}
-            )
-
         data = await request.json()
         content = data.get('content')
-        
+        session_id = data.get('session_id')
+
         if not content:
             return JSONResponse(
                 status_code=400,
                 content={"error": "Content is required"}
             )
 
-        page = browser_session["page"]
-        await page.goto('https://docs.google.com/document/create')
-        await page.wait_for_load_state("domcontentloaded")
-        await asyncio.sleep(2)  # Wait for editor to be fully loaded
-
-        # Wait for and click the editor canvas
-        editor_selector = ".kix-appview-editor"
-        await page.wait_for_selector(editor_selector)
-        editor = await page.query_selector(editor_selector)
-        
-        if editor:
-            bbox = await editor.bounding_box()
-            if bbox:
-                # Click in the middle of the editor
-                x = bbox['x'] + bbox['width'] / 2
-                y = bbox['y'] + bbox['height'] / 2
-                
-                await page.mouse.click(x, y)
-                await asyncio.sleep(1)
-
-                state = {
-                    "page": page,
-                    "action": {
-                        "action_element": {
-                            "type": "text_editor",
-                            "description": "Google Docs editor",
-                            "x": x,
-                            "y": y,
-                            "xpath": f"//div[contains(@class, 'kix-appview-editor')]",
-                            "inViewport": True
-                        },
-                        "args": content
-                    }
-                }
-                
-                result = await type(state)
-                
-                return JSONResponse(
-                    status_code=200,
-                    content={"message": "Content typed successfully", "actions": result["actions_taken"]}
-                )
-        
+        result = await worker_client.call(
+            "type_docs", {"session_id": session_id, "content": content}, session_id=session_id
+        )
+        return JSONResponse(status_code=result["status_code"], content=result["content"])
+
+    except WorkerError as e:
+        detail = e.detail if e.status < 500 else f"Failed to type content: {e.detail}"
         return JSONResponse(
-            status_code=500,
-            content={"error": "Text editor not found"}
+            status_code=e.status,
+            content={"error": detail}
         )
-            
     except Exception as e:
         return JSONResponse(
             status_code=500,
@@ -0,0 +1,325 @@
+import functools
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from .tracing import trace_span, model_name, token_usage
+
+
+# Seconds, from a quick DOM query up to a slow deep research node
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self,
+                 name: str,
+                 documentation: str,
+                 labelnames: Sequence[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS,
+                 span_kind: Optional[str] = None):
+        self.name = name
+        # Timed blocks also become spans of this kind in the run's trace
+        self.span_kind = span_kind
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: non-cumulative bucket counts (plus +Inf), sum, count
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            counts, totals = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0, 0]))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-1] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    def time(self, **labels: Any) -> "Timer":
+        return Timer(self, labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, totals) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    labels = _format_labels(self.labelnames, key, f'le="{le}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {totals[0]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {totals[1]}")
+        return lines
+
+
+class Timer:
+    """Observes the elapsed time of a block, usable with both `with` and `async with`"""
+
+    def __init__(self, histogram: Histogram, labels: Dict[str, Any]):
+        self.histogram = histogram
+        self.labels = labels
+        self.start = 0.0
+        self.span = None
+        if histogram.span_kind:
+            self.span = trace_span(labels.get("operation", histogram.name), histogram.span_kind)
+
+    def annotate(self, **attributes: Any) -> None:
+        """Attach attributes to the trace span of this block"""
+        if self.span is not None:
+            self.span.annotate(**attributes)
+
+    def __enter__(self):
+        if self.span is not None:
+            self.span.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        if self.span is not None:
+            self.span.__exit__(*exc_info)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, *exc_info):
+        return self.__exit__(*exc_info)
+
+
+REGISTRY: List[Any] = []
+
+
+def _register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+runs_total = _register(Counter(
+    "webrover_runs_total", "Agent runs by final status", ("agent_type", "status")))
+run_steps = _register(Histogram(
+    "webrover_run_steps", "Graph nodes executed per run", ("agent_type",),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 400)))
+node_seconds = _register(Histogram(
+    "webrover_node_duration_seconds", "Time spent in each graph node", ("agent_type", "node")))
+node_errors_total = _register(Counter(
+    "webrover_node_errors_total", "Graph nodes that raised", ("agent_type", "node")))
+retries_total = _register(Counter(
+    "webrover_retries_total", "Retried agent actions, navigations and jobs", ("reason",)))
+llm_seconds = _register(Histogram(
+    "webrover_llm_request_duration_seconds", "LLM request latency", ("model",)))
+llm_tokens_total = _register(Counter(
+    "webrover_llm_tokens_total", "LLM tokens used", ("model", "kind")))
+llm_errors_total = _register(Counter(
+    "webrover_llm_errors_total", "Failed LLM requests", ("model",)))
+llm_queue_wait_seconds = _register(Histogram(
+    "webrover_llm_queue_wait_seconds", "Time LLM requests waited in the gateway for a slot and token budget",
+    ("model", "priority")))
+llm_queue_depth = _register(Gauge(
+    "webrover_llm_queue_depth", "LLM requests waiting in the gateway", ("model",)))
+llm_in_flight = _register(Gauge(
+    "webrover_llm_in_flight", "LLM requests currently sent to the provider", ("model",)))
+llm_rate_limited_total = _register(Counter(
+    "webrover_llm_rate_limited_total", "Provider 429 responses retried by the gateway", ("model",)))
+runs_rejected_total = _register(Counter(
+    "webrover_runs_rejected_total", "Runs refused before starting because the LLM budget was exhausted"))
+browser_seconds = _register(Histogram(
+    "webrover_browser_call_duration_seconds", "Playwright call latency", ("operation",),
+    span_kind="browser"))
+browser_startup_seconds = _register(Histogram(
+    "webrover_browser_startup_seconds",
+    "Time from launching Chrome until DevTools was ready (launch) and until the CDP connection was up (connect)",
+    ("stage",)))
+network_blocked_requests_total = _register(Counter(
+    "webrover_network_blocked_requests_total", "Requests aborted by the run's network blocking profile",
+    ("profile", "reason")))
+network_bytes_saved_total = _register(Counter(
+    "webrover_network_bytes_saved_total",
+    "Estimated bytes not downloaded because of blocked requests, from typical sizes per resource type",
+    ("profile",)))
+page_load_seconds = _register(Histogram(
+    "webrover_page_load_seconds", "Time from a page navigation to its load event", ("profile",)))
+page_transfer_bytes = _register(Histogram(
+    "webrover_page_transfer_bytes", "Bytes transferred per page load, response headers and bodies as received", ("profile",),
+    buckets=(10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000, 10_000_000, 25_000_000)))
+browsers_recycled_total = _register(Counter(
+    "webrover_browsers_recycled_total",
+    "Closed sessions' browsers reset and parked for reuse (recycled) or closed instead, by reason",
+    ("outcome",)))
+text_entry_seconds = _register(Histogram(
+    "webrover_text_entry_duration_seconds", "Time to enter a block of text into a field", ("method",)))
+embedding_seconds = _register(Histogram(
+    "webrover_embedding_duration_seconds", "Embedding request latency", ("operation",),
+    span_kind="embedding"))
+vector_store_seconds = _register(Histogram(
+    "webrover_vector_store_duration_seconds", "Chroma operation latency", ("operation",),
+    span_kind="vector_store"))
+loop_lag_seconds = _register(Histogram(
+    "webrover_event_loop_lag_seconds", "How late the event loop woke up from a short sleep", (),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)))
+loop_stalls_total = _register(Counter(
+    "webrover_event_loop_stalls_total", "Event loop stalls over the reporting threshold"))
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def _timed_method(operation: str, method):
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        with browser_seconds.time(operation=operation) as timer:
+            if operation == "page.goto":
+                timer.annotate(url=kwargs.get("url", args[1] if len(args) > 1 else None))
+            return await method(*args, **kwargs)
+    wrapper._webrover_timed = True
+    return wrapper
+
+
+# Playwright calls that dominate agent node time
+BROWSER_OPERATIONS = {
+    "Page": ("goto", "evaluate", "go_back", "reload", "wait_for_load_state", "screenshot", "bring_to_front", "close"),
+    "ElementHandle": ("click", "type", "scroll_into_view_if_needed", "evaluate"),
+    "Keyboard": ("type", "press", "insert_text"),
+    "Mouse": ("click", "wheel", "move"),
+}
+
+
+def instrument_playwright() -> None:
+    """Time every browser call by wrapping the Playwright async API classes, once per process"""
+    from playwright import async_api
+
+    for class_name, methods in BROWSER_OPERATIONS.items():
+        cls = getattr(async_api, class_name)
+        for method_name in methods:
+            method = getattr(cls, method_name)
+            if getattr(method, "_webrover_timed", False):
+                continue
+            operation = f"{class_name[0].lower()}{class_name[1:]}.{method_name}"
+            setattr(cls, method_name, _timed_method(operation, method))
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    Times the graph nodes and LLM requests of one run. Passed in the run config,
+    LangChain hands it to every runnable the graph calls.
+    """
+
+    # Only bookkeeping, no need for a thread hop per callback
+    run_inline = True
+
+    def __init__(self, agent_type: str):
+        self.agent_type = agent_type
+        self.steps = 0
+        self._nodes: Dict[UUID, Tuple[str, float]] = {}
+        self._llm_calls: Dict[UUID, Tuple[str, float]] = {}
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        # Chains nested inside a node share its metadata, the node itself is the one named after it
+        if node and kwargs.get("name") == node:
+            self.steps += 1
+            self._nodes[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs):
+        started = self._nodes.pop(run_id, None)
+        if started:
+            node_seconds.observe(time.perf_counter() - started[1], agent_type=self.agent_type, node=started[0])
+
+    def on_chain_error(self, error, *, run_id: UUID, **kwargs):
+        started = self._nodes.pop(run_id, None)
+        if started:
+            node_seconds.observe(time.perf_counter() - started[1], agent_type=self.agent_type, node=started[0])
+            node_errors_total.inc(agent_type=self.agent_type, node=started[0])
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata=None, **kwargs):
+        self._llm_calls[run_id] = (model_name(serialized, metadata, kwargs), time.perf_counter())
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, metadata=None, **kwargs):
+        self._llm_calls[run_id] = (model_name(serialized, metadata, kwargs), time.perf_counter())
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs):
+        started = self._llm_calls.pop(run_id, None)
+        if started:
+            model, start = started
+            llm_seconds.observe(time.perf_counter() - start, model=model)
+            for kind, count in token_usage(response).items():
+                if count:
+                    llm_tokens_total.inc(count, model=model, kind=kind)
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs):
+        started = self._llm_calls.pop(run_id, None)
+        if started:
+            llm_errors_total.inc(model=started[0])
+
+    def finish(self, status: str) -> None:
+        """Record the run once it has stopped"""
+        runs_total.inc(agent_type=self.agent_type, status=status)
+        run_steps.observe(self.steps, agent_type=self.agent_type)
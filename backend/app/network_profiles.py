@@ -0,0 +1,285 @@
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+from playwright.async_api import BrowserContext, Page, Request, Route
+
+from .metrics import network_blocked_requests_total, network_bytes_saved_total, page_load_seconds, page_transfer_bytes
+
+
+# Analytics and tracking beacons, never needed to read or use a page
+TRACKER_DOMAINS = (
+    "google-analytics.com", "googletagmanager.com", "analytics.google.com", "stats.g.doubleclick.net",
+    "connect.facebook.net", "pixel.facebook.com", "analytics.twitter.com", "static.ads-twitter.com",
+    "bat.bing.com", "clarity.ms", "hotjar.com", "hotjar.io", "segment.io", "segment.com", "cdn.segment.com",
+    "mixpanel.com", "amplitude.com", "fullstory.com", "heap.io", "heapanalytics.com", "newrelic.com",
+    "nr-data.net", "scorecardresearch.com", "quantserve.com", "chartbeat.com", "chartbeat.net",
+    "mouseflow.com", "crazyegg.com", "optimizely.com", "px.ads.linkedin.com", "snap.licdn.com",
+    "sentry.io", "bugsnag.com", "omtrdc.net", "demdex.net", "krxd.net", "parsely.com",
+)
+
+# Ad servers and exchanges
+AD_DOMAINS = (
+    "doubleclick.net", "googlesyndication.com", "googleadservices.com", "adservice.google.com",
+    "amazon-adsystem.com", "adnxs.com", "criteo.com", "criteo.net", "taboola.com", "outbrain.com",
+    "rubiconproject.com", "pubmatic.com", "openx.net", "casalemedia.com", "adsrvr.org", "moatads.com",
+    "serving-sys.com", "advertising.com", "media.net", "yieldmo.com", "sharethrough.com", "teads.tv",
+    "smartadserver.com", "3lift.com", "bidswitch.net", "adform.net", "zedo.com", "revcontent.com",
+)
+
+# Typical transfer size per resource type, refined from the responses this process downloads,
+# used to estimate what a blocked request would have cost
+_typical_bytes: Dict[str, float] = {
+    "image": 40_000, "media": 500_000, "font": 35_000, "stylesheet": 20_000, "script": 30_000,
+}
+_DEFAULT_BYTES = 5_000
+
+
+class DomainBlocklist:
+    """
+    Domains blocked together with their subdomains. A host is matched by set
+    lookups of its suffixes (a.b.example.com, b.example.com, example.com), so
+    checking a request costs a few hash lookups whatever the list's size.
+    """
+
+    def __init__(self, domains: Iterable[str]):
+        self.domains: FrozenSet[str] = frozenset(
+            domain.strip().lower().lstrip(".") for domain in domains if domain.strip()
+        )
+
+    def __len__(self) -> int:
+        return len(self.domains)
+
+    def matches(self, host: str) -> bool:
+        host = host.lower().rstrip(".")
+        while host:
+            if host in self.domains:
+                return True
+            _, _, host = host.partition(".")
+        return False
+
+
+def read_blocklist(path: str) -> List[str]:
+    """Domains from a file with one per line, or in hosts-file format ("0.0.0.0 ads.example.com")"""
+    domains = []
+    with open(path) as f:
+        for line in f:
+            fields = line.split("#", 1)[0].split()
+            if fields:
+                domains.append(fields[-1])
+    return domains
+
+
+# Named domain lists profiles can block; WEBROVER_BLOCKLIST_FILE extends "ads"
+BLOCKLISTS: Dict[str, List[str]] = {
+    "trackers": list(TRACKER_DOMAINS),
+    "ads": list(AD_DOMAINS),
+}
+if os.getenv("WEBROVER_BLOCKLIST_FILE"):
+    BLOCKLISTS["ads"] += read_blocklist(os.environ["WEBROVER_BLOCKLIST_FILE"])
+
+
+@dataclass(frozen=True)
+class NetworkProfile:
+    name: str
+    # Playwright resource types to abort, e.g. "image", "font", "media", "stylesheet"
+    resource_types: FrozenSet[str]
+    blocklist: DomainBlocklist
+
+    @property
+    def blocks_anything(self) -> bool:
+        return bool(self.resource_types or len(self.blocklist))
+
+
+def _profile(name: str, resource_types: Iterable[str] = (), blocklists: Iterable[str] = ()) -> NetworkProfile:
+    domains = [domain for blocklist in blocklists for domain in BLOCKLISTS[blocklist]]
+    return NetworkProfile(name, frozenset(resource_types), DomainBlocklist(domains))
+
+
+# Task runs look at screenshots, so they keep images and styles; research runs only read
+# the text, and PDFs are fetched separately by scrape_pdf
+PROFILES: Dict[str, NetworkProfile] = {
+    "off": _profile("off"),
+    "task": _profile("task", blocklists=("trackers",)),
+    "research": _profile("research", ("image", "font", "media"), ("trackers", "ads")),
+}
+# More profiles, or replacements, as {"name": {"resource_types": [...], "blocklists": ["trackers", "ads"]}}
+for _name, _spec in json.loads(os.getenv("WEBROVER_NETWORK_PROFILES", "{}")).items():
+    PROFILES[_name] = _profile(_name, _spec.get("resource_types", ()), _spec.get("blocklists", ()))
+
+AGENT_PROFILES: Dict[str, str] = {
+    "task": "task",
+    "research": "research",
+    "deep_research": "research",
+    **json.loads(os.getenv("WEBROVER_AGENT_NETWORK_PROFILES", "{}")),
+}
+
+
+def profile_for(agent_type: str) -> NetworkProfile:
+    return PROFILES[AGENT_PROFILES.get(agent_type, "off")]
+
+
+def _totals() -> Dict[str, float]:
+    return {
+        "page_loads": 0, "load_seconds": 0.0, "transfer_bytes": 0, "blocked_requests": 0, "estimated_bytes_saved": 0.0,
+    }
+
+
+# Per profile, reported in the worker heartbeat
+_stats: Dict[str, Dict[str, float]] = {}
+
+
+class NetworkBlocker:
+    """
+    Blocks requests on one browser context according to its current profile,
+    whether the context is the CDP-attached Chrome's or a managed one. A single
+    route is installed while the profile blocks anything and removed otherwise,
+    so switching profiles between runs adds no per-request work; Playwright
+    bypasses the HTTP cache while a route is installed, so only "off" keeps it.
+    Page loads are timed and the bytes they actually transferred (nothing for a
+    cache hit) counted under the profile they ran with.
+    """
+
+    def __init__(self, context: BrowserContext):
+        self.context = context
+        self.profile = PROFILES["off"]
+        self._routed = False
+        context.on("page", self._watch_page)
+        for page in context.pages:
+            self._watch_page(page)
+
+    async def use(self, profile: NetworkProfile) -> None:
+        self.profile = profile
+        if profile.blocks_anything and not self._routed:
+            await self.context.route("**/*", self._handle)
+            self._routed = True
+        elif not profile.blocks_anything and self._routed:
+            await self.context.unroute("**/*", self._handle)
+            self._routed = False
+
+    def _block_reason(self, request: Request) -> Optional[str]:
+        if request.is_navigation_request() and request.frame.parent_frame is None:
+            # Whatever the agent navigates to itself is always loaded
+            return None
+        if request.resource_type in self.profile.resource_types:
+            return request.resource_type
+        host = urlsplit(request.url).hostname
+        if host and self.profile.blocklist.matches(host):
+            return "domain"
+        return None
+
+    async def _handle(self, route: Route) -> None:
+        request = route.request
+        profile = self.profile
+        try:
+            reason = self._block_reason(request)
+        except Exception:
+            # e.g. a service worker request, which has no frame
+            reason = None
+        if reason is None:
+            await route.fallback()
+            return
+        saved = _typical_bytes.get(request.resource_type, _DEFAULT_BYTES)
+        network_blocked_requests_total.inc(profile=profile.name, reason=reason)
+        network_bytes_saved_total.inc(saved, profile=profile.name)
+        stats = _stats.setdefault(profile.name, _totals())
+        stats["blocked_requests"] += 1
+        stats["estimated_bytes_saved"] += saved
+        await route.abort("blockedbyclient")
+
+    def _watch_page(self, page: Page) -> None:
+        # Requests made while a page was loading, mapped to that load's record
+        pending: Dict[Request, Dict[str, Any]] = {}
+        current: Optional[Dict[str, Any]] = None
+
+        def on_request(request: Request):
+            nonlocal current
+            if (request.is_navigation_request() and request.frame.parent_frame is None
+                    and request.redirected_from is None):
+                if current is not None:
+                    finish(current, force=True)
+                current = {"started": time.monotonic(), "seconds": None, "bytes": 0, "waiting": 0,
+                           "profile": self.profile.name}
+            if current is not None and current["seconds"] is None:
+                current["waiting"] += 1
+                pending[request] = current
+
+        async def on_request_finished(request: Request):
+            try:
+                sizes = await request.sizes()
+            except Exception:
+                # The page went away meanwhile
+                sizes = {}
+            # What went over the wire, so nothing for a response served from the HTTP cache
+            size = sizes.get("responseHeadersSize", 0) + sizes.get("responseBodySize", 0)
+            if size > 0 and request.resource_type in _typical_bytes:
+                _typical_bytes[request.resource_type] = 0.9 * _typical_bytes[request.resource_type] + 0.1 * size
+            on_request_done(request, size)
+
+        def on_request_done(request: Request, size: int = 0):
+            load = pending.pop(request, None)
+            if load is not None:
+                load["bytes"] += size
+                load["waiting"] -= 1
+                finish(load)
+
+        def on_load(_):
+            if current is not None and current["seconds"] is None:
+                current["seconds"] = time.monotonic() - current["started"]
+                finish(current)
+
+        def finish(load: Dict[str, Any], force: bool = False):
+            # Recorded once the page has loaded and every request it made before then is done, or
+            # with what it has so far when the next navigation starts or the page closes first
+            if load.get("recorded") or load["seconds"] is None or (load["waiting"] > 0 and not force):
+                return
+            load["recorded"] = True
+            page_load_seconds.observe(load["seconds"], profile=load["profile"])
+            page_transfer_bytes.observe(load["bytes"], profile=load["profile"])
+            stats = _stats.setdefault(load["profile"], _totals())
+            stats["page_loads"] += 1
+            stats["load_seconds"] += load["seconds"]
+            stats["transfer_bytes"] += load["bytes"]
+
+        def on_close(_):
+            if current is not None:
+                finish(current, force=True)
+            pending.clear()
+
+        page.on("request", on_request)
+        page.on("requestfinished", on_request_finished)
+        page.on("requestfailed", on_request_done)
+        page.on("load", on_load)
+        page.on("close", on_close)
+
+
+_blockers: Dict[int, NetworkBlocker] = {}
+
+
+async def use_network_profile(context: BrowserContext, agent_type: str) -> NetworkProfile:
+    """
+    Apply the agent's blocking profile to the context, attaching a blocker on
+    first use. Returns the profile it replaced, for restore_network_profile.
+    """
+    blocker = _blockers.get(id(context))
+    if blocker is None or blocker.context is not context:
+        blocker = _blockers[id(context)] = NetworkBlocker(context)
+        context.on("close", lambda _: _blockers.pop(id(context), None))
+    previous = blocker.profile
+    await blocker.use(profile_for(agent_type))
+    return previous
+
+
+async def restore_network_profile(context: BrowserContext, profile: Optional[NetworkProfile] = None) -> None:
+    """Put back the profile a run replaced, or turn blocking off"""
+    blocker = _blockers.get(id(context))
+    if blocker is not None and blocker.context is context:
+        await blocker.use(profile or PROFILES["off"])
+
+
+def network_stats() -> Dict[str, Dict[str, float]]:
+    """Per profile totals: page loads, their load time and transfer size, blocked requests and estimated savings"""
+    return {name: dict(stats) for name, stats in _stats.items()}
@@ -0,0 +1,84 @@
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from . import parsing
+from .tracing import trace_span
+
+
+# Threads for blocking library calls (article downloads, Chroma)
+BLOCKING_THREADS = int(os.getenv("WEBROVER_BLOCKING_THREADS", "8"))
+
+# Worker processes for CPU bound parsing (HTML, PDF, spaCy sentence splitting)
+PARSE_PROCESSES = int(os.getenv("WEBROVER_PARSE_PROCESSES", str(os.cpu_count() or 2)))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=BLOCKING_THREADS, thread_name_prefix="webrover-blocking")
+    return _executor
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # Spawned rather than forked, the server process has a running loop, threads and browser pipes
+        _process_pool = ProcessPoolExecutor(
+            max_workers=PARSE_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=parsing.warm_worker,
+        )
+    return _process_pool
+
+
+async def run_blocking(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Runs a blocking call on the shared thread pool so it cannot stall the event
+    loop. The caller's context is carried over, so metrics and trace spans
+    recorded inside the call still belong to the calling run.
+    """
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), call)
+
+
+async def run_cpu(func: Callable[..., Any], *args: Any) -> Any:
+    """
+    Runs a CPU bound function from `app.parsing` in a parse worker process, so
+    parsing scales with the cores instead of contending for the server's GIL.
+    A worker that dies takes the pool with it; the pool is rebuilt for the next call.
+    """
+    global _process_pool
+    with trace_span(func.__name__, "cpu"):
+        try:
+            return await asyncio.get_running_loop().run_in_executor(get_process_pool(), func, *args)
+        except BrokenProcessPool:
+            print("Parse worker pool broke, restarting it")
+            _process_pool = None
+            raise
+
+
+async def start_process_pool() -> None:
+    """Start the parse workers up front so the first research run does not pay for loading spaCy"""
+    pool = get_process_pool()
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(loop.run_in_executor(pool, parsing.ping) for _ in range(PARSE_PROCESSES)))
+
+
+def shutdown() -> None:
+    global _executor, _process_pool
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
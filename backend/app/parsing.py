@@ -0,0 +1,63 @@
+from io import BytesIO
+from typing import List, Optional
+
+from langchain_text_splitters import SpacyTextSplitter
+from newspaper import Article
+from newspaper.article import ArticleException
+from PyPDF2 import PdfReader
+
+
+# Synchronous parsing used by the research agents. Downloads run on the
+# blocking thread pool; the CPU bound steps (HTML and PDF parsing, sentence
+# splitting) run in the parse worker processes from `app.offload`, which call
+# `warm_worker` at startup so the spaCy pipeline is loaded once per process.
+
+_splitter: Optional[SpacyTextSplitter] = None
+
+
+def _get_splitter() -> SpacyTextSplitter:
+    global _splitter
+    if _splitter is None:
+        _splitter = SpacyTextSplitter(chunk_size=500, chunk_overlap=10)
+    return _splitter
+
+
+def warm_worker() -> None:
+    """Process pool initializer, loads the spaCy pipeline before the first task arrives"""
+    _get_splitter()
+
+
+def ping() -> bool:
+    return True
+
+
+def fetch_article_html(url: str) -> str:
+    """Downloads an article's HTML, raising if it cannot be fetched"""
+    article = Article(url)
+    article.download()
+    if not article.html:
+        # newspaper records download failures instead of raising
+        raise ArticleException(article.download_exception_msg or f"Failed to download {url}")
+    return article.html
+
+
+def parse_article_html(url: str, html: str) -> str:
+    """Extracts the article text from already downloaded HTML"""
+    article = Article(url)
+    article.download(input_html=html)
+    article.parse()
+    return article.text
+
+
+def extract_pdf_text(content: bytes) -> str:
+    reader = PdfReader(BytesIO(content))
+    text = ""
+    for page_obj in reader.pages:
+        page_text = page_obj.extract_text()
+        if page_text:
+            text += page_text + "\n"
+    return text
+
+
+def split_text(data: str) -> List[str]:
+    return _get_splitter().split_text(data)
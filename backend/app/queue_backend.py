@@ -0,0 +1,285 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiosqlite
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # redis is only needed for the redis:// backend
+    redis = None
+
+
+# Where the API and worker tiers exchange messages: memory:// (single process),
+# sqlite:///path/to/queue.sqlite (processes on one machine) or redis://host:port
+QUEUE_URL = os.getenv("WEBROVER_QUEUE_URL", "memory://")
+
+# Seconds between polls of the SQLite backend, which has no blocking pop
+SQLITE_POLL_INTERVAL = 0.05
+
+# Seconds a dropped queue is remembered by the memory backend, so late pushes to it are discarded
+DROPPED_QUEUE_MEMORY = 600
+
+
+class QueueBackend:
+    """
+    Named FIFO queues of JSON messages plus a small key-value store with
+    expiry. Queues carry commands and replies between tiers; the key-value store
+    holds session routes, worker heartbeats and job states.
+    """
+
+    shared = True
+
+    async def push(self, queue: str, message: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        """
+        Append a message. With `ttl`, the queue (or the message, where the backend
+        cannot expire queues) goes away if it is not read for that many seconds,
+        so replies to a client that left cannot pile up.
+        """
+        raise NotImplementedError
+
+    async def pop(self, queue: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Wait up to `timeout` seconds for the next message, None if there was none"""
+        raise NotImplementedError
+
+    async def drop(self, queue: str) -> None:
+        """Discard a queue that will not be read again, e.g. a finished reply queue; expiring pushes to it are lost"""
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def scan(self, prefix: str) -> List[Dict[str, Any]]:
+        """Values of every live key starting with `prefix`"""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryQueueBackend(QueueBackend):
+    """In-process backend for development, the API and a worker run in the same process"""
+
+    shared = False
+
+    def __init__(self):
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._values: Dict[str, Tuple[Dict[str, Any], Optional[float]]] = {}
+        # Dropped queue name -> when it was dropped
+        self._dropped: Dict[str, float] = {}
+
+    def _queue(self, queue: str) -> asyncio.Queue:
+        if queue not in self._queues:
+            self._queues[queue] = asyncio.Queue()
+        return self._queues[queue]
+
+    async def push(self, queue: str, message: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        if ttl and queue in self._dropped:
+            # Nobody reads it any more, recreating it would leak it
+            return
+        self._queue(queue).put_nowait(message)
+
+    async def pop(self, queue: str, timeout: float) -> Optional[Dict[str, Any]]:
+        try:
+            return await asyncio.wait_for(self._queue(queue).get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def drop(self, queue: str) -> None:
+        self._queues.pop(queue, None)
+        now = time.monotonic()
+        self._dropped[queue] = now
+        for name in [name for name, dropped_at in self._dropped.items() if now - dropped_at > DROPPED_QUEUE_MEMORY]:
+            del self._dropped[name]
+
+    async def set(self, key: str, value: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        self._values[key] = (value, time.time() + ttl if ttl else None)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at < time.time():
+            self._values.pop(key, None)
+            return None
+        return value
+
+    async def delete(self, key: str) -> None:
+        self._values.pop(key, None)
+
+    async def scan(self, prefix: str) -> List[Dict[str, Any]]:
+        values = []
+        for key in [key for key in self._values if key.startswith(prefix)]:
+            value = await self.get(key)
+            if value is not None:
+                values.append(value)
+        return values
+
+
+class SqliteQueueBackend(QueueBackend):
+    """Backend in a SQLite file, for API and worker processes on the same machine"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn: Optional[aiosqlite.Connection] = None
+
+    async def connect(self) -> None:
+        self.conn = await aiosqlite.connect(self.path)
+        await self.conn.execute("PRAGMA journal_mode=WAL")
+        await self.conn.execute("PRAGMA busy_timeout=5000")
+        await self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS queue_messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                queue TEXT NOT NULL,
+                body TEXT NOT NULL
+            )
+        """)
+        async with self.conn.execute("PRAGMA table_info(queue_messages)") as cursor:
+            columns = [row[1] for row in await cursor.fetchall()]
+        if "expires_at" not in columns:
+            await self.conn.execute("ALTER TABLE queue_messages ADD COLUMN expires_at REAL")
+        await self.conn.execute("CREATE INDEX IF NOT EXISTS queue_messages_queue ON queue_messages (queue, id)")
+        await self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS queue_values (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL
+            )
+        """)
+        await self.conn.commit()
+
+    async def push(self, queue: str, message: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        await self.conn.execute(
+            "INSERT INTO queue_messages (queue, body, expires_at) VALUES (?, ?, ?)",
+            (queue, json.dumps(message), time.time() + ttl if ttl else None)
+        )
+        await self.conn.commit()
+
+    async def pop(self, queue: str, timeout: float) -> Optional[Dict[str, Any]]:
+        deadline = time.monotonic() + timeout
+        while True:
+            # A single statement, so two processes can never take the same message; expired ones are
+            # skipped like Redis would have dropped them, and swept by drop()
+            async with self.conn.execute(
+                """
+                DELETE FROM queue_messages
+                WHERE id = (
+                    SELECT id FROM queue_messages
+                    WHERE queue = ? AND (expires_at IS NULL OR expires_at >= ?)
+                    ORDER BY id LIMIT 1
+                )
+                RETURNING body
+                """,
+                (queue, time.time())
+            ) as cursor:
+                row = await cursor.fetchone()
+            await self.conn.commit()
+            if row is not None:
+                return json.loads(row[0])
+            if time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(SQLITE_POLL_INTERVAL)
+
+    async def drop(self, queue: str) -> None:
+        # Also sweeps expired messages, e.g. ones pushed to reply queues that were already dropped
+        await self.conn.execute("DELETE FROM queue_messages WHERE queue = ? OR expires_at < ?", (queue, time.time()))
+        await self.conn.commit()
+
+    async def set(self, key: str, value: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        await self.conn.execute(
+            "INSERT OR REPLACE INTO queue_values VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + ttl if ttl else None)
+        )
+        await self.conn.commit()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        async with self.conn.execute(
+            "SELECT value FROM queue_values WHERE key = ? AND (expires_at IS NULL OR expires_at >= ?)",
+            (key, time.time())
+        ) as cursor:
+            row = await cursor.fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def delete(self, key: str) -> None:
+        await self.conn.execute("DELETE FROM queue_values WHERE key = ?", (key,))
+        await self.conn.commit()
+
+    async def scan(self, prefix: str) -> List[Dict[str, Any]]:
+        async with self.conn.execute(
+            "SELECT value FROM queue_values WHERE key >= ? AND key < ? AND (expires_at IS NULL OR expires_at >= ?)",
+            (prefix, prefix + "\uffff", time.time())
+        ) as cursor:
+            rows = await cursor.fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    async def close(self) -> None:
+        if self.conn is not None:
+            await self.conn.close()
+            self.conn = None
+
+
+class RedisQueueBackend(QueueBackend):
+    """Backend on Redis or any server speaking its protocol, for workers on several machines"""
+
+    def __init__(self, url: str):
+        if redis is None:
+            raise RuntimeError("The redis package is required for a redis:// queue backend")
+        self.client = redis.from_url(url, decode_responses=True)
+
+    async def push(self, queue: str, message: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        if not ttl:
+            await self.client.rpush(queue, json.dumps(message))
+            return
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.rpush(queue, json.dumps(message))
+            pipe.pexpire(queue, int(ttl * 1000))
+            await pipe.execute()
+
+    async def pop(self, queue: str, timeout: float) -> Optional[Dict[str, Any]]:
+        item = await self.client.blpop([queue], timeout=timeout)
+        return json.loads(item[1]) if item else None
+
+    async def drop(self, queue: str) -> None:
+        await self.client.delete(queue)
+
+    async def set(self, key: str, value: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        await self.client.set(key, json.dumps(value), px=int(ttl * 1000) if ttl else None)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = await self.client.get(key)
+        return json.loads(value) if value else None
+
+    async def delete(self, key: str) -> None:
+        await self.client.delete(key)
+
+    async def scan(self, prefix: str) -> List[Dict[str, Any]]:
+        values = []
+        async for key in self.client.scan_iter(match=f"{prefix}*"):
+            value = await self.get(key)
+            if value is not None:
+                values.append(value)
+        return values
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+async def create_queue_backend(url: str = QUEUE_URL) -> QueueBackend:
+    if url.startswith("memory://"):
+        return MemoryQueueBackend()
+    if url.startswith("sqlite:///"):
+        backend = SqliteQueueBackend(url[len("sqlite:///"):])
+        await backend.connect()
+        return backend
+    if url.startswith(("redis://", "rediss://")):
+        return RedisQueueBackend(url)
+    raise ValueError(f"Unsupported queue backend URL: {url}")
@@ -0,0 +1,59 @@
+from typing import List
+
+from langchain_chroma import Chroma
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+
+from .metrics import embedding_seconds, vector_store_seconds
+from .offload import run_blocking
+
+
+class TimedEmbeddings(Embeddings):
+    """Wraps an embedding model to record how long each embedding request takes"""
+
+    def __init__(self, model: Embeddings):
+        self.model = model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with embedding_seconds.time(operation="embed_documents"):
+            return self.model.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with embedding_seconds.time(operation="embed_query"):
+            return self.model.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        async with embedding_seconds.time(operation="embed_documents"):
+            return await self.model.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        async with embedding_seconds.time(operation="embed_query"):
+            return await self.model.aembed_query(text)
+
+
+embeddings = TimedEmbeddings(OpenAIEmbeddings(model="text-embedding-3-small"))
+
+PERSIST_DIRECTORY = "./rag_store_webpage"
+DEFAULT_COLLECTION = "webpage_rag"
+
+
+def run_collection_name(run_id: str) -> str:
+    """Each run scrapes into its own collection so concurrent runs never share documents"""
+    return f"{DEFAULT_COLLECTION}_{run_id}"
+
+
+async def get_vector_store(collection_name: str = DEFAULT_COLLECTION) -> Chroma:
+    """Opens a webpage RAG collection in a worker thread, Chroma's client setup does blocking disk IO"""
+    with vector_store_seconds.time(operation="open"):
+        return await run_blocking(
+            Chroma,
+            collection_name=collection_name,
+            embedding_function=embeddings,
+            persist_directory=PERSIST_DIRECTORY,  # Where to save data locally, remove if not necessary
+        )
+
+
+async def delete_collection(collection_name: str) -> None:
+    vector_store = await get_vector_store(collection_name)
+    client = vector_store._client  # Access the underlying Chroma client
+    await run_blocking(client.delete_collection, collection_name)
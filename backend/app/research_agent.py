@@ -1,6 +1,5 @@
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
+from .llm_gateway import GatedChatOpenAI, GatedChatAnthropic
 import os
 from typing import TypedDict, Annotated, List, Literal
 from playwright.async_api import Page
@@ -11,26 +10,23 @@ import asyncio
 from playwright.async_api import async_playwright
 from playwright.async_api import Page, Locator
 import platform
-from langchain_text_splitters import NLTKTextSplitter, SpacyTextSplitter
-from newspaper import Article
 import aiohttp
 import asyncio
-from io import BytesIO
-from PyPDF2 import PdfReader
 from langchain_core.documents import Document
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
 from langchain_core.messages import SystemMessage, HumanMessage
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import OpenAIEmbeddings
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import START, END, StateGraph
 from IPython.display import Image, display
 import nltk
+from app.rag_store import get_vector_store, delete_collection, DEFAULT_COLLECTION
+from app.metrics import vector_store_seconds, retries_total
+from app.offload import run_blocking, run_cpu
+from app.parsing import fetch_article_html, parse_article_html, extract_pdf_text, split_text
+from app.streaming import astream_answer
+from app.text_entry import clear_focused, enter_text, submit
 
 
-
-embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-
 load_dotenv()
 def set_env_vars(var):
     value = os.getenv(var)
@@ -43,12 +39,12 @@ vars = ["OPENAI_API_KEY", "LANGCHAIN_API_KEY", "LANGCHAIN_TRACING_V2", "LANGCHAI
 for var in vars:
     set_env_vars(var)
 
-llm_4o = ChatOpenAI(model="gpt-4o", temperature=0)
-llm_mini = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-llm_o3_mini = ChatOpenAI(model="o3-mini", reasoning_effort="high")
+llm_4o = GatedChatOpenAI(model="gpt-4o", temperature=0)
+llm_mini = GatedChatOpenAI(model="gpt-4o-mini", temperature=0)
+llm_o3_mini = GatedChatOpenAI(model="o3-mini", reasoning_effort="high")
 
-llm_anthropic = ChatAnthropic(model="claude-3-5-sonnet-20240620", temperature=0)
-llm_openai_o1 = ChatOpenAI(model="o1-preview", temperature=1)
+llm_anthropic = GatedChatAnthropic(model="claude-3-5-sonnet-20240620", temperature=0)
+llm_openai_o1 = GatedChatOpenAI(model="o1-preview", temperature=1)
 llm = llm_4o
 
 
@@ -88,6 +84,7 @@ class AgentState(TypedDict):
     new_page: Literal[True, False]
     answer: str
     is_pdf: Literal[True, False]
+    rag_collection: str
 
 
     
@@ -348,36 +345,24 @@ async def type(state: AgentState):
     """Types text into an input field located by its XPath, fallback bounding box if XPath fails."""
     page = state["page"]
     text = state["action"]["args"]
-    
-    
-        
+
     try:
         bbox_x, bbox_y = state["action"]["action_element"]["x"], state["action"]["action_element"]["y"]
         await page.mouse.click(bbox_x, bbox_y, click_count=3)
-        await asyncio.sleep(1)
-        select_all = "Meta+A" if platform.system() == "Darwin" else "Control+A"
-        await page.keyboard.press(select_all)
-        await asyncio.sleep(1)
-        await page.keyboard.press("Backspace")
-        await asyncio.sleep(1)
-        await page.keyboard.type(text)
-        await asyncio.sleep(4)
+        await clear_focused(page)
+        await enter_text(page, text)
 
     except Exception as e:
         xpath = state["action"]["action_element"]["xpath"]
         await page.locator(f'xpath={xpath}').click()
-        await asyncio.sleep(1)
         select_all = "document.execCommand('selectAll', false, null);"
         await page.locator(f'xpath={xpath}').evaluate(select_all)
-        await asyncio.sleep(1)
-        await page.locator(f'xpath={xpath}').type(text)
-        await asyncio.sleep(4)
-        
+        await enter_text(page, text)
 
     element_description = f"{state['action']['action_element']['type']} element {state['action']['action_element']['description']}"
-    await page.keyboard.press("Enter")
-    await asyncio.sleep(2)
-    
+    # type_in_docs_page sets this to False, Enter in a document only starts a new line
+    await submit(page, wait_for_navigation=state.get("submit_navigates", True))
+
     return {"actions_taken": [f"Typed {text} into {element_description}"]}
 
 # Scroll Page
@@ -510,23 +495,11 @@ async def go_to_search(state: AgentState):
 
 
 
-async def scrape_text(page):        
-    # Evaluate JavaScript in the page context to extract text and images.
-
-# URL of the news article
-    url = page.url
-
-    # Create an Article object
-    article = Article(url)
-
-    # Download the article's HTML content
+async def scrape_text(page):
+    """Downloads the current page on a thread and parses it as an article in a parse worker"""
     try:
-        article.download()
-
-        # Parse the downloaded content
-        article.parse()
-
-        data = article.text
+        html = await run_blocking(fetch_article_html, page.url)
+        data = await run_cpu(parse_article_html, page.url, html)
 
         if data == "":
             return "No data found"
@@ -552,15 +525,8 @@ async def scrape_pdf(page):
         async with session.get(url) as response:
             if response.status == 200:
                 content = await response.read()
-                pdf_data = BytesIO(content)
                 try:
-                    reader = PdfReader(pdf_data)
-                    text = ""
-                    for page_num in range(len(reader.pages)):
-                        page_obj = reader.pages[page_num]
-                        page_text = page_obj.extract_text()
-                        if page_text:
-                            text += page_text + "\n"
+                    text = await run_cpu(extract_pdf_text, content)
                     if text.strip() == "":
                         return "No data found"
                     return text
@@ -574,9 +540,7 @@ async def scrape_pdf(page):
 # Docs from Text
 
 async def docs_from_text(data, url):
-    text_splitter = SpacyTextSplitter(chunk_size=500, chunk_overlap=10)
-    
-    texts = text_splitter.split_text(data)
+    texts = await run_cpu(split_text, data)
 
     docs = [Document(page_content=text, metadata={"source": url}) for text in texts]
 
@@ -584,17 +548,12 @@ async def docs_from_text(data, url):
 
 # Store Doc Embeddings
 
-async def store_doc_embeddings(docs):
+async def store_doc_embeddings(docs, collection_name):
 
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+    vector_store = await get_vector_store(collection_name)
 
-    vector_store = Chroma(
-        collection_name="webpage_rag",
-        embedding_function=embeddings,
-        persist_directory="./rag_store_webpage",  # Where to save data locally, remove if not necessary
-    )
-
-    vector_store.add_documents(docs)
+    with vector_store_seconds.time(operation="add_documents"):
+        await run_blocking(vector_store.add_documents, docs)
 
 
 
@@ -615,7 +574,7 @@ async def web_page_rag(state: AgentState):
             docs = await docs_from_text(result, page.url)
             print(len(docs))
 
-            await store_doc_embeddings(docs)
+            await store_doc_embeddings(docs, state.get("rag_collection", DEFAULT_COLLECTION))
 
             return {"actions_taken":[f"Scraped the url {page.url} and stored the information in a vector database for future reference"]}
     except Exception as e:
@@ -685,7 +644,7 @@ async def url_decide_node(state: AgentState):
     ]
 
     structured_llm = llm_mini.with_structured_output(Url)
-    response = structured_llm.invoke(messages)
+    response = await structured_llm.ainvoke(messages)
     print(response)
 
     page = state["page"]
@@ -782,9 +741,9 @@ async def llm_call_node(state: AgentState):
     dom_elements = state["dom_elements"]
     input = state["input"]
     visited_urls = state.get("visited_urls", [])
-    prompt_value = prompt.invoke({"actions_taken": actions_taken, "dom_elements": dom_elements, "input": input, "visited_urls": visited_urls})
+    prompt_value = await prompt.ainvoke({"actions_taken": actions_taken, "dom_elements": dom_elements, "input": input, "visited_urls": visited_urls})
 
-    response = llm.with_structured_output(Action).invoke(prompt_value)
+    response = await llm.with_structured_output(Action).ainvoke(prompt_value)
 
     action = response
 
@@ -809,6 +768,7 @@ def tool_router(state: AgentState):
     action_type = action["action_type"]
 
     if action_type == 'retry':
+        retries_total.inc(reason="agent_action")
         return "annotate_page"
     
     return tools[action_type]
@@ -851,14 +811,11 @@ async def webpage_or_pdf(state: AgentState):
 # Self Review
 
 async def self_review(state: AgentState):
-    vector_store = Chroma(
-    collection_name="webpage_rag",
-    embedding_function=embeddings,
-    persist_directory="./rag_store_webpage",
-)
+    vector_store = await get_vector_store(state.get("rag_collection", DEFAULT_COLLECTION))
 
     input_text = state["input"]
-    relevant_docs = vector_store.similarity_search(input_text, k=60)
+    with vector_store_seconds.time(operation="similarity_search"):
+        relevant_docs = await run_blocking(vector_store.similarity_search, input_text, k=60)
 
     print(f"Number of documents: {len(relevant_docs)}")
 
@@ -883,7 +840,7 @@ async def self_review(state: AgentState):
     ]
 
     structured_llm = llm.with_structured_output(SelfReview)
-    response = structured_llm.invoke(messages)
+    response = await structured_llm.ainvoke(messages)
     
     
 
@@ -905,19 +862,16 @@ async def after_self_review_router(state: AgentState):
     
 # Answer Node
 
-async def answer_node(state: AgentState):
+async def answer_node(state: AgentState, config: RunnableConfig):
 
-    vector_store = Chroma(
-        collection_name="webpage_rag",
-        embedding_function=embeddings,
-        persist_directory="./rag_store_webpage",  # Where to save data locally, remove if not necessary
-    )
+    vector_store = await get_vector_store(state.get("rag_collection", DEFAULT_COLLECTION))
 
     input = state["input"]
 
-    total_docs = vector_store._collection.count() 
+    total_docs = await run_blocking(vector_store._collection.count)
     print("Total docs: ", total_docs)
-    relevant_docs = vector_store.similarity_search(input, k=total_docs)
+    with vector_store_seconds.time(operation="similarity_search"):
+        relevant_docs = await run_blocking(vector_store.similarity_search, input, k=total_docs)
     
     visited_urls = state.get("visited_urls", [])
 
@@ -1021,7 +975,8 @@ async def answer_node(state: AgentState):
         HumanMessage(content=human_message)
     ]
 
-    response = llm_o3_mini.invoke(messages)
+    # Stream the article to the client while it is being written
+    response = await astream_answer(llm_o3_mini, messages, config)
 
     return {"answer": response.content, "conversation_history": [f"User : {input}"]+[f"WebRover : {response}"], "actions_taken" : [f"Research on {input} complete"]}
 
@@ -1030,15 +985,8 @@ async def answer_node(state: AgentState):
 
 async def empty_rag_store(state : AgentState):
 
-    vector_store = Chroma(
-    collection_name="webpage_rag",
-    embedding_function=embeddings,
-    persist_directory="./rag_store_webpage",
-    )
-
     try:
-        client = vector_store._client  # Access the underlying Chroma client
-        client.delete_collection("webpage_rag")
+        await delete_collection(state.get("rag_collection", DEFAULT_COLLECTION))
         return {"actions_taken" : ["Emptied Vector Store"]}
 
     except Exception as e:
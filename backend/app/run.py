@@ -0,0 +1,160 @@
+"""
+Batch runner and throughput harness.
+
+    python -m app.run queries.jsonl -o results.jsonl --concurrency 4
+
+Each input line is a JSON object with `query` and `agent_type`, and optionally
+`id`, `force_refresh` and `priority`. Queries run concurrently over the browser
+pool, and one result line per query is written as soon as it finishes, with
+its answer, sources and timings; a summary with throughput and latency
+percentiles goes to stderr at the end. By default an in-process worker runs the
+queries; `--api` sends them to a running server's /query:sync instead.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TextIO
+
+
+# Seconds one query may take in-process, effectively no limit
+QUERY_TIMEOUT = 7 * 86400
+
+Runner = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+def read_queries(path: str) -> List[Dict[str, Any]]:
+    queries = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if "query" not in item or "agent_type" not in item:
+                raise SystemExit(f"{path}:{line_number}: each line needs a query and an agent_type")
+            item.setdefault("id", line_number)
+            queries.append(item)
+    return queries
+
+
+def _request(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "query": item["query"],
+        "agent_type": item["agent_type"],
+        "force_refresh": item.get("force_refresh", False),
+        "priority": item.get("priority"),
+    }
+
+
+async def run_all(queries: List[Dict[str, Any]], runner: Runner, concurrency: int, out: TextIO) -> Dict[str, Any]:
+    """
+    Runs the queries with at most `concurrency` in flight, writing each result as
+    it finishes. Returns the results and a summary of the batch.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    results = []
+
+    async def run_one(item: Dict[str, Any]):
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                result = await runner(_request(item))
+            except Exception as e:
+                result = {"status": "failed", "error": str(e)}
+            result = {
+                "id": item["id"],
+                "query": item["query"],
+                "agent_type": item["agent_type"],
+                **result,
+                "latency_ms": round((time.monotonic() - started) * 1000, 2),
+            }
+        out.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+        out.flush()
+        results.append(result)
+        print(f"[{len(results)}/{len(queries)}] {item['id']}: {result['status']} in {result['latency_ms'] / 1000:.1f}s",
+              file=sys.stderr)
+
+    # Timed here so the in-process worker's startup does not count against throughput
+    started = time.monotonic()
+    await asyncio.gather(*(run_one(item) for item in queries))
+    return summarize(results, time.monotonic() - started)
+
+
+def summarize(results: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+    latencies = sorted(result["latency_ms"] for result in results if result["status"] == "completed")
+
+    def percentile(q: float) -> Optional[float]:
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    return {
+        "queries": len(results),
+        "completed": len(latencies),
+        "failed": len(results) - len(latencies),
+        "cached": sum(1 for result in results if result.get("cached")),
+        "wall_seconds": round(wall_seconds, 2),
+        "queries_per_minute": round(len(results) / wall_seconds * 60, 2) if wall_seconds else None,
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies), 2) if latencies else None,
+            "p50": percentile(0.5),
+            "p95": percentile(0.95),
+            "max": latencies[-1] if latencies else None,
+        },
+    }
+
+
+async def run_in_process(queries: List[Dict[str, Any]], concurrency: int, out: TextIO) -> Dict[str, Any]:
+    """Starts a worker in this process and runs the queries on its browser pool"""
+    # Imported here so --help and --api work without the agents' dependencies loaded
+    from .queue_backend import MemoryQueueBackend
+    from .worker import Worker
+    from .worker_client import WorkerClient
+
+    queue = MemoryQueueBackend()
+    client = WorkerClient(queue)
+    async with Worker(queue):
+        return await run_all(
+            queries,
+            lambda request: client.call("query_sync", request, timeout=QUERY_TIMEOUT),
+            concurrency,
+            out
+        )
+
+
+async def run_against_api(queries: List[Dict[str, Any]], api: str, concurrency: int, out: TextIO) -> Dict[str, Any]:
+    import aiohttp
+
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None)) as http:
+        async def runner(request: Dict[str, Any]) -> Dict[str, Any]:
+            async with http.post(f"{api.rstrip('/')}/query:sync", json=request) as response:
+                body = await response.json()
+                if response.status != 200:
+                    return {"status": "failed", "error": body.get("detail", body)}
+                return body
+
+        return await run_all(queries, runner, concurrency, out)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.run", description="Run a JSONL file of WebRover queries")
+    parser.add_argument("queries", help="JSONL file, one {\"query\", \"agent_type\"} object per line")
+    # Not stdout by default, the agents log there
+    parser.add_argument("-o", "--output", default="results.jsonl", help="JSONL file for the results (default results.jsonl)")
+    parser.add_argument("-c", "--concurrency", type=int, default=2, help="queries in flight at once (default 2)")
+    parser.add_argument("--api", help="base URL of a running server, e.g. http://localhost:8000")
+    args = parser.parse_args(argv)
+
+    queries = read_queries(args.queries)
+    with open(args.output, "w") as out:
+        if args.api:
+            summary = asyncio.run(run_against_api(queries, args.api, args.concurrency, out))
+        else:
+            summary = asyncio.run(run_in_process(queries, args.concurrency, out))
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
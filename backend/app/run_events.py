@@ -0,0 +1,135 @@
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+import aiosqlite
+
+from .streaming import keepalive, is_keepalive, HEARTBEAT_INTERVAL
+
+
+# Seconds between commits of appended events; rows are readable on this connection right away
+FLUSH_INTERVAL = 0.5
+
+# Events replayed per read while catching a client up
+READ_BATCH = 500
+
+
+def encode_logged_event(event_id: int, data: str) -> str:
+    """An SSE frame with its log ID, which the browser sends back as Last-Event-ID on reconnect"""
+    return f"id: {event_id}\ndata: {data}\n\n"
+
+
+class RunEventLog:
+    """
+    Append-only log of the SSE events each run emitted, numbered from 1 per run.
+    A client that reconnects replays only the events after the last ID it saw,
+    instead of the run starting over. Only the `data:` payload is stored.
+    Appends are committed in batches, so the log needs a connection of its own.
+    """
+
+    def __init__(self, conn: aiosqlite.Connection, ttl: Optional[float] = None):
+        self.conn = conn
+        self.ttl = ttl if ttl is not None else float(os.getenv("WEBROVER_RUN_EVENTS_TTL", "604800"))
+        self._last_ids: Dict[str, int] = {}
+        self._changed: Dict[str, asyncio.Event] = {}
+        self._live: Set[str] = set()
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    async def setup(self) -> None:
+        await self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS run_events (
+                run_id TEXT NOT NULL,
+                event_id INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (run_id, event_id)
+            ) WITHOUT ROWID
+        """)
+        await self.conn.commit()
+
+    async def open(self, run_id: str) -> int:
+        """Start writing a run's events, a resumed run continues its numbering. Returns the last ID so far."""
+        async with self.conn.execute(
+            "SELECT COALESCE(MAX(event_id), 0) FROM run_events WHERE run_id = ?", (run_id,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        self._last_ids[run_id] = row[0]
+        self._live.add(run_id)
+        return row[0]
+
+    async def append(self, run_id: str, frame: str) -> str:
+        """Log an SSE frame and return it with its ID; keepalives are passed through unlogged"""
+        if is_keepalive(frame):
+            return frame
+        data = frame[len("data: "):].rstrip("\n")
+        event_id = self._last_ids[run_id] + 1
+        self._last_ids[run_id] = event_id
+        await self.conn.execute("INSERT INTO run_events VALUES (?, ?, ?)", (run_id, event_id, data))
+        self._schedule_flush()
+        self._notify(run_id)
+        return encode_logged_event(event_id, data)
+
+    async def close(self, run_id: str) -> None:
+        """The run stopped, followers finish once they have read its last event"""
+        self._live.discard(run_id)
+        self._last_ids.pop(run_id, None)
+        await self._flush()
+        self._notify(run_id)
+
+    def is_live(self, run_id: str) -> bool:
+        return run_id in self._live
+
+    async def read(self, run_id: str, after_id: int, limit: int = READ_BATCH) -> List[Tuple[int, str]]:
+        async with self.conn.execute(
+            "SELECT event_id, data FROM run_events WHERE run_id = ? AND event_id > ? ORDER BY event_id LIMIT ?",
+            (run_id, after_id, limit)
+        ) as cursor:
+            return list(await cursor.fetchall())
+
+    def changed(self, run_id: str) -> asyncio.Event:
+        """Set on the run's next append or close; take it before reading to not miss one"""
+        if run_id not in self._changed:
+            self._changed[run_id] = asyncio.Event()
+        return self._changed[run_id]
+
+    async def follow(self, run_id: str, after_id: int = 0, heartbeat_interval: float = HEARTBEAT_INTERVAL) -> AsyncIterator[str]:
+        """Replay the events after `after_id`, then stream new ones live until the run stops"""
+        while True:
+            changed = self.changed(run_id)
+            live = self.is_live(run_id)
+            events = await self.read(run_id, after_id)
+            for event_id, data in events:
+                after_id = event_id
+                yield encode_logged_event(event_id, data)
+            if events:
+                continue
+            if not live:
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=heartbeat_interval)
+            except asyncio.TimeoutError:
+                yield keepalive()
+
+    async def purge_expired(self) -> None:
+        await self.conn.execute(
+            "DELETE FROM run_events WHERE run_id IN (SELECT run_id FROM runs WHERE updated_at < ?)",
+            (time.time() - self.ttl,)
+        )
+        await self.conn.commit()
+
+    def _notify(self, run_id: str) -> None:
+        event = self._changed.pop(run_id, None)
+        if event is not None:
+            event.set()
+
+    def _schedule_flush(self) -> None:
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                FLUSH_INTERVAL, lambda: asyncio.ensure_future(self._flush())
+            )
+
+    async def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        await self.conn.commit()
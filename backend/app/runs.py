@@ -0,0 +1,168 @@
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+import aiosqlite
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from playwright.async_api import Page
+
+from .answer_cache import AnswerCache
+from .run_events import RunEventLog
+
+
+RUNS_DB = os.getenv("WEBROVER_RUNS_DB", "./webrover_runs.sqlite")
+
+# Marks where a live Page was in a checkpoint, it is swapped for a fresh page on resume
+PAGE_PLACEHOLDER = "__page_url__"
+
+# The session page of the run executing in the current task; checkpoints loaded while it is
+# set get it in place of their page placeholders, so resumed nodes see a live page
+live_page: ContextVar[Optional[Page]] = ContextVar("webrover_live_page", default=None)
+
+
+def _strip_pages(value: Any) -> Any:
+    if isinstance(value, Page):
+        return {PAGE_PLACEHOLDER: value.url}
+    if isinstance(value, dict):
+        return {key: _strip_pages(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_strip_pages(item) for item in value)
+    return value
+
+
+def _restore_pages(value: Any, page: Page) -> Any:
+    if isinstance(value, dict):
+        if PAGE_PLACEHOLDER in value and len(value) == 1:
+            return page
+        return {key: _restore_pages(item, page) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_restore_pages(item, page) for item in value)
+    return value
+
+
+def checkpointed_page_url(value: Any) -> Optional[str]:
+    """URL of the page that was live when a checkpoint was written"""
+    if isinstance(value, dict):
+        return value.get(PAGE_PLACEHOLDER)
+    return None
+
+
+class PageStrippingSerializer(JsonPlusSerializer):
+    """
+    Checkpoint serializer that records Playwright pages by URL instead of
+    serializing them, and puts the `live_page` back in their place on load.
+    """
+
+    def dumps(self, obj: Any) -> bytes:
+        return super().dumps(_strip_pages(obj))
+
+    def dumps_typed(self, obj: Any):
+        return super().dumps_typed(_strip_pages(obj))
+
+    def loads(self, data: bytes) -> Any:
+        return self._with_live_page(super().loads(data))
+
+    def loads_typed(self, data) -> Any:
+        return self._with_live_page(super().loads_typed(data))
+
+    def _with_live_page(self, value: Any) -> Any:
+        page = live_page.get()
+        return value if page is None else _restore_pages(value, page)
+
+
+class RunStore:
+    """Persistent record of agent runs, so they can be found and resumed after a restart"""
+
+    def __init__(self, conn: aiosqlite.Connection):
+        self.conn = conn
+
+    async def setup(self) -> None:
+        await self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                agent_type TEXT NOT NULL,
+                query TEXT NOT NULL,
+                session_id TEXT,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        await self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS run_traces (
+                run_id TEXT PRIMARY KEY,
+                trace TEXT NOT NULL
+            )
+        """)
+        await self.conn.commit()
+
+    async def create(self, run_id: str, agent_type: str, query: str, session_id: Optional[str]) -> None:
+        now = time.time()
+        await self.conn.execute(
+            "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (run_id, agent_type, query, session_id, "running", now, now)
+        )
+        await self.conn.commit()
+
+    async def set_status(self, run_id: str, status: str, session_id: Optional[str] = None) -> None:
+        if session_id is None:
+            await self.conn.execute(
+                "UPDATE runs SET status = ?, updated_at = ? WHERE run_id = ?",
+                (status, time.time(), run_id)
+            )
+        else:
+            await self.conn.execute(
+                "UPDATE runs SET status = ?, session_id = ?, updated_at = ? WHERE run_id = ?",
+                (status, session_id, time.time(), run_id)
+            )
+        await self.conn.commit()
+
+    async def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        async with self.conn.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)) as cursor:
+            row = await cursor.fetchone()
+            columns = [column[0] for column in cursor.description]
+        return dict(zip(columns, row)) if row else None
+
+    async def save_trace(self, run_id: str, trace: Dict[str, Any]) -> None:
+        """Keeps the trace of the latest attempt, a resumed run replaces the one before it"""
+        await self.conn.execute(
+            "INSERT OR REPLACE INTO run_traces VALUES (?, ?)",
+            (run_id, json.dumps(trace, default=str))
+        )
+        await self.conn.commit()
+
+    async def get_trace(self, run_id: str) -> Optional[Dict[str, Any]]:
+        async with self.conn.execute("SELECT trace FROM run_traces WHERE run_id = ?", (run_id,)) as cursor:
+            row = await cursor.fetchone()
+        return json.loads(row[0]) if row else None
+
+
+@asynccontextmanager
+async def open_run_storage(path: str = RUNS_DB):
+    """
+    Opens the SQLite database holding LangGraph checkpoints (keyed by run ID as
+    the thread ID), the run records, the runs' event logs and the answer cache.
+    The event log gets its own connection: it commits in batches, and its open
+    write transaction must not hold up the checkpointer's commits.
+    """
+    async with aiosqlite.connect(path) as conn, aiosqlite.connect(path) as events_conn:
+        for connection in (conn, events_conn):
+            await connection.execute("PRAGMA journal_mode=WAL")
+            await connection.execute("PRAGMA busy_timeout=5000")
+        checkpointer = AsyncSqliteSaver(conn, serde=PageStrippingSerializer())
+        # Checkpoint metadata carries node writes too, which may include the page
+        checkpointer.jsonplus_serde = PageStrippingSerializer()
+        await checkpointer.setup()
+        run_store = RunStore(conn)
+        await run_store.setup()
+        answer_cache = AnswerCache(conn)
+        await answer_cache.setup()
+        await answer_cache.purge_expired()
+        event_log = RunEventLog(events_conn)
+        await event_log.setup()
+        await event_log.purge_expired()
+        yield checkpointer, run_store, answer_cache, event_log
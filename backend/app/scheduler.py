@@ -0,0 +1,108 @@
+import asyncio
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+
+INTERACTIVE = "interactive"
+STANDARD = "standard"
+BATCH = "batch"
+
+# Lower runs first
+PRIORITY_RANK = {INTERACTIVE: 0, STANDARD: 1, BATCH: 2}
+
+# A user waiting on a quick browser action beats a research report, which beats a deep research job
+AGENT_PRIORITIES = {"task": INTERACTIVE, "research": STANDARD, "deep_research": BATCH}
+
+# Longest a lower priority run pauses at one node boundary while higher priority runs are active,
+# so background work slows down under interactive load but never stops
+MAX_YIELD_SECONDS = float(os.getenv("WEBROVER_MAX_YIELD_SECONDS", "5"))
+
+# Priority class of the run executing in the current task, set by the streaming layer
+run_priority: ContextVar[str] = ContextVar("webrover_run_priority", default=STANDARD)
+
+
+def priority_for(agent_type: str, requested: Optional[str] = None) -> str:
+    """The priority class of a run, an explicit request winning over the agent's default"""
+    if requested in PRIORITY_RANK:
+        return requested
+    return AGENT_PRIORITIES.get(agent_type, STANDARD)
+
+
+class Scheduler:
+    """
+    Tracks the runs active in this process by priority class. Lower priority runs
+    call `yield_point` between graph nodes and wait there while higher priority
+    runs are active, handing them the event loop, LLM slots and CPU.
+    """
+
+    def __init__(self, max_yield: float = MAX_YIELD_SECONDS):
+        self.max_yield = max_yield
+        self.active: Dict[str, int] = {priority: 0 for priority in PRIORITY_RANK}
+        self.yields = 0
+        self.yield_seconds = 0.0
+        self._changed = asyncio.Event()
+
+    @contextmanager
+    def running(self, priority: str):
+        """Count a run as active for as long as it executes"""
+        self.active[priority] += 1
+        try:
+            yield
+        finally:
+            self.active[priority] -= 1
+            self._changed.set()
+
+    def _outranked(self, priority: str) -> bool:
+        rank = PRIORITY_RANK[priority]
+        return any(count for other, count in self.active.items() if PRIORITY_RANK[other] < rank)
+
+    async def yield_point(self, priority: str) -> None:
+        """Pause a run between nodes while higher priority runs are active"""
+        await asyncio.sleep(0)
+        if not self._outranked(priority):
+            return
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + self.max_yield
+        while self._outranked(priority) and loop.time() < deadline:
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=deadline - loop.time())
+            except asyncio.TimeoutError:
+                break
+        self.yields += 1
+        self.yield_seconds += loop.time() - started
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": dict(self.active),
+            "max_yield_seconds": self.max_yield,
+            "yields": self.yields,
+            "yield_seconds": round(self.yield_seconds, 2),
+        }
+
+
+scheduler = Scheduler()
+
+
+class SchedulerCallbackHandler(AsyncCallbackHandler):
+    """
+    Makes a run yield to higher priority runs before each graph node. Must come
+    first in the run's callbacks so node timings exclude the time spent yielding.
+    """
+
+    # Awaited before the node starts, which is what lets it hold the node back
+    run_inline = True
+
+    def __init__(self, priority: str):
+        self.priority = priority
+
+    async def on_chain_start(self, serialized, inputs, *, run_id: UUID, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node and kwargs.get("name") == node and self.priority != INTERACTIVE:
+            await scheduler.yield_point(self.priority)
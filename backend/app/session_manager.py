@@ -0,0 +1,204 @@
+import asyncio
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from playwright.async_api import Page
+
+from .browser_manager import WarmBrowserPool, setup_browser, cleanup_browser_session, shutdown_managed_browser
+from .scheduler import INTERACTIVE, PRIORITY_RANK
+
+
+class SessionNotFoundError(KeyError):
+    """Raised when a session ID is unknown or has already been evicted."""
+
+
+class SessionPoolExhaustedError(RuntimeError):
+    """Raised when every slot in the session pool is taken."""
+
+
+@dataclass
+class BrowserSession:
+    session_id: str
+    browser: Any
+    page: Page
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    @property
+    def in_use(self) -> bool:
+        return self.lock.locked()
+
+    def idle_seconds(self) -> float:
+        return time.monotonic() - self.last_used
+
+
+class SessionManager:
+    """
+    Issues session IDs and leases isolated browser sessions from a bounded pool.
+    Each session owns its own browser and page, so concurrent agent runs never
+    share a Playwright page. Idle sessions are evicted in the background.
+
+    The last `reserved_sessions` slots are kept for interactive sessions, so
+    batch work can never take every browser away from users.
+    """
+
+    def __init__(self,
+                 max_sessions: Optional[int] = None,
+                 idle_timeout: Optional[float] = None,
+                 eviction_interval: float = 30,
+                 warm_pool: Optional[WarmBrowserPool] = None,
+                 reserved_sessions: Optional[int] = None,
+                 on_close: Optional[Callable[[str], Awaitable[None]]] = None):
+        self.max_sessions = max_sessions or int(os.getenv("WEBROVER_MAX_SESSIONS", "4"))
+        self.idle_timeout = idle_timeout or float(os.getenv("WEBROVER_SESSION_IDLE_TIMEOUT", "900"))
+        self.eviction_interval = eviction_interval
+        if reserved_sessions is None:
+            reserved_sessions = int(os.getenv("WEBROVER_INTERACTIVE_RESERVED_SESSIONS", "1"))
+        self.reserved_sessions = min(reserved_sessions, self.max_sessions - 1)
+        self.warm_pool = warm_pool
+        # Called with the session ID whenever a session is closed or evicted
+        self.on_close = on_close
+        self._sessions: Dict[str, BrowserSession] = {}
+        self._pending = 0
+        self._lock = asyncio.Lock()
+        self._eviction_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Start warming browsers and the background idle-eviction loop"""
+        if self.warm_pool:
+            self.warm_pool.start()
+        if self._eviction_task is None:
+            self._eviction_task = asyncio.create_task(self._eviction_loop())
+
+    async def stop(self):
+        """Stop the eviction loop and close every session and warm browser"""
+        if self._eviction_task:
+            self._eviction_task.cancel()
+            try:
+                await self._eviction_task
+            except asyncio.CancelledError:
+                pass
+            self._eviction_task = None
+        if self.warm_pool:
+            await self.warm_pool.close()
+        await self.close_all()
+        await shutdown_managed_browser()
+
+    async def create_session(self, url: str, priority: str = INTERACTIVE) -> BrowserSession:
+        """Reserve a pool slot, set up a browser on `url` and register the session"""
+        limit = self.max_sessions
+        if PRIORITY_RANK[priority] > PRIORITY_RANK[INTERACTIVE]:
+            limit -= self.reserved_sessions
+        async with self._lock:
+            if len(self._sessions) + self._pending >= limit:
+                raise SessionPoolExhaustedError(
+                    f"All {limit} browser sessions available to {priority} work are in use"
+                )
+            self._pending += 1
+
+        started = time.monotonic()
+        try:
+            if self.warm_pool:
+                browser, page = await self.warm_pool.acquire(url)
+            else:
+                browser, page = await setup_browser(url)
+        finally:
+            async with self._lock:
+                self._pending -= 1
+
+        session = BrowserSession(session_id=uuid.uuid4().hex, browser=browser, page=page)
+        async with self._lock:
+            self._sessions[session.session_id] = session
+        print(f"Created browser session {session.session_id} in {time.monotonic() - started:.2f}s")
+        return session
+
+    def get(self, session_id: str) -> BrowserSession:
+        session = self._sessions.get(session_id)
+        if session is None:
+            raise SessionNotFoundError(session_id)
+        return session
+
+    @asynccontextmanager
+    async def lease(self, session_id: str):
+        """Hold a session exclusively for the duration of an agent run"""
+        session = self.get(session_id)
+        async with session.lock:
+            session.last_used = time.monotonic()
+            try:
+                yield session
+            finally:
+                session.last_used = time.monotonic()
+
+    async def close_session(self, session_id: str):
+        async with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            raise SessionNotFoundError(session_id)
+        try:
+            if self.warm_pool and not session.in_use:
+                # Reset and reuse the browser and page rather than start a new one for the next session
+                await self.warm_pool.release(session.browser, session.page)
+            elif self.warm_pool:
+                # Still in use by a run, so it is not reset for reuse
+                await self.warm_pool.discard(session.browser)
+            else:
+                await cleanup_browser_session(session.browser)
+        finally:
+            if self.on_close:
+                await self.on_close(session_id)
+        print(f"Closed browser session {session_id}")
+
+    async def close_all(self):
+        for session_id in list(self._sessions):
+            try:
+                await self.close_session(session_id)
+            except Exception as e:
+                print(f"Error closing session {session_id}: {e}")
+
+    async def evict_idle(self):
+        """Close sessions that are not leased and have been idle past the timeout"""
+        expired = [
+            session_id for session_id, session in list(self._sessions.items())
+            if not session.in_use and session.idle_seconds() > self.idle_timeout
+        ]
+        for session_id in expired:
+            print(f"Evicting idle browser session {session_id}")
+            try:
+                await self.close_session(session_id)
+            except Exception as e:
+                print(f"Error evicting session {session_id}: {e}")
+
+    async def _eviction_loop(self):
+        while True:
+            await asyncio.sleep(self.eviction_interval)
+            await self.evict_idle()
+
+    def stats(self) -> Dict[str, Any]:
+        sessions = list(self._sessions.values())
+        busy = sum(1 for session in sessions if session.in_use)
+        return {
+            "max_sessions": self.max_sessions,
+            "idle_timeout": self.idle_timeout,
+            "reserved_sessions": self.reserved_sessions,
+            "active": len(sessions),
+            "busy": busy,
+            "idle": len(sessions) - busy,
+            "pending": self._pending,
+            "available": max(self.max_sessions - len(sessions) - self._pending, 0),
+            "warm_ready": self.warm_pool.ready if self.warm_pool else 0,
+            "sessions": [
+                {
+                    "session_id": session.session_id,
+                    "in_use": session.in_use,
+                    "idle_seconds": round(session.idle_seconds(), 1),
+                    "age_seconds": round(time.monotonic() - session.created_at, 1),
+                    "url": session.page.url,
+                }
+                for session in sessions
+            ],
+        }
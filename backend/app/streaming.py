@@ -0,0 +1,417 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.messages import AIMessageChunk
+from langchain_core.runnables import RunnableConfig
+
+from .browser_manager import abort_page_activity, close_opened_tabs
+from .rag_store import run_collection_name, delete_collection
+from .metrics import MetricsCallbackHandler
+from .tracing import Trace, TracingCallbackHandler, current_trace
+from .llm_gateway import llm_caller
+from .scheduler import scheduler, run_priority, priority_for, SchedulerCallbackHandler
+from .network_profiles import use_network_profile, restore_network_profile
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the standard library
+    orjson = None
+
+
+# Seconds between keepalives when the graph is quiet
+HEARTBEAT_INTERVAL = float(os.getenv("WEBROVER_SSE_HEARTBEAT", "10"))
+
+# Seconds between checks for a client that has gone away
+DISCONNECT_POLL_INTERVAL = 1.0
+
+
+def _dumps(payload: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(payload, default=str).decode()
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def encode_sse(payload: Dict[str, Any]) -> str:
+    """Serialize a payload as a single SSE `data:` frame"""
+    return f"data: {_dumps(payload)}\n\n"
+
+
+def encode_event(event_type: str, content: Any = None, **fields: Any) -> str:
+    """Serialize a typed agent event, e.g. {"type": "thought", "content": "..."}"""
+    payload = {"type": event_type}
+    if content is not None:
+        payload["content"] = content
+    payload.update(fields)
+    return encode_sse(payload)
+
+
+def keepalive() -> str:
+    return encode_event("keepalive", timestamp=time.time())
+
+
+def is_keepalive(frame: str) -> bool:
+    return frame.startswith('data: {"type":"keepalive"')
+
+
+async def emit_answer_delta(config: Optional[RunnableConfig], delta: str) -> None:
+    """Forward a chunk of the final answer to the SSE stream, if one is listening"""
+    sink = (config or {}).get("configurable", {}).get("answer_delta")
+    if sink and delta:
+        await sink(delta)
+
+
+async def astream_answer(llm, messages, config: Optional[RunnableConfig]) -> AIMessageChunk:
+    """Stream a text answer from `llm`, forwarding every chunk as an answer delta, and return the full message"""
+    response = None
+    async for chunk in llm.astream(messages):
+        if isinstance(chunk.content, str):
+            await emit_answer_delta(config, chunk.content)
+        response = chunk if response is None else response + chunk
+    return response
+
+
+# Graph node -> [(path into the node's state update, SSE event type)]
+EventMap = Dict[str, List[Tuple[Tuple[str, ...], str]]]
+
+_BROWSER_NODES = ["click", "type", "wait", "go_back", "go_to_search"]
+
+TASK_EVENTS: EventMap = {
+    "decide_immediate_action": [(("decide_action", "thought"), "thought")],
+    "decide_url": [(("actions_taken",), "action")],
+    **{node: [(("actions_taken",), "dom_update")] for node in [
+        "get_all_elements", "get_all_input_elements", "get_all_button_elements", "get_all_link_elements"
+    ]},
+    **{node: [(("actions", "element_actions"), "interaction")] for node in [
+        "interact_with_input_elements", "interact_with_button_elements", "interact_with_link_elements"
+    ]},
+    **{node: [(("actions_taken",), "browser_action")] for node in _BROWSER_NODES},
+    "respond": [(("response",), "final_response")],
+}
+
+RESEARCH_EVENTS: EventMap = {
+    "llm_call_node": [(("action", "thought"), "thought")],
+    **{node: [(("actions_taken",), "action")] for node in _BROWSER_NODES},
+    "web_page_rag": [(("actions_taken",), "rag_action")],
+    "self_review": [(("actions_taken",), "review")],
+    "close_opened_link": [(("actions_taken",), "close_tab")],
+    "answer_node": [
+        (("actions_taken",), "action"),
+        (("answer",), "final_answer"),
+        (("conversation_history",), "conversation_history"),
+    ],
+    "empty_rag_store": [(("actions_taken",), "cleanup")],
+}
+
+DEEP_RESEARCH_EVENTS: EventMap = {
+    "topic_breakdown": [(("subtopics",), "subtopics")],
+    "llm_call_node": [(("action", "thought"), "thought")],
+    **{node: [(("actions_taken",), "browser_action")] for node in _BROWSER_NODES},
+    "web_page_rag": [(("actions_taken",), "rag_action")],
+    "self_review": [(("actions_taken",), "review")],
+    "subtopic_answer_node": [
+        (("actions_taken",), "subtopic_answer"),
+        (("subtopic_status",), "subtopic_status"),
+    ],
+    "close_opened_link": [(("actions_taken",), "close_tab")],
+    "compile_research": [
+        (("actions_taken",), "compile"),
+        (("final_answer",), "final_answer"),
+        (("conversation_history",), "conversation_history"),
+    ],
+    "empty_rag_store": [(("actions_taken",), "cleanup")],
+}
+
+AGENT_EVENTS: Dict[str, EventMap] = {
+    "task": TASK_EVENTS,
+    "research": RESEARCH_EVENTS,
+    "deep_research": DEEP_RESEARCH_EVENTS,
+}
+
+
+def build_initial_state(agent_type: str, query: str, page, run_id: str) -> Dict[str, Any]:
+    """Initial graph state for each agent type"""
+    if agent_type == "task":
+        return {
+            "input": query,
+            "page": page,
+            "master_plan": None,
+            "dom_elements": [],
+            "chat_history": [],
+            "decide_action": None,
+            "actions_taken": [],
+            "actions": None,
+            "response": ""
+        }
+
+    state = {
+        "input": query,
+        "page": page,
+        "dom_elements": [],
+        "action": None,
+        "actions_taken": [],
+        "visited_urls": [],
+        "conversation_history": [],
+        "new_page": False,
+        "is_pdf": False,
+        "rag_collection": run_collection_name(run_id)
+    }
+    if agent_type == "research":
+        state["answer"] = ""
+    else:
+        state.update({
+            "subtopics": [],
+            "subtopic_answers": [],
+            "final_answer": "",
+            "subtopic_status": [],
+            "subtopic_to_research": "",
+            "number_of_urls_visited": 0,
+            "collect_more_info": False
+        })
+    return state
+
+
+async def stream_cached_answer(agent_type: str, query: str, cached: Dict[str, Any]) -> AsyncIterator[str]:
+    """Streams a cached answer with the same final events a live run would send"""
+    yield encode_event("cached", {"cached_at": cached["cached_at"], "sources": cached["sources"]})
+    yield encode_event("final_answer", cached["answer"])
+    yield encode_event("conversation_history", [f"User : {query}", f"WebRover : {cached['answer']}"])
+    yield encode_event("complete", "Processing completed")
+    yield encode_event("end", "Stream completed")
+
+
+# State key holding each agent's final answer
+RESULT_KEYS = {
+    "task": "response",
+    "research": "answer",
+    "deep_research": "final_answer",
+}
+
+
+def agent_result(agent_type: str, state: Dict[str, Any]) -> Dict[str, Any]:
+    """The answer and sources held in a finished run's state"""
+    return {
+        "answer": state.get(RESULT_KEYS[agent_type], ""),
+        "sources": state.get("visited_urls", []),
+    }
+
+
+async def _restore_profile(page, profile) -> None:
+    try:
+        await restore_network_profile(page.context, profile)
+    except Exception as e:
+        # The page or its browser may be gone after a failed run
+        print(f"Error restoring network profile {profile.name}: {e}")
+
+
+async def run_agent(agent_type: str,
+                    query: str,
+                    page,
+                    agent_graph,
+                    run_id: str,
+                    trace: Optional[Trace] = None,
+                    priority: Optional[str] = None) -> Dict[str, Any]:
+    """Runs an agent graph to completion without streaming and returns its answer and sources"""
+    trace = trace or Trace(run_id, agent_type)
+    priority = priority or priority_for(agent_type)
+    trace_token = current_trace.set(trace)
+    caller_token = llm_caller.set(run_id)
+    priority_token = run_priority.set(priority)
+    metrics = MetricsCallbackHandler(agent_type)
+    status = "failed"
+    previous_profile = None
+    pages_before = set(page.context.pages)
+    try:
+        previous_profile = await use_network_profile(page.context, agent_type)
+        with scheduler.running(priority):
+            final_state = await agent_graph.ainvoke(
+                build_initial_state(agent_type, query, page, run_id),
+                {
+                    "recursion_limit": 400,
+                    "configurable": {"thread_id": run_id},
+                    "callbacks": [SchedulerCallbackHandler(priority), metrics, TracingCallbackHandler(trace)],
+                }
+            )
+        status = "completed"
+    except asyncio.CancelledError:
+        status = "cancelled"
+        raise
+    finally:
+        if previous_profile is not None:
+            await _restore_profile(page, previous_profile)
+        # The session's next query starts from its own page, not the tabs this run left open
+        await close_opened_tabs(page, pages_before)
+        metrics.finish(status)
+        trace.finish(status)
+        current_trace.reset(trace_token)
+        llm_caller.reset(caller_token)
+        run_priority.reset(priority_token)
+    return agent_result(agent_type, final_state)
+
+
+def _lookup(update: Any, path: Tuple[str, ...]) -> Any:
+    for key in path:
+        if not isinstance(update, dict) or key not in update:
+            return None
+        update = update[key]
+    return update
+
+
+def encode_graph_event(event_map: EventMap, event: Any) -> List[str]:
+    """Translate one `astream` update ({node: state_update}) into SSE frames"""
+    frames = []
+    if not isinstance(event, dict):
+        return frames
+    for node, update in event.items():
+        for path, event_type in event_map.get(node, []):
+            content = _lookup(update, path)
+            if content is not None:
+                frames.append(encode_event(event_type, content))
+    return frames
+
+
+_DONE = object()
+
+
+class _AnswerDelta(str):
+    """Marks a queued answer chunk, as opposed to a graph update"""
+
+
+async def stream_agent_response(agent_type: str,
+                                query: Optional[str],
+                                page,
+                                agent_graph,
+                                run_id: Optional[str] = None,
+                                is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+                                on_finish: Optional[Callable[[str, Trace], Awaitable[None]]] = None,
+                                heartbeat_interval: float = HEARTBEAT_INTERVAL,
+                                priority: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Runs an agent graph and streams its updates as SSE frames. The graph runs in
+    its own task and a keepalive is sent whenever nothing has been emitted for
+    `heartbeat_interval` seconds. Answer nodes stream their model output as
+    `answer_delta` events before the usual final event.
+
+    `run_id` is the checkpoint thread ID. Passing query=None resumes that run
+    from its last checkpoint instead of starting a new one. `on_finish` is called
+    with "completed", "failed" or "cancelled" and the run's trace once it stops.
+    A `perf_summary` event summarizing the trace precedes the completion events.
+    `priority` is the run's scheduling class, by default the agent's; lower
+    classes yield to higher ones between nodes and in the LLM gateway.
+
+    If the client disconnects (or the stream is closed) before the graph
+    finishes, the graph task is cancelled, which aborts in-flight LLM requests,
+    and the browser and vector store work it left behind is cleaned up.
+    """
+    event_map = AGENT_EVENTS[agent_type]
+    events: asyncio.Queue = asyncio.Queue()
+    run_id = run_id or uuid.uuid4().hex
+    graph_input = build_initial_state(agent_type, query, page, run_id) if query is not None else None
+    pages_before = set(page.context.pages)
+    metrics = MetricsCallbackHandler(agent_type)
+    trace = Trace(run_id, agent_type)
+    priority = priority or priority_for(agent_type)
+    failed = False
+
+    async def on_answer_delta(delta: str):
+        await events.put(_AnswerDelta(delta))
+
+    async def run_graph():
+        # Set inside the task so only this run's browser and embedding calls are traced into it
+        current_trace.set(trace)
+        # The LLM gateway queues this run's requests fairly against other runs'
+        llm_caller.set(run_id)
+        run_priority.set(priority)
+        previous_profile = None
+        try:
+            previous_profile = await use_network_profile(page.context, agent_type)
+            with scheduler.running(priority):
+                async for event in agent_graph.astream(
+                    graph_input,
+                    {
+                        "recursion_limit": 400,
+                        "configurable": {"thread_id": run_id, "answer_delta": on_answer_delta},
+                        "callbacks": [SchedulerCallbackHandler(priority), metrics, TracingCallbackHandler(trace)],
+                    }
+                ):
+                    await events.put(event)
+        except Exception as e:
+            await events.put(e)
+        finally:
+            if previous_profile is not None:
+                await _restore_profile(page, previous_profile)
+            await events.put(_DONE)
+
+    async def watch_disconnect():
+        while not await is_disconnected():
+            await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+        print(f"Client disconnected, cancelling run {run_id}")
+        graph_task.cancel()
+
+    graph_task = asyncio.create_task(run_graph())
+    watcher_task = asyncio.create_task(watch_disconnect()) if is_disconnected else None
+    try:
+        yield encode_event("run", {"run_id": run_id, "priority": priority})
+        while True:
+            try:
+                event = await asyncio.wait_for(events.get(), timeout=heartbeat_interval)
+            except asyncio.TimeoutError:
+                yield keepalive()
+                continue
+
+            if event is _DONE:
+                break
+            if isinstance(event, _AnswerDelta):
+                yield encode_event("answer_delta", str(event))
+                continue
+            if isinstance(event, Exception):
+                failed = True
+                yield encode_event("error", str(event))
+                continue
+
+            try:
+                for frame in encode_graph_event(event_map, event):
+                    yield frame
+            except Exception as e:
+                yield encode_event("error", str(e))
+
+        if not graph_task.cancelled():
+            trace.finish("failed" if failed else "completed")
+            yield encode_event("perf_summary", trace.summary())
+            yield encode_event("complete", "Processing completed")
+            yield encode_event("end", "Stream completed")
+    finally:
+        if watcher_task:
+            watcher_task.cancel()
+        if not graph_task.done():
+            graph_task.cancel()
+        try:
+            await graph_task
+        except asyncio.CancelledError:
+            pass
+        if graph_task.cancelled():
+            await cancel_run_cleanup(agent_type, page, pages_before, run_id)
+        else:
+            await close_opened_tabs(page, pages_before)
+        status = "cancelled" if graph_task.cancelled() else "failed" if failed else "completed"
+        metrics.finish(status)
+        trace.finish(status)
+        if on_finish:
+            try:
+                await on_finish(status, trace)
+            except Exception as e:
+                print(f"Error recording status of run {run_id}: {e}")
+
+
+async def cancel_run_cleanup(agent_type: str, page, pages_before, run_id: str) -> None:
+    """Release what a cancelled run was holding: opened tabs, pending navigations and its RAG collection"""
+    await abort_page_activity(page, pages_before)
+    if agent_type != "task":
+        collection_name = run_collection_name(run_id)
+        try:
+            await delete_collection(collection_name)
+        except Exception as e:
+            print(f"Error deleting collection {collection_name}: {e}")
@@ -1,6 +1,5 @@
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
+from .llm_gateway import GatedChatOpenAI, GatedChatAnthropic
 import os
 from Browser.webrover_browser import WebRoverBrowser  
 from typing import TypedDict, List, Annotated, Literal, Optional
@@ -10,11 +9,14 @@ from playwright.async_api import async_playwright
 from pydantic import BaseModel, Field
 from langchain_core.messages import SystemMessage, HumanMessage
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableConfig
 import asyncio
 import platform
 
 from IPython.display import Image, display
 from langgraph.graph import StateGraph, START, END
+from app.streaming import astream_answer
+from app.text_entry import clear_focused, enter_text, submit
 
 
 
@@ -77,12 +79,12 @@ vars = ["OPENAI_API_KEY", "LANGCHAIN_API_KEY", "LANGCHAIN_TRACING_V2", "LANGCHAI
 for var in vars:
     set_env_vars(var)
 
-llm_4o = ChatOpenAI(model="gpt-4o", temperature=0)
-llm_mini = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-llm_o3_mini = ChatOpenAI(model="o3-mini", reasoning_effort="high")
+llm_4o = GatedChatOpenAI(model="gpt-4o", temperature=0)
+llm_mini = GatedChatOpenAI(model="gpt-4o-mini", temperature=0)
+llm_o3_mini = GatedChatOpenAI(model="o3-mini", reasoning_effort="high")
 
-llm_anthropic = ChatAnthropic(model="claude-3-5-sonnet-20240620", temperature=0)
-llm_openai_o1 = ChatOpenAI(model="o1-preview", temperature=1)
+llm_anthropic = GatedChatAnthropic(model="claude-3-5-sonnet-20240620", temperature=0)
+llm_openai_o1 = GatedChatOpenAI(model="o1-preview", temperature=1)
 llm = llm_4o
 
   
@@ -152,7 +154,7 @@ async def decide_url(state: AgentState):
     ]
 
     structured_llm = llm_mini.with_structured_output(Url)
-    response = structured_llm.invoke(messages)
+    response = await structured_llm.ainvoke(messages)
     print(response)
 
     page = state["page"]
@@ -215,9 +217,9 @@ async def master_plan_node(state: AgentState):
     )
     structured_llm = llm_mini.with_structured_output(MasterPlan)
 
-    formatted_prompt = prompt.invoke({"input": input, "conversation_history": conversation_history})
+    formatted_prompt = await prompt.ainvoke({"input": input, "conversation_history": conversation_history})
 
-    response = structured_llm.invoke(formatted_prompt)
+    response = await structured_llm.ainvoke(formatted_prompt)
     
 
     return {"master_plan": [response]}
@@ -609,7 +611,7 @@ async def decide_immediate_action(state: AgentState):
     messages = [SystemMessage(content=system_message), HumanMessage(content=human_message.format(input=input, actions_taken= actions_taken, page=page, text_on_page=text_on_page))]
 
 
-    response = llm.with_structured_output(DecideAction).invoke(messages)
+    response = await llm.with_structured_output(DecideAction).ainvoke(messages)
 
     return {"decide_action": response, "chat_history": state.get("chat_history", [])}
 
@@ -662,7 +664,7 @@ async def interact_with_input_elements(state: AgentState):
 
     messages = [SystemMessage(content=system_message), HumanMessage(content=human_message.format(input=input, actions_taken= actions_taken, page=page, input_elements=input_elements))]
 
-    response = llm.with_structured_output(Actions).invoke(messages)
+    response = await llm.with_structured_output(Actions).ainvoke(messages)
 
     return {"actions": response}
 
@@ -705,7 +707,7 @@ async def interact_with_button_elements(state: AgentState):
 
     messages = [SystemMessage(content=system_message), HumanMessage(content=human_message.format(input=input, actions_taken= actions_taken, page=page, button_elements=button_elements))]
 
-    response = llm.with_structured_output(Actions).invoke(messages)
+    response = await llm.with_structured_output(Actions).ainvoke(messages)
     
     return {"actions": response}
 
@@ -748,7 +750,7 @@ async def interact_with_link_elements(state: AgentState):
 
     messages = [SystemMessage(content=system_message), HumanMessage(content=human_message.format(input=input, actions_taken=actions_taken, page=page, link_elements=link_elements))]
     
-    response = llm.with_structured_output(Actions).invoke(messages)
+    response = await llm.with_structured_output(Actions).ainvoke(messages)
     
     return {"actions": response}
     
@@ -815,26 +817,12 @@ async def type(state: AgentState):
         xpath = input_action["action_element"]["xpath"]
         element = page.locator(f'xpath={xpath}')
         print("Element: ", element)
-        await asyncio.sleep(2)
         await element.click()
         print("Clicked")
-        await asyncio.sleep(2)
-        if platform.system() == "Darwin":
-            await element.press("Meta+A")
-        else:
-            await element.press("Control+A")
-        print("Selected")
-        await element.press("Backspace")
-        print("Backspace")
-        await asyncio.sleep(2)
-        await element.type(input_action["args"])
-        print("Typed")
-        await asyncio.sleep(2)
-        await element.press("Enter")
-        print("Enter")
-        await asyncio.sleep(2)
-        
-        
+        await clear_focused(page)
+        print("Cleared")
+        method = await enter_text(page, input_action["args"])
+        print(f"Typed ({method})")
 
     except Exception as e:
         try:
@@ -843,44 +831,30 @@ async def type(state: AgentState):
             bbox_x = input_action["action_element"]["x"]
             bbox_y = input_action["action_element"]["y"]
             print("Bounding Box: ", bbox_x, bbox_y)
-            
-            await page.mouse.click(bbox_x, bbox_y)
-            await asyncio.sleep(2)
-            
-            select_all = "Meta+A" if platform.system() == "Darwin" else "Control+A"
-            await page.keyboard.press(select_all)
-            await asyncio.sleep(2)
-            await page.keyboard.press("Backspace")
-
-                
-            await asyncio.sleep(2)
 
             await page.mouse.click(bbox_x, bbox_y)
-            
-         
-            await asyncio.sleep(2)
-            await page.keyboard.type(input_action["args"])
-            print("Typed")
-            await asyncio.sleep(2)
-            await page.keyboard.press("Enter")
-            print("Enter")
-            await asyncio.sleep(2)
-            
-            
+            await clear_focused(page)
+            method = await enter_text(page, input_action["args"])
+            print(f"Typed ({method})")
+
         except Exception as e:
             input_actions_taken.append(f"Failed to type {text}")
-            
-        
-    
+
+    action_type = input_action["action_type"] if input_action else None
+
+    if not input_actions_taken:
+        if action_type == "type_in_text_editor":
+            # An editor only gets a new line, nothing to wait for
+            await page.keyboard.press("Enter")
+        else:
+            await submit(page)
+        print("Enter")
+
     element_description = (
         f"{'input' if 'input' in input_action['action_element']['type'] else 'text area'} "
         f"element {input_action['action_element']['description']}"
     )
 
-    await asyncio.sleep(5)
-
-    action_type = input_action["action_type"] if input_action else None
-
     print("Action Type: ", action_type)
 
     
@@ -1120,7 +1094,7 @@ async def go_to_search(state: AgentState):
 
 # Respond
 
-async def respond(state: AgentState):
+async def respond(state: AgentState, config: RunnableConfig):
 
     text_on_page = await scrape_text(state["page"])
     system_message = """
@@ -1153,7 +1127,8 @@ async def respond(state: AgentState):
 
     messages = [SystemMessage(content=system_message), HumanMessage(content=human_message.format(input=input, actions_taken=actions_taken, text_on_page=text_on_page))]
 
-    response = llm.invoke(messages)
+    # Stream tokens to the client as they arrive, the full response is still returned below
+    response = await astream_answer(llm, messages, config)
 
     return {"response": response.content}
 
@@ -1205,7 +1180,7 @@ async def type_in_text_editor(state: AgentState):
 
             messages = [SystemMessage(content=system_message), HumanMessage(content=human_message.format(input=input, conversation_history=conversation_history, editor_data=editor_data))]
 
-            response = llm.with_structured_output(Actions).invoke(messages)
+            response = await llm.with_structured_output(Actions).ainvoke(messages)
             
                  
         
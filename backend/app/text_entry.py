@@ -0,0 +1,106 @@
+import os
+import platform
+import time
+from typing import Any, Dict, List, Optional
+
+from playwright.async_api import Page, TimeoutError as PlaywrightTimeoutError
+
+from .metrics import text_entry_seconds
+
+
+# Characters per insertText call, each one is a single input event in the page
+INSERT_CHUNK_SIZE = int(os.getenv("WEBROVER_INSERT_CHUNK_SIZE", "2000"))
+
+# Seconds to wait for a navigation after submitting a field with Enter
+SUBMIT_NAVIGATION_TIMEOUT = float(os.getenv("WEBROVER_SUBMIT_NAVIGATION_TIMEOUT", "3"))
+
+SELECT_ALL = "Meta+A" if platform.system() == "Darwin" else "Control+A"
+
+# What the focused element is and how much text it holds, to pick an entry mode and verify it worked.
+# Google Docs focuses a hidden iframe that receives the text, reported as tag "iframe".
+_FOCUSED_JS = """
+() => {
+    const el = document.activeElement;
+    if (!el || el === document.body) return null;
+    return {
+        tag: el.tagName.toLowerCase(),
+        editable: el.isContentEditable,
+        length: "value" in el && el.tagName !== "IFRAME" ? String(el.value).length
+            : el.isContentEditable ? el.innerText.length : null,
+    };
+}
+"""
+
+
+def _chunks(text: str, size: int) -> List[str]:
+    return [text[start:start + size] for start in range(0, len(text), size)]
+
+
+async def _focused(page: Page) -> Optional[Dict[str, Any]]:
+    try:
+        return await page.evaluate(_FOCUSED_JS)
+    except Exception:
+        return None
+
+
+async def clear_focused(page: Page) -> None:
+    """Delete whatever the focused field holds"""
+    await page.keyboard.press(SELECT_ALL)
+    await page.keyboard.press("Backspace")
+
+
+async def _insert(page: Page, text: str) -> None:
+    for chunk in _chunks(text, INSERT_CHUNK_SIZE):
+        await page.keyboard.insert_text(chunk)
+
+
+async def enter_text(page: Page, text: str) -> str:
+    """
+    Enters `text` into the focused element and returns how: "insert" or "keystrokes".
+
+    Text is inserted in chunks with Input.insertText, one input event per chunk
+    instead of three key events per character. Rich editors get a real Enter
+    between lines so they start new paragraphs; single-line inputs get the lines
+    joined with spaces. If the field did not take the insertion, the text is
+    typed key by key instead.
+    """
+    started = time.perf_counter()
+    focused = await _focused(page)
+    tag = focused["tag"] if focused else None
+
+    if tag == "input":
+        await _insert(page, " ".join(text.splitlines()))
+    elif tag == "textarea":
+        await _insert(page, text)
+    else:
+        for index, line in enumerate(text.split("\n")):
+            if index:
+                await page.keyboard.press("Enter")
+            await _insert(page, line)
+
+    method = "insert"
+    after = await _focused(page) if focused and focused["length"] is not None else None
+    if text and after is not None and after["length"] == focused["length"]:
+        # Nothing arrived, e.g. a field that only listens for key events
+        await page.keyboard.type(text)
+        method = "keystrokes"
+
+    text_entry_seconds.observe(time.perf_counter() - started, method=method)
+    return method
+
+
+async def submit(page: Page, timeout: float = SUBMIT_NAVIGATION_TIMEOUT, wait_for_navigation: bool = True) -> None:
+    """
+    Press Enter and wait for the navigation it may start, at most `timeout`
+    seconds. Pass wait_for_navigation=False where Enter cannot navigate, e.g. in
+    a document editor.
+    """
+    if not wait_for_navigation:
+        await page.keyboard.press("Enter")
+        return
+    try:
+        async with page.expect_navigation(wait_until="domcontentloaded", timeout=timeout * 1000):
+            await page.keyboard.press("Enter")
+    except PlaywrightTimeoutError:
+        # No navigation, e.g. a search box that filters in place
+        pass
@@ -0,0 +1,267 @@
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables.config import var_child_runnable_config
+
+
+@dataclass
+class Span:
+    span_id: str
+    parent_id: Optional[str]
+    name: str
+    kind: str
+    start: float
+    end: Optional[float] = None
+    status: str = "ok"
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+
+# The trace of the run executing in the current task, set by the streaming layer
+current_trace: ContextVar[Optional["Trace"]] = ContextVar("webrover_trace", default=None)
+
+# Innermost span opened with `trace_span`, so nested operations attach to it
+_current_span: ContextVar[Optional[str]] = ContextVar("webrover_span", default=None)
+
+
+class Trace:
+    """
+    Spans recorded during one agent run: a root span for the run, a span per
+    graph node and child spans for LLM requests, browser calls, embedding
+    batches and vector store operations.
+    """
+
+    def __init__(self, run_id: str, agent_type: str):
+        self.run_id = run_id
+        self.agent_type = agent_type
+        self.started_at = time.time()
+        self.spans: List[Span] = []
+        self._spans_by_id: Dict[str, Span] = {}
+        # LangChain run IDs of open chains, for finding the node an LLM call or browser call belongs to
+        self._parents: Dict[UUID, Optional[UUID]] = {}
+        self._node_spans: Dict[UUID, str] = {}
+        # Spans are also opened from executor threads (run_blocking, embedding batches)
+        self._lock = threading.Lock()
+        self.root = self.start_span("run", "run", None, agent_type=agent_type)
+
+    def start_span(self, name: str, kind: str, parent_id: Optional[str], **attributes: Any) -> Span:
+        start = time.perf_counter()
+        with self._lock:
+            span = Span(
+                span_id=str(len(self.spans) + 1),
+                parent_id=parent_id,
+                name=name,
+                kind=kind,
+                start=start,
+                attributes=attributes,
+            )
+            self.spans.append(span)
+            self._spans_by_id[span.span_id] = span
+        return span
+
+    def end_span(self, span: Span, status: str = "ok", **attributes: Any) -> None:
+        span.end = time.perf_counter()
+        span.status = status
+        span.attributes.update(attributes)
+
+    def finish(self, status: str) -> None:
+        for span in self.spans:
+            if span.end is None:
+                self.end_span(span, status="cancelled" if status == "cancelled" else span.status)
+        self.root.status = status
+
+    def node_span_for(self, lc_run_id: Optional[UUID]) -> Optional[str]:
+        """Walk up the LangChain run tree to the graph node that contains it"""
+        while lc_run_id is not None:
+            if lc_run_id in self._node_spans:
+                return self._node_spans[lc_run_id]
+            lc_run_id = self._parents.get(lc_run_id)
+        return None
+
+    def current_parent(self) -> str:
+        """The span an operation starting now belongs to"""
+        span_id = _current_span.get()
+        if span_id in self._spans_by_id:
+            return span_id
+        # Inside a node, LangChain's context holds the node's child config
+        config = var_child_runnable_config.get() or {}
+        parent_run_id = getattr(config.get("callbacks"), "parent_run_id", None)
+        return self.node_span_for(parent_run_id) or self.root.span_id
+
+    def to_dict(self) -> Dict[str, Any]:
+        origin = self.root.start
+        return {
+            "run_id": self.run_id,
+            "agent_type": self.agent_type,
+            "started_at": self.started_at,
+            "status": self.root.status,
+            "duration_ms": round(self.root.duration * 1000, 2),
+            "spans": [
+                {
+                    "span_id": span.span_id,
+                    "parent_id": span.parent_id,
+                    "name": span.name,
+                    "kind": span.kind,
+                    "start_ms": round((span.start - origin) * 1000, 2),
+                    "duration_ms": round(span.duration * 1000, 2),
+                    "status": span.status,
+                    "attributes": span.attributes,
+                }
+                for span in self.spans
+            ],
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        """Totals for the `perf_summary` event: time per span kind, LLM tokens and the slowest nodes"""
+        time_by_kind: Dict[str, float] = {}
+        tokens = {"input": 0, "output": 0}
+        llm_calls = 0
+        for span in self.spans[1:]:
+            time_by_kind[span.kind] = time_by_kind.get(span.kind, 0) + span.duration
+            if span.kind == "llm":
+                llm_calls += 1
+                tokens["input"] += span.attributes.get("input_tokens", 0)
+                tokens["output"] += span.attributes.get("output_tokens", 0)
+        nodes = sorted((span for span in self.spans if span.kind == "node"), key=lambda span: span.duration, reverse=True)
+        return {
+            "run_id": self.run_id,
+            "duration_ms": round(self.root.duration * 1000, 2),
+            "steps": len(nodes),
+            "llm_calls": llm_calls,
+            "tokens": tokens,
+            "time_by_kind_ms": {kind: round(total * 1000, 2) for kind, total in time_by_kind.items()},
+            "slowest_nodes": [{"node": span.name, "duration_ms": round(span.duration * 1000, 2)} for span in nodes[:5]],
+        }
+
+
+class trace_span:
+    """
+    Records a span in the current run's trace for the duration of a block, with
+    both `with` and `async with`. Outside a traced run it does nothing.
+    """
+
+    def __init__(self, name: str, kind: str, **attributes: Any):
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.span: Optional[Span] = None
+        self._trace: Optional[Trace] = None
+        self._token = None
+
+    def annotate(self, **attributes: Any) -> None:
+        if self.span is not None:
+            self.span.attributes.update(attributes)
+        else:
+            self.attributes.update(attributes)
+
+    def __enter__(self):
+        self._trace = current_trace.get()
+        if self._trace is not None:
+            self.span = self._trace.start_span(self.name, self.kind, self._trace.current_parent(), **self.attributes)
+            self._token = _current_span.set(self.span.span_id)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.span is not None:
+            _current_span.reset(self._token)
+            if exc_type is None:
+                self._trace.end_span(self.span)
+            else:
+                self._trace.end_span(self.span, status="error", error=str(exc))
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, *exc_info):
+        return self.__exit__(*exc_info)
+
+
+def model_name(serialized: Optional[Dict[str, Any]], metadata: Optional[Dict[str, Any]], kwargs: Dict[str, Any]) -> str:
+    params = kwargs.get("invocation_params") or {}
+    return (
+        (metadata or {}).get("ls_model_name")
+        or params.get("model")
+        or params.get("model_name")
+        or (serialized or {}).get("name")
+        or "unknown"
+    )
+
+
+def token_usage(response: LLMResult) -> Dict[str, int]:
+    """Input and output token counts reported for an LLM response"""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return {"input": usage.get("input_tokens", 0), "output": usage.get("output_tokens", 0)}
+    usage = (response.llm_output or {}).get("token_usage") or (response.llm_output or {}).get("usage") or {}
+    return {
+        "input": usage.get("prompt_tokens", usage.get("input_tokens", 0)),
+        "output": usage.get("completion_tokens", usage.get("output_tokens", 0)),
+    }
+
+
+def _usage(response: LLMResult) -> Dict[str, int]:
+    usage = token_usage(response)
+    return {"input_tokens": usage["input"], "output_tokens": usage["output"]}
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Opens node and LLM spans in a run's trace from LangChain callbacks"""
+
+    run_inline = True
+
+    def __init__(self, trace: Trace):
+        self.trace = trace
+        self._spans: Dict[UUID, Span] = {}
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, parent_run_id=None, metadata=None, **kwargs):
+        self.trace._parents[run_id] = parent_run_id
+        node = (metadata or {}).get("langgraph_node")
+        if node and kwargs.get("name") == node:
+            span = self.trace.start_span(node, "node", self.trace.root.span_id, step=(metadata or {}).get("langgraph_step"))
+            self.trace._node_spans[run_id] = span.span_id
+            self._spans[run_id] = span
+
+    def _end_chain(self, run_id: UUID, status: str, **attributes: Any) -> None:
+        self.trace._parents.pop(run_id, None)
+        self.trace._node_spans.pop(run_id, None)
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            self.trace.end_span(span, status=status, **attributes)
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs):
+        self._end_chain(run_id, "ok")
+
+    def on_chain_error(self, error, *, run_id: UUID, **kwargs):
+        self._end_chain(run_id, "error", error=str(error))
+
+    def _start_llm(self, serialized, run_id: UUID, parent_run_id, metadata, kwargs) -> None:
+        parent = self.trace.node_span_for(parent_run_id) or self.trace.root.span_id
+        self._spans[run_id] = self.trace.start_span(model_name(serialized, metadata, kwargs), "llm", parent)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, parent_run_id=None, metadata=None, **kwargs):
+        self._start_llm(serialized, run_id, parent_run_id, metadata, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, parent_run_id=None, metadata=None, **kwargs):
+        self._start_llm(serialized, run_id, parent_run_id, metadata, kwargs)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs):
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            self.trace.end_span(span, **_usage(response))
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs):
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            self.trace.end_span(span, status="error", error=str(error))
@@ -0,0 +1,632 @@
+import sys
+# Same sqlite3 swap as main.py for `python -m app.worker`, already done when main imports this module
+if getattr(sys.modules.get('sqlite3'), '__name__', None) != 'pysqlite3':
+    __import__('pysqlite3')
+    sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
+
+import asyncio
+import os
+import signal
+import time
+import uuid
+from contextlib import AsyncExitStack
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from .task_agent import builder as task_agent_builder
+from .research_agent import builder as research_agent_builder, type
+from .deep_research_agent import builder as deep_research_agent_builder
+from .session_manager import SessionManager, SessionNotFoundError, SessionPoolExhaustedError, BrowserSession
+from .browser_manager import WarmBrowserPool, goto_with_fallback
+from .runs import open_run_storage, checkpointed_page_url, live_page
+from .jobs import JobRunner, Job
+from .answer_cache import CACHEABLE_AGENTS
+from .metrics import instrument_playwright, render_metrics, runs_rejected_total
+from .llm_gateway import gateway, LLMBudgetExhaustedError
+from .scheduler import scheduler, priority_for
+from .network_profiles import network_stats
+from .loop_monitor import LoopLagMonitor
+from .queue_backend import QueueBackend, create_queue_backend
+from .streaming import stream_agent_response, stream_cached_answer, agent_result, encode_event, run_agent
+from .tracing import Trace
+from .worker_client import (
+    COMMANDS_QUEUE, WorkerError, worker_queue, session_route_key, worker_status_key, job_key, run_route_key,
+    WORKER_STATUS_PREFIX, REPLY_TTL
+)
+from . import offload
+
+
+agent_builders = {
+    "task": task_agent_builder,
+    "research": research_agent_builder,
+    "deep_research": deep_research_agent_builder
+}
+
+# Seconds between worker heartbeats; a worker missing three is considered gone
+HEARTBEAT_INTERVAL = float(os.getenv("WEBROVER_WORKER_HEARTBEAT", "5"))
+
+# Seconds a finished job's status stays readable from the API tier, and kept by the job runner
+JOB_STATUS_TTL = float(os.getenv("WEBROVER_JOB_TTL", "86400"))
+
+# Seconds a run keeps going after its last follower disconnected, so a client can reconnect to it
+DETACH_GRACE = float(os.getenv("WEBROVER_RUN_DETACH_GRACE", "60"))
+
+# Seconds to wait for the Google Docs editor to take focus after clicking into it
+DOCS_EDITOR_FOCUS_TIMEOUT = 10
+
+# Port for a standalone worker's /metrics, unset to not serve one
+METRICS_PORT = os.getenv("WEBROVER_WORKER_METRICS_PORT")
+
+
+class _Requeue(Exception):
+    """Hand a shared command back to the queue for another worker"""
+
+
+class Worker:
+    """
+    The worker tier: owns browser sessions, compiled agent graphs and the run
+    database, and executes commands sent by the API tier over the queue backend.
+    Commands about a session arrive on this worker's own queue, so a session
+    always runs on the worker holding its browser; other commands are taken from
+    the shared queue by whichever worker is free.
+    """
+
+    def __init__(self, queue: QueueBackend, worker_id: Optional[str] = None):
+        self.queue = queue
+        self.worker_id = worker_id or os.getenv("WEBROVER_WORKER_ID") or uuid.uuid4().hex[:12]
+        self.session_manager = SessionManager(warm_pool=WarmBrowserPool(), on_close=self._forget_session)
+        self.agent_graphs: Dict[str, Any] = {}
+        self.run_store = None
+        self.answer_cache = None
+        self.event_log = None
+        self.job_runner: Optional[JobRunner] = None
+        self._stack = AsyncExitStack()
+        self._loops: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        # Streamed runs, which outlive their client's connection for DETACH_GRACE seconds
+        self._runs: Dict[str, asyncio.Task] = {}
+        self._followers: Dict[str, int] = {}
+        self._commands = {
+            "setup_browser": self.setup_browser,
+            "cleanup": self.cleanup,
+            "type_docs": self.type_docs,
+            "submit_jobs": self.submit_jobs,
+            "get_trace": self.get_trace,
+            "query_sync": self.query_sync,
+        }
+        self._streams = {
+            "query": self.query,
+            "resume": self.resume,
+            "run_events": self.run_events,
+        }
+
+    async def start(self) -> None:
+        instrument_playwright()
+        checkpointer, self.run_store, self.answer_cache, self.event_log = await self._stack.enter_async_context(
+            open_run_storage()
+        )
+        for agent_type, builder in agent_builders.items():
+            self.agent_graphs[agent_type] = builder.compile(checkpointer=checkpointer)
+
+        await self.session_manager.start()
+        await offload.start_process_pool()
+        self.job_runner = JobRunner(
+            self.session_manager, self.agent_graphs, self.run_store, self.answer_cache, on_update=self._publish_job,
+            ttl=JOB_STATUS_TTL
+        )
+        self.job_runner.start()
+        await self._heartbeat()
+        self._loops = [
+            asyncio.create_task(self._consume(worker_queue(self.worker_id))),
+            asyncio.create_task(self._consume(COMMANDS_QUEUE)),
+            asyncio.create_task(self._heartbeat_loop()),
+        ]
+        print(f"Worker {self.worker_id} started")
+
+    async def stop(self) -> None:
+        tasks = self._loops + list(self._running.values()) + list(self._runs.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loops = []
+        if self.job_runner:
+            await self.job_runner.stop()
+        await self.session_manager.stop()
+        offload.shutdown()
+        await self.queue.delete(worker_status_key(self.worker_id))
+        await self._stack.aclose()
+
+    async def __aenter__(self) -> "Worker":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    # Queue plumbing
+
+    async def _consume(self, queue_name: str) -> None:
+        while True:
+            try:
+                message = await self.queue.pop(queue_name, timeout=1.0)
+            except Exception as e:
+                print(f"Worker {self.worker_id} could not read {queue_name}: {e}")
+                await asyncio.sleep(1)
+                continue
+            if message is None:
+                continue
+            if message["command"] == "cancel":
+                task = self._running.get(message["args"]["request_id"])
+                if task:
+                    print(f"Cancelling request {message['args']['request_id']}, its client went away")
+                    task.cancel()
+                continue
+            task = asyncio.create_task(self._handle(message))
+            self._running[message["id"]] = task
+            task.add_done_callback(lambda _, request_id=message["id"]: self._running.pop(request_id, None))
+
+    async def _handle(self, message: Dict[str, Any]) -> None:
+        reply_to = message["reply_to"]
+        command = message["command"]
+        streaming = False
+        try:
+            if command in self._streams:
+                frames = await self._streams[command](**message["args"])
+                streaming = True
+                try:
+                    async for frame in frames:
+                        await self._reply(reply_to, {"type": "frame", "data": frame})
+                finally:
+                    await frames.aclose()
+                await self._reply(reply_to, {"type": "end"})
+            elif command in self._commands:
+                value = await self._commands[command](**message["args"])
+                await self._reply(reply_to, {"type": "result", "value": value})
+            else:
+                raise WorkerError(400, f"Unknown command: {command}")
+        except asyncio.CancelledError:
+            raise
+        except _Requeue:
+            message["args"]["attempts"] = message["args"].get("attempts", 0) + 1
+            await self.queue.push(COMMANDS_QUEUE, message)
+        except WorkerError as e:
+            await self._reply(reply_to, {"type": "error", "status": e.status, "detail": e.detail})
+        except Exception as e:
+            print(f"Worker {self.worker_id} failed {command}: {e}")
+            if streaming:
+                await self._reply(reply_to, {"type": "frame", "data": encode_event("error", str(e))})
+                await self._reply(reply_to, {"type": "end"})
+            else:
+                await self._reply(reply_to, {"type": "error", "status": 500, "detail": str(e)})
+
+    async def _reply(self, reply_to: str, reply: Dict[str, Any]) -> None:
+        """Answer a request, naming this worker so the client can send a cancel straight to it"""
+        await self.queue.push(reply_to, {**reply, "worker_id": self.worker_id}, ttl=REPLY_TTL)
+
+    async def _heartbeat(self) -> None:
+        await self.queue.set(worker_status_key(self.worker_id), {
+            "worker_id": self.worker_id,
+            "updated_at": time.time(),
+            "sessions": self.session_manager.stats(),
+            "jobs": self.job_runner.stats() if self.job_runner else {},
+            "cache": self.answer_cache.stats() if self.answer_cache else {},
+            "llm": gateway.stats(),
+            "scheduler": scheduler.stats(),
+            "network": network_stats(),
+        }, ttl=HEARTBEAT_INTERVAL * 3)
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            try:
+                await self._heartbeat()
+            except Exception as e:
+                print(f"Worker {self.worker_id} heartbeat failed: {e}")
+
+    async def _forget_session(self, session_id: str) -> None:
+        await self.queue.delete(session_route_key(session_id))
+
+    async def _publish_job(self, job: Job) -> None:
+        if job.run_id and job.status == "running":
+            await self._route_run(job.run_id)
+        await self.queue.set(job_key(job.job_id), job.to_dict(), ttl=JOB_STATUS_TTL)
+
+    async def _route_run(self, run_id: str) -> None:
+        """Point requests about a run (its events, trace) at this worker, whose runs database has it"""
+        await self.queue.set(run_route_key(run_id), {"worker_id": self.worker_id}, ttl=self.event_log.ttl)
+
+    def _admit(self) -> None:
+        """Refuse a new run while the LLM gateway could not serve it in reasonable time"""
+        try:
+            gateway.check_admission()
+        except LLMBudgetExhaustedError as e:
+            runs_rejected_total.inc()
+            raise WorkerError(503, str(e))
+
+    def _session(self, session_id: str) -> BrowserSession:
+        try:
+            return self.session_manager.get(session_id)
+        except SessionNotFoundError:
+            raise WorkerError(404, "Browser session not found. Call /setup-browser first")
+
+    # Commands
+
+    async def setup_browser(self, url: str, attempts: int = 0) -> Dict[str, Any]:
+        try:
+            session = await self.session_manager.create_session(url)
+        except SessionPoolExhaustedError as e:
+            # Another worker may still have room
+            if attempts + 1 < len(await self.queue.scan(WORKER_STATUS_PREFIX)):
+                raise _Requeue()
+            raise WorkerError(503, str(e))
+        except Exception as e:
+            raise WorkerError(500, f"Failed to setup browser: {str(e)}")
+        await self.queue.set(session_route_key(session.session_id), {"worker_id": self.worker_id})
+        return {"session_id": session.session_id}
+
+    async def cleanup(self, session_id: str) -> None:
+        try:
+            await self.session_manager.close_session(session_id)
+        except SessionNotFoundError:
+            raise WorkerError(404, f"Unknown session: {session_id}")
+        except Exception as e:
+            print(f"Cleanup error: {e}")
+            raise WorkerError(500, f"Failed to cleanup browser: {str(e)}")
+
+    async def query(self,
+                    session_id: str,
+                    agent_type: str,
+                    query: str,
+                    force_refresh: bool = False,
+                    priority: Optional[str] = None) -> AsyncIterator[str]:
+        self._session(session_id)
+
+        if not force_refresh:
+            cached = await self.answer_cache.get(agent_type, query)
+            if cached:
+                return stream_cached_answer(agent_type, query, cached)
+
+        self._admit()
+        run_id = uuid.uuid4().hex
+        await self.run_store.create(run_id, agent_type, query, session_id)
+        after_id = await self._start_run(session_id, agent_type, query, run_id, priority_for(agent_type, priority))
+        return self._follow(run_id, after_id)
+
+    async def resume(self, run_id: str, session_id: str) -> AsyncIterator[str]:
+        run = await self.run_store.get(run_id)
+        if run is None:
+            route = await self.queue.get(run_route_key(run_id))
+            if route and route["worker_id"] != self.worker_id:
+                # Checkpoints live in the runs database of the worker that ran the run
+                raise WorkerError(409, f"Run {run_id} was recorded by worker {route['worker_id']}; resume it with "
+                                       f"a session on that worker, or give the workers a shared WEBROVER_RUNS_DB")
+            raise WorkerError(404, f"Unknown run: {run_id}")
+        if run_id in self._runs:
+            raise WorkerError(409, f"Run {run_id} is still running, follow it at /runs/{run_id}/events")
+        if run["status"] not in ("running", "failed"):
+            raise WorkerError(409, f"Run {run_id} is {run['status']} and cannot be resumed")
+        session = self._session(session_id)
+        self._admit()
+
+        agent_graph = self.agent_graphs[run["agent_type"]]
+        config = {"configurable": {"thread_id": run_id}}
+        snapshot = await agent_graph.aget_state(config)
+        if not snapshot.next:
+            await self.run_store.set_status(run_id, "completed")
+            raise WorkerError(409, f"Run {run_id} has no remaining steps")
+
+        # The checkpoint only holds the URL the run was on; the session page is taken there and
+        # swapped in for the placeholder when the run loads the checkpoint (see runs.live_page)
+        async with self.session_manager.lease(session_id):
+            page_url = checkpointed_page_url(snapshot.values.get("page"))
+            if page_url and page_url != session.page.url:
+                await goto_with_fallback(session.page, page_url)
+
+        await self.run_store.set_status(run_id, "running", session_id=session_id)
+        after_id = await self._start_run(session_id, run["agent_type"], None, run_id, priority_for(run["agent_type"]))
+        return self._follow(run_id, after_id)
+
+    async def run_events(self, run_id: str, last_event_id: int = 0) -> AsyncIterator[str]:
+        if await self.run_store.get(run_id) is None:
+            raise WorkerError(404, f"Unknown run: {run_id}")
+        return self._follow(run_id, last_event_id)
+
+    async def _start_run(self,
+                         session_id: str,
+                         agent_type: str,
+                         query: Optional[str],
+                         run_id: str,
+                         priority: str) -> int:
+        """
+        Start a run in the background, logging its events, and return the last
+        event ID it had before. Clients follow the log rather than the run, so a
+        dropped connection does not stop the run and a reconnect replays only
+        what was missed.
+        """
+        after_id = await self.event_log.open(run_id)
+        await self._route_run(run_id)
+        task = asyncio.create_task(self._execute_run(session_id, agent_type, query, run_id, priority))
+        self._runs[run_id] = task
+        task.add_done_callback(lambda _: self._runs.pop(run_id, None))
+        return after_id
+
+    async def _follow(self, run_id: str, after_id: int) -> AsyncIterator[str]:
+        self._followers[run_id] = self._followers.get(run_id, 0) + 1
+        try:
+            async for frame in self.event_log.follow(run_id, after_id):
+                yield frame
+        finally:
+            self._followers[run_id] -= 1
+            if not self._followers[run_id]:
+                del self._followers[run_id]
+                if run_id in self._runs:
+                    asyncio.get_running_loop().call_later(DETACH_GRACE, self._cancel_if_unfollowed, run_id)
+
+    def _cancel_if_unfollowed(self, run_id: str) -> None:
+        task = self._runs.get(run_id)
+        if task and not self._followers.get(run_id):
+            print(f"Cancelling run {run_id}, no client reconnected within {DETACH_GRACE:.0f}s")
+            task.cancel()
+
+    async def _execute_run(self,
+                           session_id: str,
+                           agent_type: str,
+                           query: Optional[str],
+                           run_id: str,
+                           priority: str) -> None:
+        try:
+            await self._stream_with_session(session_id, agent_type, query, run_id, priority)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Run {run_id} failed: {e}")
+            await self.event_log.append(run_id, encode_event("error", str(e)))
+        finally:
+            await self.event_log.close(run_id)
+
+    async def _stream_with_session(self,
+                                   session_id: str,
+                                   agent_type: str,
+                                   query: Optional[str],
+                                   run_id: str,
+                                   priority: str) -> None:
+        # Hold the session for the whole run so two queries never share a page
+        async with self.session_manager.lease(session_id) as session:
+            # A resumed run reloads its state from the checkpoint, which gets this page back
+            live_page.set(session.page)
+
+            async def on_finish(status: str, trace):
+                await self.run_store.set_status(run_id, status)
+                await self.run_store.save_trace(run_id, trace.to_dict())
+                if status == "completed" and agent_type in CACHEABLE_AGENTS:
+                    try:
+                        snapshot = await self.agent_graphs[agent_type].aget_state({"configurable": {"thread_id": run_id}})
+                        result = agent_result(agent_type, snapshot.values)
+                        await self.answer_cache.put(agent_type, snapshot.values.get("input", query), result["answer"], result["sources"])
+                    except Exception as e:
+                        print(f"Error caching answer for run {run_id}: {e}")
+
+            frames = stream_agent_response(
+                agent_type,
+                query,
+                session.page,
+                self.agent_graphs[agent_type],
+                run_id=run_id,
+                on_finish=on_finish,
+                priority=priority
+            )
+            try:
+                async for frame in frames:
+                    await self.event_log.append(run_id, frame)
+            finally:
+                await frames.aclose()
+
+    async def type_docs(self, session_id: str, content: str) -> Dict[str, Any]:
+        self._session(session_id)
+        async with self.session_manager.lease(session_id) as session:
+            return await type_in_docs_page(session.page, content)
+
+    async def submit_jobs(self, jobs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        self._admit()
+        submitted = [
+            await self.job_runner.submit(job["query"], job["agent_type"], job.get("force_refresh", False))
+            for job in jobs
+        ]
+        return {"job_ids": [job.job_id for job in submitted]}
+
+    async def query_sync(self,
+                         agent_type: str,
+                         query: str,
+                         session_id: Optional[str] = None,
+                         force_refresh: bool = False,
+                         priority: Optional[str] = None,
+                         attempts: int = 0) -> Dict[str, Any]:
+        """
+        Runs a query to completion and returns its answer, sources and timings.
+        Without a session ID it borrows a browser from the pool for the run.
+        """
+        started = time.monotonic()
+        result = {"run_id": None, "agent_type": agent_type, "status": "completed", "cached": False}
+
+        if not force_refresh:
+            cached = await self.answer_cache.get(agent_type, query)
+            if cached:
+                return {
+                    **result,
+                    "cached": True,
+                    "answer": cached["answer"],
+                    "sources": cached["sources"],
+                    "timing": {"total_ms": round((time.monotonic() - started) * 1000, 2)},
+                }
+
+        self._admit()
+        priority = priority_for(agent_type, priority)
+        owned = session_id is None
+        if owned:
+            session_id = await self._borrow_session(priority, attempts)
+        else:
+            self._session(session_id)
+        session_ms = round((time.monotonic() - started) * 1000, 2)
+
+        run_id = uuid.uuid4().hex
+        trace = Trace(run_id, agent_type)
+        result["run_id"] = run_id
+        try:
+            async with self.session_manager.lease(session_id) as session:
+                await self.run_store.create(run_id, agent_type, query, session_id)
+                await self._route_run(run_id)
+                try:
+                    result.update(await run_agent(
+                        agent_type, query, session.page, self.agent_graphs[agent_type], run_id, trace, priority=priority
+                    ))
+                except Exception as e:
+                    print(f"Run {run_id} failed: {e}")
+                    result.update({"status": "failed", "error": str(e), "answer": None, "sources": []})
+                finally:
+                    await self.run_store.set_status(run_id, result["status"])
+                    await self.run_store.save_trace(run_id, trace.to_dict())
+        finally:
+            if owned:
+                try:
+                    await self.session_manager.close_session(session_id)
+                except Exception as e:
+                    print(f"Error closing session {session_id}: {e}")
+
+        if result["status"] == "completed" and agent_type in CACHEABLE_AGENTS:
+            await self.answer_cache.put(agent_type, query, result["answer"], result["sources"])
+
+        summary = trace.summary()
+        result["timing"] = {
+            "total_ms": round((time.monotonic() - started) * 1000, 2),
+            "session_ms": session_ms,
+            "run_ms": summary["duration_ms"],
+            "steps": summary["steps"],
+            "llm_calls": summary["llm_calls"],
+            "tokens": summary["tokens"],
+            "time_by_kind_ms": summary["time_by_kind_ms"],
+        }
+        return result
+
+    async def _borrow_session(self, priority: str, attempts: int) -> str:
+        """
+        A new session for one synchronous query, from another worker's pool if
+        this one is full. Once every worker has been tried it queues for a free
+        slot here, like a job does, however long the runs ahead of it take.
+        """
+        while True:
+            try:
+                session = await self.session_manager.create_session("https://www.google.com", priority=priority)
+                return session.session_id
+            except SessionPoolExhaustedError:
+                if attempts + 1 < len(await self.queue.scan(WORKER_STATUS_PREFIX)):
+                    raise _Requeue()
+                await asyncio.sleep(1)
+
+    async def get_trace(self, run_id: str) -> Dict[str, Any]:
+        trace = await self.run_store.get_trace(run_id)
+        if trace is None:
+            raise WorkerError(404, "No trace recorded for this run")
+        return trace
+
+
+async def type_in_docs_page(page, content: str) -> Dict[str, Any]:
+    """Opens a new Google Doc on `page` and types `content` into its editor"""
+    await page.goto('https://docs.google.com/document/create')
+    await page.wait_for_load_state("domcontentloaded")
+
+    # Wait for and click the editor canvas
+    editor_selector = ".kix-appview-editor"
+    editor = await page.wait_for_selector(editor_selector, state="visible")
+
+    if editor:
+        bbox = await editor.bounding_box()
+        if bbox:
+            # Click in the middle of the editor
+            x = bbox['x'] + bbox['width'] / 2
+            y = bbox['y'] + bbox['height'] / 2
+
+            await page.mouse.click(x, y)
+            try:
+                # The editor takes input through a hidden iframe, which gets focus once it is ready
+                await page.wait_for_function(
+                    "() => document.activeElement && document.activeElement.tagName === 'IFRAME'",
+                    timeout=DOCS_EDITOR_FOCUS_TIMEOUT * 1000
+                )
+            except PlaywrightTimeoutError:
+                print("Docs editor did not report focus, typing anyway")
+
+            state = {
+                "page": page,
+                "action": {
+                    "action_element": {
+                        "type": "text_editor",
+                        "description": "Google Docs editor",
+                        "x": x,
+                        "y": y,
+                        "xpath": "//div[contains(@class, 'kix-appview-editor')]",
+                        "inViewport": True
+                    },
+                    "args": content
+                },
+                # Enter only starts a new paragraph in the editor, there is no navigation to wait for
+                "submit_navigates": False
+            }
+
+            result = await type(state)
+
+            return {
+                "status_code": 200,
+                "content": {"message": "Content typed successfully", "actions": result["actions_taken"]}
+            }
+
+    return {
+        "status_code": 500,
+        "content": {"error": "Text editor not found"}
+    }
+
+
+async def start_metrics_server(loop_monitor: LoopLagMonitor, port: int):
+    """Serves this worker process's /metrics and /debug/event-loop for scraping"""
+    from aiohttp import web
+
+    async def metrics(request):
+        return web.Response(text=render_metrics(), content_type="text/plain", headers={"X-Prometheus-Format": "0.0.4"})
+
+    async def event_loop(request):
+        return web.json_response(loop_monitor.stats())
+
+    app = web.Application()
+    app.add_routes([web.get("/metrics", metrics), web.get("/debug/event-loop", event_loop)])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", port).start()
+    return runner
+
+
+async def serve() -> None:
+    """Runs a standalone worker until SIGINT or SIGTERM"""
+    queue = await create_queue_backend()
+    if not queue.shared:
+        raise SystemExit("A separate worker process needs a shared queue, set WEBROVER_QUEUE_URL to sqlite:/// or redis://")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    loop_monitor = LoopLagMonitor()
+    loop_monitor.start()
+    metrics_runner = await start_metrics_server(loop_monitor, int(METRICS_PORT)) if METRICS_PORT else None
+    try:
+        async with Worker(queue):
+            await stop.wait()
+    finally:
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await loop_monitor.stop()
+        await queue.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(serve())
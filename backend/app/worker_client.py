@@ -0,0 +1,180 @@
+import os
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from .queue_backend import QueueBackend
+
+
+# Commands any worker may take, such as creating a session
+COMMANDS_QUEUE = "webrover:commands"
+
+# Seconds to wait for a worker to answer a command
+REQUEST_TIMEOUT = float(os.getenv("WEBROVER_WORKER_TIMEOUT", "180"))
+
+# Seconds between disconnect checks while relaying a stream
+STREAM_POLL_INTERVAL = 1.0
+
+# Seconds an unread reply queue lives, long enough for any client still reading it
+REPLY_TTL = max(REQUEST_TIMEOUT, 600)
+
+
+def worker_queue(worker_id: str) -> str:
+    """Commands for sessions owned by one worker"""
+    return f"webrover:worker:{worker_id}"
+
+
+def session_route_key(session_id: str) -> str:
+    return f"webrover:session:{session_id}"
+
+
+def worker_status_key(worker_id: str) -> str:
+    return f"webrover:worker_status:{worker_id}"
+
+
+def job_key(job_id: str) -> str:
+    return f"webrover:job:{job_id}"
+
+
+def run_route_key(run_id: str) -> str:
+    return f"webrover:run:{run_id}"
+
+
+WORKER_STATUS_PREFIX = "webrover:worker_status:"
+
+
+class WorkerError(Exception):
+    """An error reply from a worker, carrying the HTTP status the API should answer with"""
+
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+class WorkerClient:
+    """
+    The API tier's side of the worker protocol. Commands are pushed onto a
+    worker queue with a private reply queue; commands about a session go to the
+    queue of the worker that owns it, others to the shared command queue.
+    """
+
+    def __init__(self, queue: QueueBackend, timeout: float = REQUEST_TIMEOUT):
+        self.queue = queue
+        self.timeout = timeout
+
+    async def route(self, session_id: Optional[str]) -> str:
+        """The queue to send a command to, sticky to the session's worker when there is one"""
+        if session_id is None:
+            return COMMANDS_QUEUE
+        route = await self.queue.get(session_route_key(session_id))
+        if route is None:
+            raise WorkerError(404, "Browser session not found. Call /setup-browser first")
+        if await self.queue.get(worker_status_key(route["worker_id"])) is None:
+            # The worker stopped heartbeating, its browsers went with it
+            await self.queue.delete(session_route_key(session_id))
+            raise WorkerError(404, "Browser session was lost with its worker. Call /setup-browser again")
+        return worker_queue(route["worker_id"])
+
+    async def route_run(self, run_id: str) -> str:
+        """The worker executing a run while it is alive, otherwise any worker can read its log"""
+        route = await self.queue.get(run_route_key(run_id))
+        if route and await self.queue.get(worker_status_key(route["worker_id"])) is not None:
+            return worker_queue(route["worker_id"])
+        return COMMANDS_QUEUE
+
+    async def _send(self,
+                    command: str,
+                    args: Dict[str, Any],
+                    session_id: Optional[str],
+                    run_id: Optional[str] = None) -> Dict[str, Any]:
+        request_id = uuid.uuid4().hex
+        message = {
+            "id": request_id,
+            "command": command,
+            "args": args,
+            "reply_to": f"webrover:reply:{request_id}",
+        }
+        message["queue"] = await self.route_run(run_id) if run_id else await self.route(session_id)
+        await self.queue.push(message["queue"], message)
+        return message
+
+    async def _first_reply(self, message: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        timeout = timeout or self.timeout
+        reply = await self.queue.pop(message["reply_to"], timeout=timeout)
+        if reply is None:
+            await self.queue.drop(message["reply_to"])
+            raise WorkerError(504, f"No worker answered {message['command']} within {timeout:.0f}s")
+        if reply["type"] == "error":
+            await self.queue.drop(message["reply_to"])
+            raise WorkerError(reply["status"], reply["detail"])
+        return reply
+
+    async def call(self,
+                   command: str,
+                   args: Dict[str, Any],
+                   session_id: Optional[str] = None,
+                   timeout: Optional[float] = None,
+                   run_id: Optional[str] = None) -> Any:
+        """
+        Send a command and wait for its result, at most `timeout` seconds
+        (WEBROVER_WORKER_TIMEOUT by default). Pass `run_id` to send the command
+        to the worker that recorded that run.
+        """
+        message = await self._send(command, args, session_id, run_id)
+        reply = await self._first_reply(message, timeout)
+        await self.queue.drop(message["reply_to"])
+        return reply["value"]
+
+    async def stream(self,
+                     command: str,
+                     args: Dict[str, Any],
+                     session_id: Optional[str] = None,
+                     is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+                     run_id: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Send a streaming command and return its SSE frames. Waits for the first
+        reply before returning, so a rejected command raises WorkerError instead
+        of starting a stream. If the client goes away, or the returned iterator
+        is closed early, the worker is told to cancel the command. Pass `run_id`
+        to send the command to the worker executing that run.
+        """
+        message = await self._send(command, args, session_id, run_id)
+        first = await self._first_reply(message)
+        return self._relay(message, first, is_disconnected)
+
+    async def _relay(self,
+                     message: Dict[str, Any],
+                     first: Dict[str, Any],
+                     is_disconnected: Optional[Callable[[], Awaitable[bool]]]) -> AsyncIterator[str]:
+        finished = False
+        reply = first
+        last_check = time.monotonic()
+        try:
+            while True:
+                if reply is not None:
+                    if reply["type"] == "end":
+                        finished = True
+                        return
+                    if reply["type"] == "frame":
+                        yield reply["data"]
+                if is_disconnected and time.monotonic() - last_check >= STREAM_POLL_INTERVAL:
+                    last_check = time.monotonic()
+                    if await is_disconnected():
+                        return
+                reply = await self.queue.pop(message["reply_to"], timeout=STREAM_POLL_INTERVAL)
+        finally:
+            if not finished:
+                # Only the worker running the request can cancel it, and a command sent to the shared
+                # queue may have been taken by any worker; replies say which one it was
+                owner = first.get("worker_id")
+                cancel = {"id": uuid.uuid4().hex, "command": "cancel", "args": {"request_id": message["id"]}}
+                await self.queue.push(worker_queue(owner) if owner else message["queue"], cancel)
+            await self.queue.drop(message["reply_to"])
+
+    async def workers(self) -> List[Dict[str, Any]]:
+        """Latest heartbeat of every live worker"""
+        return await self.queue.scan(WORKER_STATUS_PREFIX)
+
+    async def job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.queue.get(job_key(job_id))
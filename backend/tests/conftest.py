@@ -0,0 +1,21 @@
+import os
+
+import pytest
+import pytest_asyncio
+from playwright.async_api import Error as PlaywrightError, async_playwright
+
+# The agent modules build their model clients at import time; the tests never call them
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("ANTHROPIC_API_KEY", "test")
+
+
+@pytest_asyncio.fixture
+async def browser():
+    """A headless Chromium, WEBROVER_TEST_CHROME may point at a Chrome binary to use instead of Playwright's"""
+    async with async_playwright() as playwright:
+        try:
+            browser = await playwright.chromium.launch(executable_path=os.getenv("WEBROVER_TEST_CHROME"))
+        except PlaywrightError as e:
+            pytest.skip(f"Chromium could not be launched: {e}")
+        yield browser
+        await browser.close()
@@ -0,0 +1,148 @@
+import asyncio
+import os
+import time
+
+import pytest
+from playwright.async_api import Error as PlaywrightError
+
+from app import browser_manager
+from app.browser_manager import WarmBrowserPool, reset_page
+from Browser.webrover_browser import ManagedChromium, WebRoverBrowser
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.created_at = time.monotonic()
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class FakePage:
+    url = "https://www.google.com"
+
+    def is_closed(self):
+        return False
+
+    async def evaluate(self, expression):
+        return None
+
+
+@pytest.fixture
+def launches(monkeypatch):
+    launched = []
+
+    async def setup_browser(go_to_page):
+        browser = FakeBrowser()
+        launched.append(browser)
+        return browser, FakePage()
+
+    async def reset_page(browser, page):
+        return FakePage()
+
+    monkeypatch.setattr(browser_manager, "setup_browser", setup_browser)
+    monkeypatch.setattr(browser_manager, "reset_page", reset_page)
+    return launched
+
+
+async def settle(pool):
+    if pool._refill_task:
+        await pool._refill_task
+    await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_released_browsers_are_reused_without_new_launches(launches):
+    pool = WarmBrowserPool(size=1)
+    pool.start()
+    await settle(pool)
+    assert len(launches) == 1
+
+    for _ in range(3):
+        browser, page = await pool.acquire("https://www.google.com")
+        await settle(pool)
+        await pool.release(browser, page)
+        await settle(pool)
+
+    assert len(launches) == 1
+    assert not launches[0].closed
+    assert pool.ready == 1
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_a_discarded_lease_is_replaced(launches):
+    pool = WarmBrowserPool(size=1)
+    pool.start()
+    await settle(pool)
+
+    browser, _ = await pool.acquire("https://www.google.com")
+    await pool.discard(browser)
+    await settle(pool)
+
+    assert browser.closed
+    assert len(launches) == 2
+    assert pool.ready == 1
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_browsers_returned_to_a_full_pool_are_closed(launches):
+    pool = WarmBrowserPool(size=1)
+    pool.start()
+    await settle(pool)
+
+    # A second session takes a cold start while the warm browser is leased
+    first = await pool.acquire("https://www.google.com")
+    second = await pool.acquire("https://www.google.com")
+    await settle(pool)
+    assert len(launches) == 2
+
+    await pool.release(*second)
+    await pool.release(*first)
+    await settle(pool)
+
+    assert pool.ready == 1
+    assert pool._ready[0][0] is second[0]
+    assert first[0].closed
+    assert len(launches) == 2
+    await pool.close()
+
+
+async def serve_test_site(context):
+    await context.route(
+        "https://example.test/**",
+        lambda route: route.fulfill(body="<html><body>test</body></html>", content_type="text/html"),
+    )
+
+
+@pytest.mark.asyncio
+async def test_reset_leaves_no_cookies_or_storage_for_the_next_lease():
+    shared = ManagedChromium(executable_path=os.getenv("WEBROVER_TEST_CHROME"))
+    browser = WebRoverBrowser()
+    try:
+        try:
+            _, context = await browser.connect_managed(shared)
+        except PlaywrightError as e:
+            pytest.skip(f"Chromium could not be launched: {e}")
+        page = await context.new_page()
+        await serve_test_site(context)
+        await page.goto("https://example.test/")
+        await page.evaluate("""() => {
+            document.cookie = "session=secret; path=/";
+            localStorage.setItem("token", "secret");
+            sessionStorage.setItem("tab", "secret");
+        }""")
+        await page.context.new_page()
+
+        page = await reset_page(browser, page)
+        await serve_test_site(page.context)
+        await page.goto("https://example.test/")
+
+        assert await page.context.cookies() == []
+        assert await page.evaluate("() => [document.cookie, localStorage.length, sessionStorage.length]") == ["", 0, 0]
+        assert page.context.pages == [page]
+    finally:
+        await browser.close()
+        await shared.close()
@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+import pytest
+
+from app import research_agent
+
+
+# How long the fake model takes to answer, and how far the ticker may fall behind meanwhile
+MODEL_SECONDS = 1.0
+TICK_INTERVAL = 0.02
+MAX_LAG = 0.1
+
+
+class SlowReview:
+    async def ainvoke(self, messages):
+        await asyncio.sleep(MODEL_SECONDS)
+        return research_agent.SelfReview(answer="Yes", reasoning="enough")
+
+
+class SlowModel:
+    def with_structured_output(self, schema):
+        return SlowReview()
+
+
+class EmptyVectorStore:
+    def similarity_search(self, query, k):
+        return []
+
+
+async def ticker(stop: asyncio.Event) -> float:
+    """Worst delay between when a tick was due and when it ran"""
+    worst = 0.0
+    while not stop.is_set():
+        due = time.monotonic() + TICK_INTERVAL
+        await asyncio.sleep(TICK_INTERVAL)
+        worst = max(worst, time.monotonic() - due)
+    return worst
+
+
+@pytest.mark.asyncio
+async def test_slow_model_call_does_not_block_the_loop(monkeypatch):
+    async def get_vector_store(collection):
+        return EmptyVectorStore()
+
+    monkeypatch.setattr(research_agent, "llm", SlowModel())
+    monkeypatch.setattr(research_agent, "get_vector_store", get_vector_store)
+
+    stop = asyncio.Event()
+    ticks = asyncio.create_task(ticker(stop))
+    started = time.monotonic()
+    result = await research_agent.self_review({"input": "query"})
+    elapsed = time.monotonic() - started
+    stop.set()
+    worst_lag = await ticks
+
+    assert result["collect_more_info"] is False
+    assert elapsed >= MODEL_SECONDS
+    assert worst_lag < MAX_LAG
@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from app import jobs
+from app.jobs import Job, JobRunner
+
+
+class FakeLease:
+    def __init__(self):
+        self.page = object()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class FakeSessionManager:
+    def lease(self, session_id):
+        return FakeLease()
+
+
+class FakeRunStore:
+    async def create(self, *args):
+        pass
+
+    async def set_status(self, *args):
+        pass
+
+    async def save_trace(self, *args):
+        pass
+
+
+class BrokenCache:
+    async def get(self, *args):
+        return None
+
+    async def put(self, *args):
+        raise RuntimeError("disk full")
+
+
+@pytest.mark.asyncio
+async def test_cache_failure_keeps_a_finished_job_completed(monkeypatch):
+    async def run_agent(*args, **kwargs):
+        return {"answer": "42", "sources": []}
+
+    monkeypatch.setattr(jobs, "run_agent", run_agent)
+    runner = JobRunner(FakeSessionManager(), {"research": None}, FakeRunStore(), BrokenCache())
+    job = Job(job_id="job", query="query", agent_type="research")
+
+    await runner._run(job, "session")
+
+    assert job.status == "completed"
+    assert job.result == {"answer": "42", "sources": []}
+
+
+@pytest.mark.asyncio
+async def test_finished_jobs_expire():
+    runner = JobRunner(FakeSessionManager(), {}, FakeRunStore(), ttl=60)
+    old = await runner.submit("old", "research")
+    old.status, old.finished_at = "completed", time.time() - 120
+    running = await runner.submit("running", "research")
+
+    assert runner.stats()["jobs"] == {"queued": 1}
+    assert runner.get(old.job_id) is None
+    assert runner.get(running.job_id) is running
@@ -0,0 +1,22 @@
+import asyncio
+
+import pytest
+
+from app.queue_backend import SqliteQueueBackend
+
+
+@pytest.mark.asyncio
+async def test_sqlite_pop_skips_expired_messages(tmp_path):
+    backend = SqliteQueueBackend(str(tmp_path / "queue.sqlite"))
+    await backend.connect()
+    try:
+        await backend.push("replies", {"n": 1}, ttl=0.05)
+        await backend.push("replies", {"n": 2}, ttl=60)
+        await backend.push("replies", {"n": 3})
+        await asyncio.sleep(0.1)
+
+        assert await backend.pop("replies", timeout=0) == {"n": 2}
+        assert await backend.pop("replies", timeout=0) == {"n": 3}
+        assert await backend.pop("replies", timeout=0) is None
+    finally:
+        await backend.close()
@@ -0,0 +1,66 @@
+import operator
+from typing import Annotated, List, TypedDict
+
+import pytest
+from langgraph.graph import END, START, StateGraph
+from playwright.async_api import Page
+
+from app.runs import checkpointed_page_url, live_page, open_run_storage
+
+
+class State(TypedDict):
+    page: Page
+    pages_seen: Annotated[List[str], operator.add]
+
+
+async def browse(state: State):
+    await state["page"].goto("data:text/html,<title>first</title>")
+    return {"page": state["page"], "pages_seen": [await state["page"].title()]}
+
+
+async def read(state: State):
+    # Fails on the checkpoint's placeholder, which has no title()
+    return {"pages_seen": [await state["page"].title()]}
+
+
+def build_graph(checkpointer):
+    graph = StateGraph(State)
+    graph.add_node("browse", browse)
+    graph.add_node("read", read)
+    graph.add_edge(START, "browse")
+    graph.add_edge("browse", "read")
+    graph.add_edge("read", END)
+    return graph.compile(checkpointer=checkpointer, interrupt_before=["read"])
+
+
+@pytest.mark.asyncio
+async def test_resumed_run_gets_the_live_page(browser, tmp_path):
+    path = str(tmp_path / "runs.sqlite")
+    config = {"configurable": {"thread_id": "run"}}
+    first_page = await browser.new_page()
+    second_page = await browser.new_page()
+    await second_page.goto("data:text/html,<title>second</title>")
+
+    async with open_run_storage(path) as (checkpointer, *_):
+        token = live_page.set(first_page)
+        try:
+            async for _ in build_graph(checkpointer).astream({"page": first_page, "pages_seen": []}, config):
+                pass
+        finally:
+            live_page.reset(token)
+
+    # As after a restart: a new storage connection and another session's page
+    async with open_run_storage(path) as (checkpointer, *_):
+        graph = build_graph(checkpointer)
+        snapshot = await graph.aget_state(config)
+        assert snapshot.next == ("read",)
+        assert checkpointed_page_url(snapshot.values["page"]) == first_page.url
+
+        token = live_page.set(second_page)
+        try:
+            async for _ in graph.astream(None, config):
+                pass
+        finally:
+            live_page.reset(token)
+
+        assert (await graph.aget_state(config)).values["pages_seen"] == ["first", "second"]
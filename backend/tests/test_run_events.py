@@ -0,0 +1,31 @@
+import asyncio
+
+import pytest
+
+from app.runs import open_run_storage
+from app.streaming import encode_event
+
+
+@pytest.mark.asyncio
+async def test_unflushed_events_do_not_hold_the_shared_connection(tmp_path):
+    path = str(tmp_path / "runs.sqlite")
+    # Two workers sharing the runs database
+    async with open_run_storage(path) as (checkpointer, first_store, _, first_log), \
+            open_run_storage(path) as (_, second_store, _, _):
+        await first_store.create("first", "task", "query", None)
+        await first_log.open("first")
+        await first_log.append("first", encode_event("thought", "thinking"))
+
+        # The log's batch is still open, on its own connection
+        assert first_log.conn.in_transaction
+        assert not checkpointer.conn.in_transaction
+
+        await asyncio.gather(
+            second_store.create("second", "task", "query", None),
+            first_store.set_status("first", "completed"),
+        )
+        await first_log.close("first")
+
+        assert (await second_store.get("first"))["status"] == "completed"
+        assert (await first_store.get("second"))["status"] == "running"
+        assert [event_id for event_id, _ in await first_log.read("first", 0)] == [1]
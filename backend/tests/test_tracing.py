@@ -0,0 +1,26 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from app.tracing import Trace
+
+
+def test_spans_opened_from_threads_get_unique_ids():
+    trace = Trace("run", "research")
+    # Switch threads as often as possible, so an unlocked id assignment would collide
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+
+    def open_spans(_):
+        for _ in range(200):
+            trace.start_span("embed", "embedding", trace.root.span_id)
+
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(open_spans, range(8)))
+    finally:
+        sys.setswitchinterval(interval)
+
+    ids = [span.span_id for span in trace.spans]
+    assert len(ids) == 1 + 8 * 200
+    assert len(set(ids)) == len(ids)
+    assert all(trace._spans_by_id[span.span_id] is span for span in trace.spans)
@@ -31,6 +31,9 @@ export default function Home() {
         throw new Error(errorData.detail || 'Failed to setup browser');
       }
 
+      const { session_id } = await response.json();
+      sessionStorage.setItem('webrover_session_id', session_id);
+
       console.log('Connection successful, redirecting...');
       await router.push('/rover');
     } catch (error) {
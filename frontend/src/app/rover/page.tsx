@@ -33,7 +33,10 @@ export default function RoverPage() {
     try {
       const response = await fetch('http://localhost:8000/cleanup', {
         method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ session_id: sessionStorage.getItem('webrover_session_id') }),
       });
+      sessionStorage.removeItem('webrover_session_id');
       
       if (!response.ok) {
         throw new Error('Failed to cleanup browser');
@@ -170,7 +173,8 @@ export default function RoverPage() {
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
           query: currentQuery,
-          agent_type: currentAgent 
+          agent_type: currentAgent,
+          session_id: sessionStorage.getItem('webrover_session_id')
         }),
       });
 
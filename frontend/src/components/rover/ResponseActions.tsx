@@ -35,7 +35,10 @@ export function ResponseActions({ content, isResearchResponse }: ResponseActions
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ content }),
+        body: JSON.stringify({
+          content,
+          session_id: sessionStorage.getItem('webrover_session_id')
+        }),
       });
 
       if (!response.ok) {